@@ -1,565 +1,1039 @@
 # app.py
-from flask import Flask, request, jsonify
+import json
+import os
+import tempfile
+import threading
+import time
+from functools import wraps
+from flask import Flask, g, request, jsonify
 import pandas as pd
 import numpy as np
 from datetime import datetime
 #from scipy import stats
 from flask_caching import Cache
+from columnar import DATE_COLUMN, FILTER_COLUMNS, NO_DAY, VALUE_RANGES, ColumnarStore, FilterError, value_bounds
+from cube import AggregateCube
+from encoding import dumps, matrix
+from insight_cache import InsightCache, MISSING
+from metrics import Registry, Trace, instrumented, phase, scanned
+from models import MODEL_TASKS, LabelEncodings, load_models
+from questions import REGISTRY, QuestionUnavailable
+from warmup import CacheWarmer, filter_sets
+import streaming
+from streaming import ChunkSource, ColumnMean, Comoments, FirstSeen, GroupedAggregate, ValueCounts
+from parallel import ShardPool
+from profiles import profiled_store
+from serving import InsightPool, MicroBatcher, Overloaded
+from sketches import SKETCH_COLUMNS, HyperLogLog, SketchIndex
+from snapshot import CellDigests, Reloader, Snapshot
+from stats import StatsIndex
+from timeline import PERIODS, Timeline, rebucket
+
+# pipeline.py writes the memory-mapped dataset; the CSV is only read when it is missing.
+# SHOP_DATA_PATH / SHOP_CSV_PATH point the API at another dataset (the benchmarks use this)
+DATA_PATH = os.environ.get("SHOP_DATA_PATH", "C:/Users/shaya/Downloads/shop/processed_dataset.cols")
+CSV_PATH = os.environ.get("SHOP_CSV_PATH", "C:/Users/shaya/Downloads/shop/processed_dataset.csv")
+# Where shopping_trend.ipynb saved the trained models ({task}_model.pkl)
+MODEL_DIR = os.environ.get("SHOP_MODEL_DIR", "C:/Users/shaya/Downloads/shop")
+# "memory" loads the dataset once; "streaming" answers every question in chunks for data larger than RAM;
+# "sharded" splits every question across SHARD_WORKERS processes sharing the memory-mapped dataset
+EXECUTION_MODE = "memory"
+SHARD_WORKERS = os.cpu_count()
+# "development" runs Flask's debug server; "production" serves on SERVING_THREADS request threads
+# (waitress when installed) while analyzer work runs on a bounded pool of INSIGHT_WORKERS threads,
+# with at most MAX_PENDING_INSIGHTS distinct computations queued before requests get 503
+SERVING_MODE = "development"
+SERVING_THREADS = 64
+INSIGHT_WORKERS = os.cpu_count() or 1
+MAX_PENDING_INSIGHTS = 64
+# Request header asking for one insight call to be computed afresh and timed (Server-Timing response header)
+PROFILE_HEADER = "X-Profile"
+# Single-row predictions arriving within PREDICTION_WAIT seconds of each other share one model call
+PREDICTION_BATCH = 256
+PREDICTION_WAIT = 0.002
 
 app = Flask(__name__)
 cache = Cache(app, config={'CACHE_TYPE': 'SimpleCache'})
-df = pd.read_csv("C:/Users/shaya/Downloads/shop/processed_dataset.csv")
+insight_cache = InsightCache(maxsize=4096)
+warmer = CacheWarmer(insight_cache, workers=4)
+insight_pool = InsightPool(INSIGHT_WORKERS, MAX_PENDING_INSIGHTS)
+
+# -------------------- METRICS --------------------
+registry = Registry()
+http_latency = registry.histogram('http_request_duration_seconds', "Time to answer an HTTP request",
+                                  ('endpoint', 'method'))
+http_requests = registry.counter('http_requests_total', "HTTP requests answered", ('endpoint', 'method', 'status'))
+insight_latency = registry.histogram('insight_request_duration_seconds',
+                                     "Time to answer an insight request, cache hits included", ('category', 'question'))
+insight_requests = registry.counter('insight_requests_total', "Insight requests by insight cache outcome",
+                                    ('category', 'question', 'cache'))
+insight_phases = registry.counter('insight_phase_seconds_total',
+                                  "Time computing insights, split into filter, aggregate and serialize",
+                                  ('category', 'question', 'phase'))
+insight_rows = registry.counter('insight_rows_scanned_total', "Rows gathered after filtering to compute insights",
+                                ('category', 'question'))
+method_latency = registry.histogram('analyzer_method_duration_seconds', "Time spent in each analyzer method",
+                                    ('method',))
+registry.gauge('insight_cache', "Insight cache counters and size", ('stat',),
+               lambda: {(name,): value for name, value in insight_cache.stats().items()})
+registry.gauge('insight_pool', "Insight worker pool counters and queue depth", ('stat',),
+               lambda: {(name,): value for name, value in insight_pool.stats().items()})
+prediction_rows = registry.counter('prediction_rows_total', "Rows predicted, by prediction cache outcome",
+                                   ('task', 'cache'))
+registry.gauge('dataset_snapshot', "Version and load time (unix seconds) of the dataset being served", ('stat',),
+               lambda: {('version',): snapshot.version, ('loaded_at',): snapshot.loaded_at})
 
+@instrumented(method_latency)
 class BusinessInsightsAnalyzer:
-    def __init__(self, data):
-        self.df = data
+    def __init__(self, data, cube=None, sketches=None, stats=None, timeline=None):
+        self.store = data if isinstance(data, ColumnarStore) else ColumnarStore.from_frame(data)
+        self.cube = cube
+        self.sketches = sketches
+        self.stats = stats
+        self.timeline = timeline
+        self._view = None  # set on analyzers returned by scoped()
+        self._memo = None
+
+    def scoped(self, filters):
+        """Analyzer pinned to one filter set: rows are selected once, and gathered columns and
+        grouped results are shared by every method called on it (filters passed to them are ignored)"""
+        scoped = BusinessInsightsAnalyzer(self.store, self.cube, self.sketches, self.stats, self.timeline)
+        with phase('filter'):
+            scoped._view = self.store.view(filters)
+        scoped._memo = {}
+        return scoped
 
     # -------------------- SALES & PRODUCT TRENDS --------------------
     def get_top_products_by_revenue(self, filters=None):
-        filtered_df = self._apply_filters(filters)
-        return filtered_df.groupby('item_purchased')['total_revenue'].sum().nlargest(10).to_dict()
+        return self._grouped(filters, 'item_purchased', 'total_revenue', 'sum').nlargest(10).to_dict()
 
     def get_highest_revenue_product(self, filters=None):
-        filtered_df = self._apply_filters(filters)
-        return filtered_df.groupby('item_purchased')['total_revenue'].sum().idxmax()
+        return self._grouped(filters, 'item_purchased', 'total_revenue', 'sum').idxmax()
 
     def get_sales_by_time_period(self, period='month', filters=None):
-        filtered_df = self._apply_filters(filters)
-        return filtered_df.groupby(period)['total_revenue'].sum().to_dict()
+        return self._time_rollup(filters, period, 'total_revenue', 'sum').to_dict()
 
     def get_sales_by_weekday(self, filters=None):
-        filtered_df = self._apply_filters(filters)
-        return filtered_df.groupby('day_of_week')['total_revenue'].sum().to_dict()
+        return self._grouped(filters, 'day_of_week', 'total_revenue', 'sum').to_dict()
 
     def get_products_by_popularity(self, filters=None):
-        filtered_df = self._apply_filters(filters)
-        return filtered_df.groupby('item_purchased')['popularity_score'].mean().nlargest(10).to_dict()
+        return self._grouped(filters, 'item_purchased', 'popularity_score', 'mean').nlargest(10).to_dict()
 
     def get_revenue_by_season(self, filters=None):
-        filtered_df = self._apply_filters(filters)
-        return filtered_df.groupby('season')['total_revenue'].sum().to_dict()
+        return self._grouped(filters, 'season', 'total_revenue', 'sum').to_dict()
 
     def get_sales_distribution_size_color(self, filters=None):
-        filtered_df = self._apply_filters(filters)
-        size_dist = filtered_df.groupby('product_size')['quantity'].sum().to_dict()
-        color_dist = filtered_df.groupby('product_color')['quantity'].sum().to_dict()
+        size_dist = self._grouped(filters, 'product_size', 'quantity', 'sum').to_dict()
+        color_dist = self._grouped(filters, 'product_color', 'quantity', 'sum').to_dict()
         return {'size': size_dist, 'color': color_dist}
 
     def get_discount_effectiveness(self, filters=None):
-        filtered_df = self._apply_filters(filters)
-        effectiveness = filtered_df.groupby('promo_code_used')['total_revenue'].mean().to_dict()
+        effectiveness = self._grouped(filters, 'promo_code_used', 'total_revenue', 'mean').to_dict()
         return effectiveness
 
     # -------------------- HELPER FUNCTION --------------------
-    def _apply_filters(self, filters):
-        filtered_df = self.df.copy()
-        if filters:
-            if 'region' in filters and filters['region'] != "All":
-                filtered_df = filtered_df[filtered_df['region'] == filters['region']]
-            if 'category' in filters and filters['category'] != "All":
-                filtered_df = filtered_df[filtered_df['category'] == filters['category']]
-        return filtered_df
+    def _apply_filters(self, filters, columns):
+        # Resolve filters to row ids and gather only the columns the query reads,
+        # instead of copying the whole table on every request
+        with phase('filter'):
+            if self._view is not None:
+                frame = self._view.frame(columns)
+            else:
+                frame = self.store.frame(columns, self.store.select(filters))
+        scanned(len(frame))
+        return frame
+
+    def _grouped(self, filters, by, measure=None, how='sum'):
+        # groupby(by)[measure].<how>() over the filtered rows: rolled up from the cube
+        # when it covers the query, otherwise computed from the raw rows
+        if self._memo is None:
+            return self._compute_grouped(filters, by, measure, how)
+        key = (by, measure, how)
+        if key not in self._memo:
+            self._memo[key] = self._compute_grouped(self._view.filters, by, measure, how)
+        return self._memo[key]
+
+    def _compute_grouped(self, filters, by, measure, how):
+        result = self.cube.rollup(filters, by, measure, how) if self.cube is not None else None
+        if result is None:
+            result = self._from_profiles(filters, 'rollup', by, measure, how)
+        if result is None:
+            filtered_df = self._apply_filters(filters, [by] if measure is None else [by, measure])
+            grouped = filtered_df.groupby(by, observed=True)
+            result = grouped.size() if how == 'size' else getattr(grouped[measure], how)()
+        return result
+
+    def _time_rollup(self, filters, period, measure, how):
+        # Calendar-bucketed trend in date order: from the timeline's prefix sums when it covers the
+        # filters, otherwise per-date aggregates of the filtered rows rolled up into buckets.
+        # A period that is not a calendar bucket is grouped on as a column, as before
+        if period not in PERIODS:
+            if period not in self.store:
+                raise FilterError(f"Invalid period {period!r}: expected one of {', '.join(PERIODS)} or a column")
+            return self._grouped(filters, period, measure, how)
+        if self._view is not None:
+            filters = self._view.filters
+        result = self.timeline.rollup(filters, period, measure, how) if self.timeline is not None else None
+        if result is None:
+            sums = None if how == 'size' else self._grouped(filters, DATE_COLUMN, measure, 'sum')
+            counts = self._grouped(filters, DATE_COLUMN, *((None, 'size') if how == 'size' else (measure, 'count')))
+            result = rebucket(sums, counts, period, how, measure)
+        return result
+
+    def _correlation(self, filters, x, y):
+        # Pearson correlation from the per-slice moments when they cover the pair
+        if self._view is not None:
+            filters = self._view.filters
+        result = self.stats.correlation(filters, x, y) if self.stats is not None else None
+        if result is None:
+            result = self._apply_filters(filters, [x, y])[[x, y]].corr().iloc[0, 1]
+        return result
+
+    def _from_profiles(self, filters, question, *args):
+        # A customer-centric answer from the customer profiles, one pass over customers instead of
+        # regrouping the rows; None when there are none or a filter is not on customers/categories
+        profiles = getattr(self.store, 'profiles', None)
+        if profiles is None:
+            return None
+        if self._view is not None:
+            filters = self._view.filters
+        return getattr(profiles, question)(filters, *args)
+
+    def _above_quantile(self, filters, column, q, columns):
+        # The filtered rows whose column value exceeds its q-quantile, found from the presorted
+        # slices when the column is indexed instead of sorting the filtered column
+        if self._view is not None:
+            filters = self._view.filters
+        threshold = self.stats.quantile(filters, column, q) if self.stats is not None else None
+        if threshold is None:
+            filtered_df = self._apply_filters(filters, [column] + columns)
+            return filtered_df[filtered_df[column] > filtered_df[column].quantile(q)]
+        return self.store.frame(columns, self.stats.rows_above(filters, column, threshold))
     
         # -------------------- CUSTOMER DEMOGRAPHICS --------------------
     def get_revenue_by_age_group(self, filters=None):
-        filtered_df = self._apply_filters(filters)
-        return filtered_df.groupby('age')['total_revenue'].sum().to_dict()
+        return self._grouped(filters, 'age', 'total_revenue', 'sum').to_dict()
 
     def get_purchases_by_gender(self, filters=None):
-        filtered_df = self._apply_filters(filters)
-        return filtered_df.groupby('gender')['quantity'].sum().to_dict()
+        return self._grouped(filters, 'gender', 'quantity', 'sum').to_dict()
 
     def get_top_regions_by_sales(self, filters=None):
-        filtered_df = self._apply_filters(filters)
-        return filtered_df.groupby('region')['total_revenue'].sum().nlargest(5).to_dict()
+        return self._grouped(filters, 'region', 'total_revenue', 'sum').nlargest(5).to_dict()
 
     def get_age_category_preferences(self, filters=None):
-        filtered_df = self._apply_filters(filters)
-        return filtered_df.groupby(['age', 'most_purchased_category_by_age'])['quantity'].sum().unstack().to_dict()
+        filtered_df = self._apply_filters(filters, ['age', 'most_purchased_category_by_age', 'quantity'])
+        return matrix(filtered_df.groupby(['age', 'most_purchased_category_by_age'], observed=True)['quantity'].sum().unstack())
 
     def get_gender_category_preferences(self, filters=None):
-        filtered_df = self._apply_filters(filters)
-        return filtered_df.groupby(['gender', 'most_purchased_category_by_gender'])['quantity'].sum().unstack().to_dict()
+        filtered_df = self._apply_filters(filters, ['gender', 'most_purchased_category_by_gender', 'quantity'])
+        return matrix(filtered_df.groupby(['gender', 'most_purchased_category_by_gender'], observed=True)['quantity'].sum().unstack())
 
     def get_avg_order_value_by_region(self, filters=None):
-        filtered_df = self._apply_filters(filters)
-        return filtered_df.groupby('region')['total_revenue'].mean().to_dict()
+        return self._grouped(filters, 'region', 'total_revenue', 'mean').to_dict()
 
     def get_subscribed_vs_non_subscribed(self, filters=None):
-        filtered_df = self._apply_filters(filters)
-        return filtered_df.groupby('is_subscribed')['total_revenue'].sum().to_dict()
+        return self._grouped(filters, 'is_subscribed', 'total_revenue', 'sum').to_dict()
     
         # -------------------- CUSTOMER BEHAVIOR --------------------
     def get_avg_purchase_frequency(self, filters=None):
-        filtered_df = self._apply_filters(filters)
+        filtered_df = self._apply_filters(filters, ['purchase_frequency'])
         return filtered_df['purchase_frequency'].mean()
 
     def get_category_repurchase_rate(self, filters=None):
-        filtered_df = self._apply_filters(filters)
-        return filtered_df.groupby(['customer_id', 'category']).size().groupby('category').mean().to_dict()
+        result = self._from_profiles(filters, 'repurchase_rate')
+        if result is None:
+            filtered_df = self._apply_filters(filters, ['customer_id', 'category'])
+            result = filtered_df.groupby(['customer_id', 'category'], observed=True).size().groupby('category', observed=True).mean()
+        return result.to_dict()
 
     def get_customer_lifetime_value(self, filters=None):
-        filtered_df = self._apply_filters(filters)
-        return filtered_df.groupby('customer_id')['total_revenue'].sum().nlargest(10).to_dict()
+        result = self._from_profiles(filters, 'lifetime_value')
+        if result is None:
+            filtered_df = self._apply_filters(filters, ['customer_id', 'total_revenue'])
+            result = filtered_df.groupby('customer_id', observed=True)['total_revenue'].sum().nlargest(10)
+        return result.to_dict()
 
     def get_discount_response_analysis(self, filters=None):
-        filtered_df = self._apply_filters(filters)
-        return filtered_df.groupby('promo_code_used')['quantity'].sum().to_dict()
+        return self._grouped(filters, 'promo_code_used', 'quantity', 'sum').to_dict()
 
     def get_promo_vs_non_promo_spending(self, filters=None):
-        filtered_df = self._apply_filters(filters)
-        return filtered_df.groupby('promo_code_used')['total_revenue'].mean().to_dict()
+        return self._grouped(filters, 'promo_code_used', 'total_revenue', 'mean').to_dict()
 
     def get_rating_purchase_correlation(self, filters=None):
-        filtered_df = self._apply_filters(filters)
-        return filtered_df[['review_rating', 'purchase_frequency']].corr().iloc[0,1]
+        return self._correlation(filters, 'review_rating', 'purchase_frequency')
 
     def get_weekday_vs_weekend_behavior(self, filters=None):
-        filtered_df = self._apply_filters(filters)
-        return filtered_df.groupby('is_weekend')['total_revenue'].sum().to_dict()
+        return self._grouped(filters, 'is_weekend', 'total_revenue', 'sum').to_dict()
 
     def get_shipping_preference_by_demo(self, demo='gender', filters=None):
-        filtered_df = self._apply_filters(filters)
-        return filtered_df.groupby([demo, 'shipping_type']).size().unstack().to_dict()
+        filtered_df = self._apply_filters(filters, [demo, 'shipping_type'])
+        return matrix(filtered_df.groupby([demo, 'shipping_type'], observed=True).size().unstack())
     
         # -------------------- OPERATIONAL INSIGHTS --------------------
     def get_stocking_recommendations(self, filters=None):
-        filtered_df = self._apply_filters(filters)
+        popular = self._above_quantile(filters, 'popularity_score', 0.75, ['trend_flag', 'item_purchased'])
         # Recommend products with high trend_flag and popularity_score
-        recommendations = filtered_df[
-            (filtered_df['trend_flag'] == 'High') & 
-            (filtered_df['popularity_score'] > filtered_df['popularity_score'].quantile(0.75))
-        ]['item_purchased'].unique().tolist()
+        recommendations = popular[popular['trend_flag'] == 'High']['item_purchased'].unique().tolist()
         return recommendations
 
     def get_seasonal_demand_spikes(self, filters=None):
-        filtered_df = self._apply_filters(filters)
-        return filtered_df.groupby('season')['quantity'].sum().to_dict()
+        return self._grouped(filters, 'season', 'quantity', 'sum').to_dict()
 
     def get_shipping_preferences_high_value(self, filters=None):
-        filtered_df = self._apply_filters(filters)
-        high_value = filtered_df[filtered_df['price'] > filtered_df['price'].quantile(0.75)]
-        return high_value.groupby('shipping_type').size().to_dict()
+        high_value = self._above_quantile(filters, 'price', 0.75, ['shipping_type'])
+        return high_value.groupby('shipping_type', observed=True).size().to_dict()
 
     def get_shipping_impact_size_color(self, filters=None):
-        filtered_df = self._apply_filters(filters)
-        size_impact = filtered_df.groupby(['product_size', 'shipping_type']).size().unstack().to_dict()
-        color_impact = filtered_df.groupby(['product_color', 'shipping_type']).size().unstack().to_dict()
+        filtered_df = self._apply_filters(filters, ['product_size', 'product_color', 'shipping_type'])
+        size_impact = matrix(filtered_df.groupby(['product_size', 'shipping_type'], observed=True).size().unstack())
+        color_impact = matrix(filtered_df.groupby(['product_color', 'shipping_type'], observed=True).size().unstack())
         return {'size': size_impact, 'color': color_impact}
 
     def get_underperforming_categories(self, filters=None):
-        filtered_df = self._apply_filters(filters)
-        return filtered_df.groupby('category')['total_revenue'].sum().nsmallest(5).to_dict()
+        return self._grouped(filters, 'category', 'total_revenue', 'sum').nsmallest(5).to_dict()
 
     def get_payment_method_frequency(self, filters=None):
-        filtered_df = self._apply_filters(filters)
-        return filtered_df['payment_method'].value_counts().to_dict()
+        return self._grouped(filters, 'payment_method', how='size').sort_values(ascending=False).to_dict()
 
     def get_revenue_per_payment_method(self, filters=None):
-        filtered_df = self._apply_filters(filters)
-        return filtered_df.groupby('payment_method')['total_revenue'].mean().to_dict()
+        return self._grouped(filters, 'payment_method', 'total_revenue', 'mean').to_dict()
 
     def get_multi_category_customers(self, filters=None):
-        filtered_df = self._apply_filters(filters)
-        return filtered_df.groupby('customer_id')['category'].nunique().gt(1).sum()
+        result = self._from_profiles(filters, 'multi_category')
+        if result is None:
+            filtered_df = self._apply_filters(filters, ['customer_id', 'category'])
+            result = int(filtered_df.groupby('customer_id', observed=True)['category'].nunique().gt(1).sum())
+        return result
     
         # -------------------- ADVANCED INSIGHTS --------------------
     def get_size_purchase_freq_correlation(self, filters=None):
-        filtered_df = self._apply_filters(filters)
-        return filtered_df.groupby('product_size')['purchase_frequency'].mean().to_dict()
+        return self._grouped(filters, 'product_size', 'purchase_frequency', 'mean').to_dict()
 
     def get_revenue_by_rating(self, filters=None):
-        filtered_df = self._apply_filters(filters)
-        return filtered_df.groupby('review_rating')['total_revenue'].sum().to_dict()
+        return self._grouped(filters, 'review_rating', 'total_revenue', 'sum').to_dict()
 
     def get_discount_rating_correlation(self, filters=None):
-        filtered_df = self._apply_filters(filters)
-        return filtered_df[['discount_effectiveness', 'review_rating']].corr().iloc[0,1]
+        return self._correlation(filters, 'discount_effectiveness', 'review_rating')
 
     def get_promo_usage_trends(self, period='month', filters=None):
-        filtered_df = self._apply_filters(filters)
-        return filtered_df.groupby(period)['promo_code_used'].mean().to_dict()
+        return self._time_rollup(filters, period, 'promo_code_used', 'mean').to_dict()
 
     def get_young_customer_trends(self, age_threshold=25, filters=None):
-        filtered_df = self._apply_filters(filters)
-        young_customers = filtered_df[filtered_df['age'] <= age_threshold]
-        return young_customers.groupby('item_purchased')['popularity_score'].mean().nlargest(5).to_dict()
+        # The age cut-off is one more range filter, resolved with the others from the presorted age index
+        if self._view is not None:
+            filters = self._view.filters
+        age_max = min(float(age_threshold), value_bounds(filters).get('age', (None, np.inf))[1])
+        with phase('filter'):
+            young_customers = self.store.frame(['item_purchased', 'popularity_score'],
+                                               self.store.select(dict(filters or {}, age_max=age_max)))
+        scanned(len(young_customers))
+        return young_customers.groupby('item_purchased', observed=True)['popularity_score'].mean().nlargest(5).to_dict()
 
     def get_promo_usage_by_region(self, filters=None):
-        filtered_df = self._apply_filters(filters)
-        return filtered_df.groupby('region')['promo_code_used'].mean().to_dict()
+        return self._grouped(filters, 'region', 'promo_code_used', 'mean').to_dict()
 
     def get_shipping_preferences_by_product(self, filters=None):
-        filtered_df = self._apply_filters(filters)
-        return filtered_df.groupby(['item_purchased', 'shipping_type']).size().unstack().to_dict()
+        filtered_df = self._apply_filters(filters, ['item_purchased', 'shipping_type'])
+        return matrix(filtered_df.groupby(['item_purchased', 'shipping_type'], observed=True).size().unstack())
 
     def get_seasonal_impact(self, filters=None):
-        filtered_df = self._apply_filters(filters)
-        seasonal_rev = filtered_df.groupby('season')['total_revenue'].sum().to_dict()
-        seasonal_cat = filtered_df.groupby(['season', 'category'])['total_revenue'].sum().unstack().to_dict()
+        filtered_df = self._apply_filters(filters, ['season', 'category', 'total_revenue'])
+        seasonal_rev = self._grouped(filters, 'season', 'total_revenue', 'sum').to_dict()
+        seasonal_cat = matrix(filtered_df.groupby(['season', 'category'], observed=True)['total_revenue'].sum().unstack())
         return {'revenue': seasonal_rev, 'category_sales': seasonal_cat}
     
         # -------------------- COMPARATIVE INSIGHTS --------------------
     def get_purchase_freq_by_region(self, filters=None):
-        filtered_df = self._apply_filters(filters)
-        return filtered_df.groupby('region')['purchase_frequency'].mean().to_dict()
+        return self._grouped(filters, 'region', 'purchase_frequency', 'mean').to_dict()
 
     def get_category_popularity_subscribed(self, filters=None):
-        filtered_df = self._apply_filters(filters)
-        return filtered_df.groupby(['is_subscribed', 'category'])['quantity'].sum().unstack().to_dict()
+        filtered_df = self._apply_filters(filters, ['is_subscribed', 'category', 'quantity'])
+        return matrix(filtered_df.groupby(['is_subscribed', 'category'], observed=True)['quantity'].sum().unstack())
 
     def get_gender_rating_differences(self, filters=None):
-        filtered_df = self._apply_filters(filters)
-        return filtered_df.groupby('gender')['review_rating'].mean().to_dict()
+        return self._grouped(filters, 'gender', 'review_rating', 'mean').to_dict()
 
     def get_avg_spending_subscribed_vs_non(self, filters=None):
-        filtered_df = self._apply_filters(filters)
-        return filtered_df.groupby('is_subscribed')['average_spending'].mean().to_dict()
+        return self._grouped(filters, 'is_subscribed', 'average_spending', 'mean').to_dict()
 
     def get_urban_rural_category_preferences(self, filters=None):
-        filtered_df = self._apply_filters(filters)
-        return filtered_df.groupby(['region_type', 'category'])['quantity'].sum().unstack().to_dict()
+        filtered_df = self._apply_filters(filters, ['region_type', 'category', 'quantity'])
+        return matrix(filtered_df.groupby(['region_type', 'category'], observed=True)['quantity'].sum().unstack())
 
-analyzer = BusinessInsightsAnalyzer(df)
+        # -------------------- APPROXIMATE (SKETCHES) --------------------
+    # Each returns (data, error description), or None when the filters need the exact path
+    def _top_from_sketch(self, filters, name, k):
+        sketch = self.sketches.combine(filters, name) if self.sketches is not None else None
+        if sketch is None:
+            return None
+        return sketch.top(k).to_dict(), {
+            "method": "misra-gries",
+            "error_bound": float(sketch.error),  # every total is low by at most this much
+            "relative_error_bound": float(sketch.error / sketch.weight) if sketch.weight else 0.0,
+        }
 
-# -------------------- API ENDPOINTS --------------------
-@app.route('/api/questions/sales_trends', methods=['GET'])
-@cache.cached(timeout=3600)
-def get_sales_questions():
-    questions = [
-        {"id": 1, "text": "Top 10 products by revenue", "func": "get_top_products_by_revenue", "viz": "bar"},
-        {"id": 2, "text": "Product generating the most revenue", "func": "get_highest_revenue_product", "viz": "metric"},
-        {"id": 3, "text": "Sales variation by month", "func": "get_sales_by_time_period", "viz": "line"},
-        {"id": 4, "text": "Sales by weekday", "func": "get_sales_by_weekday", "viz": "bar"},
-        {"id": 5, "text": "Top products by popularity", "func": "get_products_by_popularity", "viz": "bar"},
-        {"id": 6, "text": "Revenue by season", "func": "get_revenue_by_season", "viz": "pie"},
-        {"id": 7, "text": "Sales distribution by size/color", "func": "get_sales_distribution_size_color", "viz": "dual_bar"},
-        {"id": 8, "text": "Discount effectiveness", "func": "get_discount_effectiveness", "viz": "bar"}
-    ]
-    return jsonify(questions)
+    def _customers_per_category(self, filters):
+        if self.sketches is None or self.sketches.select(filters) is None:
+            return None
+        return {category: self.sketches.combine(filters, 'customers', category=category)
+                for category in self.sketches.labels('category', filters)}
 
-@app.route('/api/insights/sales_trends/<int:question_id>', methods=['GET'])
-@cache.memoize(timeout=3600)
-def get_sales_insights(question_id):
-    filters = request.args.to_dict()
+    def approx_top_products_by_revenue(self, filters=None):
+        return self._top_from_sketch(filters, 'item_revenue', 10)
+
+    def approx_customer_lifetime_value(self, filters=None):
+        return self._top_from_sketch(filters, 'customer_revenue', 10)
+
+    def approx_category_repurchase_rate(self, filters=None):
+        customers = self._customers_per_category(filters)
+        if customers is None:
+            return None
+        rates = {category: self.sketches.rows(filters, category=category) / sketch.count()
+                 for category, sketch in customers.items()}
+        relative_error = float(next(iter(customers.values())).relative_error) if customers else 0.0
+        return rates, {"method": "hyperloglog", "relative_standard_error": relative_error}
+
+    def approx_multi_category_customers(self, filters=None):
+        # Customers in exactly one category c are those missing from the union of the others:
+        # multi = D - sum_c (D - D_without_c), all distinct counts taken from merged sketches
+        if self._from_profiles(filters, 'covers'):
+            return None  # the profiles count them exactly, in less time than the sketches estimate
+        customers = self._customers_per_category(filters)
+        if customers is None:
+            return None
+        if not customers:
+            return 0, {"method": "hyperloglog", "standard_error": 0.0}
+        sketches = list(customers.values())
+        union = HyperLogLog(sketches[0].precision)
+        for sketch in sketches:
+            union.merge(sketch)
+        total = union.count()
+        without = []
+        for skipped in range(len(sketches)):
+            rest = HyperLogLog(sketches[0].precision)
+            for position, sketch in enumerate(sketches):
+                if position != skipped:
+                    rest.merge(sketch)
+            without.append(rest.count())
+        multi = total - sum(total - count for count in without)
+        relative_error = float(union.relative_error)
+        variance = ((len(sketches) - 1) * total * relative_error) ** 2 + sum((count * relative_error) ** 2 for count in without)
+        standard_error = float(np.sqrt(variance))
+        if multi < standard_error:
+            # A difference of large estimates this close to zero is noise; answer exactly instead
+            return None
+        return int(round(multi)), {"method": "hyperloglog", "standard_error": standard_error}
+
+@instrumented(method_latency)
+class StreamingAnalyzer(BusinessInsightsAnalyzer):
+    """Out-of-core variant: every question is a single pass of mergeable partial aggregates
+    over fixed-size chunks, so memory is bounded by chunk size and group counts, not row count.
+
+    Questions built on _grouped() stream through the base class unchanged; the
+    rest are restated here with the same pandas post-processing applied to the
+    reduced result, so answers match the in-memory analyzer.
+    """
+
+    def __init__(self, source):
+        self.store = source  # a ChunkSource; REGISTRY.validate() only checks column membership
+        self.cube = None
+        self.sketches = None
+        self.stats = None
+        self.timeline = None
+        self._view = None
+        self._memo = None
+
+    def scoped(self, filters):
+        return self
+
+    def _compute_grouped(self, filters, by, measure, how):
+        return self._aggregate(filters, GroupedAggregate(by, measure, how))
+
+    def _run(self, filters, partials):
+        return streaming.run(self.store, filters, partials)
+
+    def _aggregate(self, filters, *partials):
+        results = [partial.result() for partial in self._run(filters, partials)]
+        return results[0] if len(partials) == 1 else results
+
+    def get_age_category_preferences(self, filters=None):
+        return matrix(self._aggregate(filters, GroupedAggregate(['age', 'most_purchased_category_by_age'], 'quantity')).unstack())
+
+    def get_gender_category_preferences(self, filters=None):
+        return matrix(self._aggregate(filters, GroupedAggregate(['gender', 'most_purchased_category_by_gender'], 'quantity')).unstack())
+
+    def get_avg_purchase_frequency(self, filters=None):
+        return self._aggregate(filters, ColumnMean('purchase_frequency'))
+
+    def get_category_repurchase_rate(self, filters=None):
+        result = self._from_profiles(filters, 'repurchase_rate')
+        if result is None:
+            pairs = self._aggregate(filters, GroupedAggregate(['customer_id', 'category'], how='size'))
+            result = pairs.groupby(level='category', observed=True).mean()
+        return result.to_dict()
+
+    def get_customer_lifetime_value(self, filters=None):
+        result = self._from_profiles(filters, 'lifetime_value')
+        if result is None:
+            result = self._aggregate(filters, GroupedAggregate('customer_id', 'total_revenue')).nlargest(10)
+        return result.to_dict()
+
+    def get_rating_purchase_correlation(self, filters=None):
+        return self._aggregate(filters, Comoments('review_rating', 'purchase_frequency'))
+
+    def get_shipping_preference_by_demo(self, demo='gender', filters=None):
+        return matrix(self._aggregate(filters, GroupedAggregate([demo, 'shipping_type'], how='size')).unstack())
+
+    def get_stocking_recommendations(self, filters=None):
+        # Two passes: the popularity quantile first, then the items above it in order of first appearance
+        threshold = self._run(filters, [ValueCounts('popularity_score')])[0].quantile(0.75)
+        return self._aggregate(filters, FirstSeen('item_purchased', where=[('trend_flag', '==', 'High'),
+                                                                           ('popularity_score', '>', threshold)]))
+
+    def get_shipping_preferences_high_value(self, filters=None):
+        threshold = self._run(filters, [ValueCounts('price')])[0].quantile(0.75)
+        high_value = GroupedAggregate('shipping_type', how='size', where=[('price', '>', threshold)])
+        return self._aggregate(filters, high_value).to_dict()
+
+    def get_shipping_impact_size_color(self, filters=None):
+        size_impact, color_impact = self._aggregate(filters, GroupedAggregate(['product_size', 'shipping_type'], how='size'),
+                                                    GroupedAggregate(['product_color', 'shipping_type'], how='size'))
+        return {'size': matrix(size_impact.unstack()), 'color': matrix(color_impact.unstack())}
+
+    def get_multi_category_customers(self, filters=None):
+        result = self._from_profiles(filters, 'multi_category')
+        if result is None:
+            pairs = self._aggregate(filters, GroupedAggregate(['customer_id', 'category'], how='size'))
+            result = int(pairs.groupby(level='customer_id', observed=True).size().gt(1).sum())
+        return result
+
+    def get_discount_rating_correlation(self, filters=None):
+        return self._aggregate(filters, Comoments('discount_effectiveness', 'review_rating'))
+
+    def get_young_customer_trends(self, age_threshold=25, filters=None):
+        young = GroupedAggregate('item_purchased', 'popularity_score', 'mean', where=[('age', '<=', age_threshold)])
+        return self._aggregate(filters, young).nlargest(5).to_dict()
+
+    def get_shipping_preferences_by_product(self, filters=None):
+        return matrix(self._aggregate(filters, GroupedAggregate(['item_purchased', 'shipping_type'], how='size')).unstack())
+
+    def get_seasonal_impact(self, filters=None):
+        seasonal_rev, seasonal_cat = self._aggregate(filters, GroupedAggregate('season', 'total_revenue'),
+                                                     GroupedAggregate(['season', 'category'], 'total_revenue'))
+        return {'revenue': seasonal_rev.to_dict(), 'category_sales': matrix(seasonal_cat.unstack())}
+
+    def get_category_popularity_subscribed(self, filters=None):
+        return matrix(self._aggregate(filters, GroupedAggregate(['is_subscribed', 'category'], 'quantity')).unstack())
+
+    def get_urban_rural_category_preferences(self, filters=None):
+        return matrix(self._aggregate(filters, GroupedAggregate(['region_type', 'category'], 'quantity')).unstack())
+
+@instrumented(method_latency)
+class ShardedAnalyzer(StreamingAnalyzer):
+    """Multi-core variant: partial aggregates run per customer-hash shard in a process pool and are merged.
+
+    Questions the aggregate cube or the per-slice statistics answer exactly
+    still take them, which is cheaper than any scan.
+    """
+
+    def __init__(self, store, cube, pool, sketches=None, stats=None, timeline=None):
+        self.store = store
+        self.cube = cube
+        self.sketches = sketches
+        self.stats = stats
+        self.timeline = timeline
+        self.pool = pool
+        self._view = None
+        self._memo = None
+
+    def _compute_grouped(self, filters, by, measure, how):
+        result = self.cube.rollup(filters, by, measure, how) if self.cube is not None else None
+        if result is None:
+            result = self._from_profiles(filters, 'rollup', by, measure, how)
+        if result is None:
+            result = self._aggregate(filters, GroupedAggregate(by, measure, how))
+        return result
+
+    def _run(self, filters, partials):
+        return self.pool.run(filters, partials)
+
+    # Served from the per-slice statistics and the timeline in the parent, with no pass over the shards
+    get_rating_purchase_correlation = BusinessInsightsAnalyzer.get_rating_purchase_correlation
+    get_discount_rating_correlation = BusinessInsightsAnalyzer.get_discount_rating_correlation
+    get_stocking_recommendations = BusinessInsightsAnalyzer.get_stocking_recommendations
+    get_shipping_preferences_high_value = BusinessInsightsAnalyzer.get_shipping_preferences_high_value
+    get_sales_by_time_period = BusinessInsightsAnalyzer.get_sales_by_time_period
+    get_promo_usage_trends = BusinessInsightsAnalyzer.get_promo_usage_trends
+
+snapshot = None  # the dataset every request is answered from, replaced whole by install_snapshot()
+swap_lock = threading.Lock()
+reload_lock = threading.Lock()  # one dataset build at a time
+startup_lock = threading.Lock()
+reloader = Reloader()
+
+def build_snapshot(path=None, mode=None):
+    """Open (or build) the processed dataset and everything derived from it, without touching
+    the snapshot requests are being answered from"""
+    path = path or (DATA_PATH if os.path.isdir(DATA_PATH) else CSV_PATH)
+    mode = mode or EXECUTION_MODE
+    if mode == "streaming":
+        new = Snapshot(StreamingAnalyzer(ChunkSource(path)), path=path, mode=mode)
+    elif mode == "sharded":
+        if not os.path.isdir(path):
+            # Workers share the data by memory-mapping one saved copy of it
+            directory = tempfile.mkdtemp(prefix='shop-shards-')
+            profiled_store(pd.read_csv(path)).save(directory)
+            path = directory
+        store = ColumnarStore.open(path)
+        shard_pool = ShardPool(path, SHARD_WORKERS)
+        sketches = SketchIndex.open(path) or SketchIndex.build(store.frame(SKETCH_COLUMNS))
+        analyzer = ShardedAnalyzer(store, AggregateCube.open(path, store), shard_pool, sketches,
+                                   StatsIndex.open(path, store), Timeline.open(path, store))
+        new = Snapshot(analyzer, store, shard_pool, path, mode, CellDigests.open(path))
+    else:
+        if os.path.isdir(path):
+            store = ColumnarStore.open(path)
+            cube = AggregateCube.open(path, store)
+            sketches = SketchIndex.open(path)
+            stats = StatsIndex.open(path, store)
+            timeline = Timeline.open(path, store)
+            digests = CellDigests.open(path)
+        else:
+            store = profiled_store(pd.read_csv(path))
+            cube = AggregateCube.build(store)
+            sketches = None
+            stats = StatsIndex.build(store)
+            timeline = Timeline.build(store)
+            digests = None
+        if sketches is None:
+            sketches = SketchIndex.build(store.frame(SKETCH_COLUMNS))
+        new = Snapshot(BusinessInsightsAnalyzer(store, cube, sketches, stats, timeline), store, path=path, mode=mode,
+                       digests=digests)
+    for (category, question_id), problem in REGISTRY.validate(new.analyzer).items():
+        app.logger.warning("Question %s/%s: %s", category, question_id, problem)
+    return new
+
+def current_snapshot():
+    """The live snapshot, registered as in use until the caller's with block ends"""
+    while True:
+        live = snapshot
+        if live.acquire():
+            return live
+
+def install_snapshot(new, changed, entries=()):
+    """Swap new in for the live snapshot. Cached answers that read any of the changed cells
+    (every answer when changed is None) are dropped in the same step and entries computed
+    from new take their place; the replaced snapshot is retired."""
+    global snapshot
+    with swap_lock:
+        old, snapshot = snapshot, new
+        stale = None if changed is None else (lambda key: new.digests.touches(changed, key[2]))
+        insight_cache.replace(stale, entries)
+    if old is not None:
+        old.retire()
 
-    # Create context string based on applied filters
+def stale_filter_sets(new, changed):
+    """The warm-up filter sets whose answers read a changed cell"""
+    sets = filter_sets(new.store)
+    if changed is None:
+        return sets
+    return [filters for filters in sets if new.digests.touches(changed, filters.items())]
+
+def warm_questions():
+    return [question for question in REGISTRY if question.available and question.cacheable]
+
+def load_dataset(path=None, warm=True, mode=None):
+    """(Re)load the processed dataset now; cached insights the new data makes stale are dropped and,
+    with warm, recomputed in the background (every question x region x category response at startup)"""
+    with reload_lock:
+        warmer.cancel()
+        new = build_snapshot(path, mode)
+        changed = new.changed_cells(snapshot)
+        install_snapshot(new, changed)
+    if warm and new.store is not None:  # in streaming mode every warmed answer would be a full pass
+        warmer.start(new.analyzer.scoped, render_question, warm_questions(), stale_filter_sets(new, changed))
+    return new
+
+def reload_dataset(path=None, mode=None, warm=True):
+    """Build the new snapshot and recompute the cached answers its changes affect while the live
+    snapshot keeps serving, then swap data and answers in together: no downtime, no cold cache"""
+    with reload_lock:
+        new = build_snapshot(path, mode)
+        changed = new.changed_cells(snapshot)
+        prepared = []
+
+        def install(entries):
+            prepared.extend(entries)
+            install_snapshot(new, changed, entries)
+
+        if warm and new.store is not None:
+            run = warmer.start(new.analyzer.scoped, render_question, warm_questions(),
+                               stale_filter_sets(new, changed), install=install)
+            warmer.wait()
+            if run.state != "done":
+                install_snapshot(new, changed)
+        else:
+            install_snapshot(new, changed)
+    return {"snapshot": new.describe(), "changed_cells": None if changed is None else len(changed),
+            "recomputed": len(prepared)}
+
+
+def filter_options(live):
+    """Values each equality filter accepts, read from the filter index (one pass in streaming mode),
+    the first and last purchase dates as date_range and the smallest and largest value each numeric
+    range filter can take as value_ranges"""
+    if live.filter_choices is None:
+        store, analyzer = live.store, live.analyzer
+        if store is not None:
+            choices = {name: [str(label) for label in store.index.labels[name]] for name in store.index.labels}
+            dated = store.dates.sorted_days[store.dates.sorted_days != NO_DAY] if store.dates is not None else []
+            if len(dated):
+                first, last = np.asarray([dated[0], dated[-1]], dtype=np.int64).astype('datetime64[D]')
+                choices['date_range'] = {"start": str(first), "end": str(last)}
+            value_ranges = {}
+            for prefix, name in VALUE_RANGES.items():
+                index = store.value_index(name)
+                values = index.sorted_values[~np.isnan(index.sorted_values)] if index is not None else []
+                if len(values):
+                    value_ranges[prefix] = {"min": values[0].item(), "max": values[-1].item()}
+            choices['value_ranges'] = value_ranges
+        else:
+            names = [name for name in FILTER_COLUMNS if name in analyzer.store]
+            counts = analyzer._aggregate({}, *[GroupedAggregate(name, how='size') for name in names])
+            counts = counts if len(names) > 1 else [counts]
+            choices = {name: sorted(str(label) for label in result.index) for name, result in zip(names, counts)}
+        live.filter_choices = choices
+    return live.filter_choices
+
+
+def profiling():
+    return request.headers.get(PROFILE_HEADER, '').lower() in ('1', 'true')
+
+def cached_insight(view):
+    """Cache a successful insight response under (category, question_id, request filters),
+    and record the request's latency and cache outcome per question"""
+    @wraps(view)
+    def wrapper(category, question_id):
+        question = REGISTRY.get(category, question_id)
+        if question is None:
+            return view(category, question_id)
+        start = time.perf_counter()
+        generation = insight_cache.generation  # read before the view takes its snapshot
+        if not question.cacheable or profiling():
+            outcome, response = 'bypass', view(category, question_id)
+        else:
+            key = insight_cache.key(category, question_id, request.args.to_dict())
+            body = insight_cache.get(key)
+            outcome = 'miss' if body is MISSING else 'hit'
+            if body is MISSING:
+                response = view(category, question_id)
+                if not isinstance(response, tuple):  # errors are never cached
+                    insight_cache.set(key, response.get_data(), generation)
+            else:
+                response = app.response_class(body, mimetype='application/json')
+        insight_requests.inc(category, question_id, outcome)
+        insight_latency.observe(time.perf_counter() - start, category, question_id)
+        return response
+    return wrapper
+
+def server_busy():
+    # Admission control: shed load instead of queueing without bound
+    return jsonify({"error": "Server busy, retry shortly"}), 503, {"Retry-After": "1"}
+
+def filter_context(filters):
+    # Context string describing the applied filters
     context = []
     if filters.get('category'):
         context.append(f"Category: {filters['category']}")
     if filters.get('region'):
         context.append(f"Region: {filters['region']}")
-    filter_text = f" ({', '.join(context)})" if context else ""
+    if filters.get('start'):
+        context.append(f"From: {filters['start']}")
+    if filters.get('end'):
+        context.append(f"To: {filters['end']}")
+    for prefix in VALUE_RANGES:
+        low, high = filters.get(f'{prefix}_min'), filters.get(f'{prefix}_max')
+        label = prefix.capitalize()
+        if low not in (None, '') and high not in (None, ''):
+            context.append(f"{label}: {low}-{high}")
+        elif low not in (None, ''):
+            context.append(f"{label} >= {low}")
+        elif high not in (None, ''):
+            context.append(f"{label} <= {high}")
+    return f" ({', '.join(context)})" if context else ""
 
-    try:
-        if question_id == 1:
-            result = analyzer.get_top_products_by_revenue(filters)
-            viz = "bar"
-        elif question_id == 2:
-            result = analyzer.get_highest_revenue_product(filters)
-            viz = "metric"
-        elif question_id == 3:
-            period = filters.get('period', 'month')
-            result = analyzer.get_sales_by_time_period(period, filters)
-            viz = "line"
-        elif question_id == 4:
-            result = analyzer.get_sales_by_weekday(filters)
-            viz = "bar"
-        elif question_id == 5:
-            result = analyzer.get_products_by_popularity(filters)
-            viz = "bar"
-        elif question_id == 6:
-            result = analyzer.get_revenue_by_season(filters)
-            viz = "pie"
-        elif question_id == 7:
-            result = analyzer.get_sales_distribution_size_color(filters)
-            viz = "dual_bar"
-        elif question_id == 8:
-            result = analyzer.get_discount_effectiveness(filters)
-            viz = "bar"
-        else:
-            return jsonify({"error": "Question ID not found"}), 404
-        
-        return jsonify({
-            "summary": "Sales & Product Trends Analysis",
-            "data": result,
-            "visualization": viz,
-            "filter_text": filter_text
-        })
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
-    
-#customer demographic endpoint
-# -------------------- API ENDPOINTS --------------------
-@app.route('/api/questions/customer_demographics', methods=['GET'])
-@cache.cached(timeout=3600)
-def get_customer_demo_questions():
-    questions = [
-        {"id": 1, "text": "Revenue by age group", "func": "get_revenue_by_age_group", "viz": "bar"},
-        {"id": 2, "text": "Purchase distribution by gender", "func": "get_purchases_by_gender", "viz": "pie"},
-        {"id": 3, "text": "Top regions by sales", "func": "get_top_regions_by_sales", "viz": "bar"},
-        {"id": 4, "text": "Age group category preferences", "func": "get_age_category_preferences", "viz": "heatmap"},
-        {"id": 5, "text": "Gender category preferences", "func": "get_gender_category_preferences", "viz": "heatmap"},
-        {"id": 6, "text": "Average order value by region", "func": "get_avg_order_value_by_region", "viz": "bar"},
-        {"id": 7, "text": "Subscribed vs. non-subscribed spending", "func": "get_subscribed_vs_non_subscribed", "viz": "bar"}
-    ]
-    return jsonify(questions)
+def answer_question(target, question, filters):
+    """The insight payload for one question; target is the analyzer or one scoped to the filters.
 
-@app.route('/api/insights/customer_demographics/<int:question_id>', methods=['GET'])
-@cache.memoize(timeout=3600)
-def get_customer_demo_insights(question_id):
-    filters = request.args.to_dict()
-    try:
-        if question_id == 1:
-            result = analyzer.get_revenue_by_age_group(filters)
-            viz = "bar"
-        elif question_id == 2:
-            result = analyzer.get_purchases_by_gender(filters)
-            viz = "pie"
-        elif question_id == 3:
-            result = analyzer.get_top_regions_by_sales(filters)
-            viz = "bar"
-        elif question_id == 4:
-            result = analyzer.get_age_category_preferences(filters)
-            viz = "heatmap"
-        elif question_id == 5:
-            result = analyzer.get_gender_category_preferences(filters)
-            viz = "heatmap"
-        elif question_id == 6:
-            result = analyzer.get_avg_order_value_by_region(filters)
-            viz = "bar"
-        elif question_id == 7:
-            result = analyzer.get_subscribed_vs_non_subscribed(filters)
-            viz = "bar"
-        else:
-            return jsonify({"error": "Question ID not found"}), 404
-        
-        return jsonify({
-            "summary": "Customer Demographics Analysis",
-            "data": result,
-            "visualization": viz
-        })
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
-    
-#customer behavior endpoint
-# -------------------- API ENDPOINTS --------------------
-@app.route('/api/questions/customer_behavior', methods=['GET'])
-@cache.cached(timeout=3600)
-def get_customer_behavior_questions():
-    questions = [
-        {"id": 1, "text": "Average purchase frequency", "func": "get_avg_purchase_frequency", "viz": "metric"},
-        {"id": 2, "text": "Category repurchase rate", "func": "get_category_repurchase_rate", "viz": "bar"},
-        {"id": 3, "text": "Top customers by lifetime value", "func": "get_customer_lifetime_value", "viz": "bar"},
-        {"id": 4, "text": "Discount response analysis", "func": "get_discount_response_analysis", "viz": "bar"},
-        {"id": 5, "text": "Spending with/without promo codes", "func": "get_promo_vs_non_promo_spending", "viz": "bar"},
-        {"id": 6, "text": "Rating vs. purchase frequency correlation", "func": "get_rating_purchase_correlation", "viz": "metric"},
-        {"id": 7, "text": "Weekday vs. weekend behavior", "func": "get_weekday_vs_weekend_behavior", "viz": "bar"},
-        {"id": 8, "text": "Shipping preferences by gender", "func": "get_shipping_preference_by_demo", "viz": "heatmap"}
-    ]
-    return jsonify(questions)
+    With approx=true, questions that have a sketch-backed answer return it together
+    with its error bound under "approximation"; otherwise the exact answer is returned.
+    """
+    if not question.available:
+        raise QuestionUnavailable(f"Question unavailable: {question.problem}")
+    approximate = None
+    if question.approx and str(filters.get('approx', '')).lower() == 'true':
+        approximate = getattr(target, question.approx)(filters=filters)
+    if approximate is not None:
+        data, approximation = approximate
+    else:
+        data, approximation = getattr(target, question.func)(filters=filters, **question.arguments(filters)), None
+    payload = {
+        "summary": REGISTRY.summaries[question.category],
+        "data": data,
+        "visualization": question.viz,
+        "filter_text": filter_context(filters)
+    }
+    if approximation is not None:
+        payload["approximation"] = approximation
+    return payload
+
+def run_batch(analyzer, filters, items):
+    """Answer many (category, id) questions for one filter set: the filter is applied once and
+    the questions share its filtered rows and grouped intermediates. Errors are reported per item."""
+    scoped_analyzer = analyzer.scoped(filters)
+    results = []
+    for item in items:
+        category, question_id = item.get('category'), item.get('id')
+        entry = {"category": category, "id": question_id}
+        try:
+            question = REGISTRY.get(category, int(question_id))
+            if question is None:
+                raise KeyError("Question ID not found")
+            entry.update(answer_question(scoped_analyzer, question, filters))
+        except FilterError:
+            raise  # the request's filters are bad, not this question
+        except Exception as e:
+            entry["error"] = str(e)
+        results.append(entry)
+    return results
+
+def render_question(target, question, filters):
+    """Response body for one question, byte-for-byte what the insight endpoint would cache"""
+    with phase('compute'):
+        payload = answer_question(target, question, filters)
+    with phase('serialize'):
+        return dumps(payload)
+
+def compute_insight(target, question, filters):
+    """render_question traced: its time split and rows scanned are recorded per question
+    and returned with the body for profiling"""
+    with Trace() as trace:
+        body = render_question(target, question, filters)
+    for name, seconds in trace.breakdown().items():
+        insight_phases.inc(question.category, question.id, name, amount=seconds)
+    insight_rows.inc(question.category, question.id, amount=trace.rows_scanned)
+    return body, trace
+
+def warm_question(category, question_id, filters=None):
+    """Compute one question's response into the insight cache; returns False if it cannot be cached"""
+    question = REGISTRY.get(category, question_id)
+    if question is None or not question.available or not question.cacheable:
+        return False
+    filters = {k: str(v) for k, v in (filters or {}).items() if v is not None}
+    generation = insight_cache.generation
+    with current_snapshot() as live:
+        body = render_question(live.analyzer, question, filters)
+    insight_cache.set(insight_cache.key(category, question_id, filters), body, generation)
+    return True
+
+def load_prediction_models(directory=None):
+    """Load the trained models once, with the label encodings they were trained with: saved next to
+    them, or refitted on the served dataset the way preprocess_data fitted them"""
+    directory = directory or MODEL_DIR
+    encodings = LabelEncodings.open(directory) or LabelEncodings.build(snapshot.analyzer.store)
+    loaded, problems = load_models(directory, encodings)
+    for task, problem in problems.items():
+        app.logger.warning("Model %s unavailable: %s", task, problem)
+    batchers = {task: MicroBatcher(lambda vectors, model=model: list(zip(*model.predict_each(vectors))),
+                                   PREDICTION_BATCH, PREDICTION_WAIT, name=f'predict-{task}')
+                for task, model in loaded.items()}
+    return loaded, problems, batchers
+
+models, model_problems, model_batchers = {}, {}, {}  # loaded by create_app()
+
+def create_app():
+    """Load the dataset and the prediction models, once, and return the Flask app.
+
+    Nothing is loaded at import: shard workers started with spawn or forkserver
+    import this module again, and must not each load the dataset of their own.
+    """
+    global models, model_problems, model_batchers
+    with startup_lock:
+        if snapshot is None:
+            load_dataset()
+            models, model_problems, model_batchers = load_prediction_models()
+    return app
 
-@app.route('/api/insights/customer_behavior/<int:question_id>', methods=['GET'])
-@cache.memoize(timeout=3600)
-def get_customer_behavior_insights(question_id):
-    filters = request.args.to_dict()
-    try:
-        if question_id == 1:
-            result = analyzer.get_avg_purchase_frequency(filters)
-            viz = "metric"
-        elif question_id == 2:
-            result = analyzer.get_category_repurchase_rate(filters)
-            viz = "bar"
-        elif question_id == 3:
-            result = analyzer.get_customer_lifetime_value(filters)
-            viz = "bar"
-        elif question_id == 4:
-            result = analyzer.get_discount_response_analysis(filters)
-            viz = "bar"
-        elif question_id == 5:
-            result = analyzer.get_promo_vs_non_promo_spending(filters)
-            viz = "bar"
-        elif question_id == 6:
-            result = analyzer.get_rating_purchase_correlation(filters)
-            viz = "metric"
-        elif question_id == 7:
-            result = analyzer.get_weekday_vs_weekend_behavior(filters)
-            viz = "bar"
-        elif question_id == 8:
-            demo = filters.get('demo', 'gender')
-            result = analyzer.get_shipping_preference_by_demo(demo, filters)
-            viz = "heatmap"
-        else:
-            return jsonify({"error": "Question ID not found"}), 404
-        
-        return jsonify({
-            "summary": "Customer Behavior Analysis",
-            "data": result,
-            "visualization": viz
-        })
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
-    
-#operation insight endpoint
 # -------------------- API ENDPOINTS --------------------
-@app.route('/api/questions/operational_insights', methods=['GET'])
+@app.before_request
+def ensure_started():
+    if snapshot is None:  # served without create_app(), e.g. by a WSGI server importing app
+        create_app()
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    if 'request_start' in g:
+        http_latency.observe(time.perf_counter() - g.request_start, endpoint, request.method)
+    http_requests.inc(endpoint, request.method, response.status_code)
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return app.response_class(registry.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/questions/<category>', methods=['GET'])
 @cache.cached(timeout=3600)
-def get_operational_questions():
-    questions = [
-        {"id": 1, "text": "Stocking recommendations", "func": "get_stocking_recommendations", "viz": "list"},
-        {"id": 2, "text": "Seasonal demand spikes", "func": "get_seasonal_demand_spikes", "viz": "line"},
-        {"id": 3, "text": "Shipping preferences for high-value products", "func": "get_shipping_preferences_high_value", "viz": "pie"},
-        {"id": 4, "text": "Shipping impact by size/color", "func": "get_shipping_impact_size_color", "viz": "dual_heatmap"},
-        {"id": 5, "text": "Underperforming categories", "func": "get_underperforming_categories", "viz": "bar"},
-        {"id": 6, "text": "Popular payment methods", "func": "get_payment_method_frequency", "viz": "pie"},
-        {"id": 7, "text": "Revenue per payment method", "func": "get_revenue_per_payment_method", "viz": "bar"},
-        {"id": 8, "text": "Multi-category customers", "func": "get_multi_category_customers", "viz": "metric"}
-    ]
+def get_questions(category):
+    questions = REGISTRY.listing(category)
+    if questions is None:
+        return jsonify({"error": "Category not found"}), 404
     return jsonify(questions)
 
-@app.route('/api/insights/operational_insights/<int:question_id>', methods=['GET'])
-@cache.memoize(timeout=3600)
-def get_operational_insights(question_id):
+@app.route('/api/filters', methods=['GET'])
+def get_filter_options():
+    with current_snapshot() as live:
+        return jsonify(filter_options(live))
+
+@app.route('/api/insights/<category>/<int:question_id>', methods=['GET'])
+@cached_insight
+def get_insights(category, question_id):
+    question = REGISTRY.get(category, question_id)
+    if question is None:
+        return jsonify({"error": "Question ID not found"}), 404
     filters = request.args.to_dict()
+    start = time.perf_counter()
+    with current_snapshot() as live:
+        # Identical requests in flight against the same dataset share one computation,
+        # except profiled ones, which must time a computation of their own
+        key = (live.version, insight_cache.key(category, question_id, filters)) if not profiling() else object()
+        try:
+            body, trace = insight_pool.call(key, compute_insight, live.analyzer, question, filters)
+        except QuestionUnavailable as e:
+            return jsonify({"error": str(e)}), 404
+        except FilterError as e:
+            return jsonify({"error": str(e)}), 400
+        except Overloaded:
+            return server_busy()
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+    response = app.response_class(body, mimetype='application/json')
+    if profiling():
+        response.headers['Server-Timing'] = trace.server_timing(time.perf_counter() - start)
+    return response
+
+@app.route('/api/insights/batch', methods=['POST'])
+def get_batch_insights():
+    payload = request.get_json(silent=True) or {}
+    if not isinstance(payload, dict) or not isinstance(payload.get('filters') or {}, dict):
+        return jsonify({"error": "Expected a JSON object whose filters are an object"}), 400
+    items = payload.get('questions', [])
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        return jsonify({"error": "questions must be a list of {category, id} objects"}), 400
+    filters = {k: v for k, v in (payload.get('filters') or {}).items() if v is not None}
+    with current_snapshot() as live:
+        key = (live.version, 'batch', json.dumps([filters, items], sort_keys=True, default=str))
+        try:
+            results = insight_pool.call(key, run_batch, live.analyzer, filters, items)
+        except FilterError as e:
+            return jsonify({"error": str(e)}), 400
+        except Overloaded:
+            return server_busy()
+    return app.response_class(dumps({"filters": filters, "results": results}), mimetype='application/json')
+
+@app.route('/api/cache/warm', methods=['POST'])
+def warm_cache():
+    """Precompute responses for the given questions (default: all) under each filter set (default: none)"""
+    payload = request.get_json(silent=True) or {}
+    items = payload.get('questions') or [{"category": q.category, "id": q.id} for q in REGISTRY]
+    warmed = 0
     try:
-        if question_id == 1:
-            result = analyzer.get_stocking_recommendations(filters)
-            viz = "list"
-        elif question_id == 2:
-            result = analyzer.get_seasonal_demand_spikes(filters)
-            viz = "line"
-        elif question_id == 3:
-            result = analyzer.get_shipping_preferences_high_value(filters)
-            viz = "pie"
-        elif question_id == 4:
-            result = analyzer.get_shipping_impact_size_color(filters)
-            viz = "dual_heatmap"
-        elif question_id == 5:
-            result = analyzer.get_underperforming_categories(filters)
-            viz = "bar"
-        elif question_id == 6:
-            result = analyzer.get_payment_method_frequency(filters)
-            viz = "pie"
-        elif question_id == 7:
-            result = analyzer.get_revenue_per_payment_method(filters)
-            viz = "bar"
-        elif question_id == 8:
-            result = analyzer.get_multi_category_customers(filters)
-            viz = "metric"
-        else:
-            return jsonify({"error": "Question ID not found"}), 404
-        
-        return jsonify({
-            "summary": "Operational Insights Analysis",
-            "data": result,
-            "visualization": viz
-        })
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
-    
-#advanced insight
-# -------------------- API ENDPOINTS --------------------
-@app.route('/api/questions/advanced_insights', methods=['GET'])
-@cache.cached(timeout=3600)
-def get_advanced_questions():
-    questions = [
-        {"id": 1, "text": "Product size vs. purchase frequency", "func": "get_size_purchase_freq_correlation", "viz": "bar"},
-        {"id": 2, "text": "Revenue by review rating", "func": "get_revenue_by_rating", "viz": "scatter"},
-        {"id": 3, "text": "Discounts vs. ratings correlation", "func": "get_discount_rating_correlation", "viz": "metric"},
-        {"id": 4, "text": "Promo code usage trends", "func": "get_promo_usage_trends", "viz": "line"},
-        {"id": 5, "text": "Young customers' trendy preferences", "func": "get_young_customer_trends", "viz": "bar"},
-        {"id": 6, "text": "Promo usage by region", "func": "get_promo_usage_by_region", "viz": "heatmap"},
-        {"id": 7, "text": "Shipping preferences by product", "func": "get_shipping_preferences_by_product", "viz": "heatmap"},
-        {"id": 8, "text": "Seasonal revenue & category impact", "func": "get_seasonal_impact", "viz": "dual_line"}
-    ]
-    return jsonify(questions)
+        for filters in payload.get('filters') or [{}]:
+            for item in items:
+                warmed += warm_question(item.get('category'), int(item.get('id')), filters)
+    except FilterError as e:
+        return jsonify({"error": str(e), "warmed": warmed}), 400
+    return jsonify({"warmed": warmed, "cache": insight_cache.stats()})
 
-@app.route('/api/insights/advanced_insights/<int:question_id>', methods=['GET'])
-@cache.memoize(timeout=3600)
-def get_advanced_insights(question_id):
-    filters = request.args.to_dict()
+@app.route('/api/cache/warmup', methods=['GET'])
+def get_warmup_status():
+    return jsonify(warmer.status())
+
+@app.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    return jsonify(insight_cache.stats())
+
+@app.route('/api/serving/stats', methods=['GET'])
+def get_serving_stats():
+    return jsonify(insight_pool.stats())
+
+@app.route('/api/models', methods=['GET'])
+def get_models():
+    available = {task: dict(model.describe(), batching=model_batchers[task].stats()) for task, model in models.items()}
+    return jsonify({"models": available, "unavailable": model_problems})
+
+@app.route('/api/predict/<task>', methods=['POST'])
+def predict(task):
+    """Predictions for {"rows": [{feature: value, ...}, ...]} (one vectorized model call)
+    or {"row": {...}} (micro-batched with the single rows other requests are predicting)"""
+    if task not in MODEL_TASKS:
+        return jsonify({"error": "Model not found"}), 404
+    if task not in models:
+        return jsonify({"error": f"Model unavailable: {model_problems.get(task)}"}), 503
+    payload = request.get_json(silent=True) or {}
+    single = 'row' in payload
+    rows = [payload['row']] if single else payload.get('rows')
+    if not isinstance(rows, list) or not rows or not all(isinstance(row, dict) for row in rows):
+        return jsonify({"error": "Expected {\"rows\": [{feature: value, ...}]} or {\"row\": {...}}",
+                        "features": models[task].features}), 400
+    model = models[task]
     try:
-        if question_id == 1:
-            result = analyzer.get_size_purchase_freq_correlation(filters)
-            viz = "bar"
-        elif question_id == 2:
-            result = analyzer.get_revenue_by_rating(filters)
-            viz = "scatter"
-        elif question_id == 3:
-            result = analyzer.get_discount_rating_correlation(filters)
-            viz = "metric"
-        elif question_id == 4:
-            period = filters.get('period', 'month')
-            result = analyzer.get_promo_usage_trends(period, filters)
-            viz = "line"
-        elif question_id == 5:
-            result = analyzer.get_young_customer_trends(filters=filters)
-            viz = "bar"
-        elif question_id == 6:
-            result = analyzer.get_promo_usage_by_region(filters)
-            viz = "heatmap"
-        elif question_id == 7:
-            result = analyzer.get_shipping_preferences_by_product(filters)
-            viz = "heatmap"
-        elif question_id == 8:
-            result = analyzer.get_seasonal_impact(filters)
-            viz = "dual_line"
-        else:
-            return jsonify({"error": "Question ID not found"}), 404
-        
-        return jsonify({
-            "summary": "Advanced Insights Analysis",
-            "data": result,
-            "visualization": viz
-        })
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
-    
-#comparative insights
-# -------------------- API ENDPOINTS --------------------
-@app.route('/api/questions/comparative_insights', methods=['GET'])
-@cache.cached(timeout=3600)
-def get_comparative_questions():
-    questions = [
-        {"id": 1, "text": "Purchase frequency by region", "func": "get_purchase_freq_by_region", "viz": "bar"},
-        {"id": 2, "text": "Category popularity: Subscribed vs. Non-Subscribed", "func": "get_category_popularity_subscribed", "viz": "heatmap"},
-        {"id": 3, "text": "Review ratings by gender", "func": "get_gender_rating_differences", "viz": "bar"},
-        {"id": 4, "text": "Average spending: Subscribed vs. Non-Subscribed", "func": "get_avg_spending_subscribed_vs_non", "viz": "bar"},
-        {"id": 5, "text": "Urban vs. Rural category preferences", "func": "get_urban_rural_category_preferences", "viz": "heatmap"}
-    ]
-    return jsonify(questions)
+        vectors = model.vectors(rows)
+    except ValueError as e:
+        return jsonify({"error": str(e), "features": model.features}), 400
+    if single:
+        prediction, hit = model_batchers[task].call(vectors[0])
+        predictions, cached = [prediction], int(hit)
+    else:
+        predictions, cached = model.predict_vectors(vectors)
+    prediction_rows.inc(task, 'hit', amount=cached)
+    prediction_rows.inc(task, 'miss', amount=len(rows) - cached)
+    return app.response_class(dumps({"task": task, "predictions": predictions, "cached": cached}),
+                              mimetype='application/json')
 
-@app.route('/api/insights/comparative_insights/<int:question_id>', methods=['GET'])
-@cache.memoize(timeout=3600)
-def get_comparative_insights(question_id):
-    filters = request.args.to_dict()
+@app.route('/api/dataset', methods=['GET'])
+def get_dataset_status():
+    return jsonify({"snapshot": snapshot.describe(), "reload": reloader.status()})
+
+@app.route('/api/dataset/reload', methods=['POST'])
+def reload_data():
+    """Reload the processed dataset in the background; requests are served from the current one until
+    the new one, with its affected insights recomputed, is swapped in"""
+    payload = request.get_json(silent=True) or {}
+    if not reloader.start(reload_dataset, None, None, payload.get('warm', True) is not False):
+        return jsonify({"error": "A reload is already running", "reload": reloader.status()}), 409
+    return jsonify({"reload": reloader.status()}), 202
+
+
+def serve(mode=None):
+    if (mode or SERVING_MODE) != "production":
+        # The reloader's watching parent only restarts the server process, which does the loading
+        if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+            create_app()
+        app.run(debug=True)
+        return
+    create_app()
     try:
-        if question_id == 1:
-            result = analyzer.get_purchase_freq_by_region(filters)
-            viz = "bar"
-        elif question_id == 2:
-            result = analyzer.get_category_popularity_subscribed(filters)
-            viz = "heatmap"
-        elif question_id == 3:
-            result = analyzer.get_gender_rating_differences(filters)
-            viz = "bar"
-        elif question_id == 4:
-            result = analyzer.get_avg_spending_subscribed_vs_non(filters)
-            viz = "bar"
-        elif question_id == 5:
-            result = analyzer.get_urban_rural_category_preferences(filters)
-            viz = "heatmap"
-        else:
-            return jsonify({"error": "Question ID not found"}), 404
-        
-        return jsonify({
-            "summary": "Comparative Insights Analysis",
-            "data": result,
-            "visualization": viz
-        })
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        from waitress import serve as waitress_serve
+    except ImportError:
+        app.run(threaded=True, debug=False, use_reloader=False)
+    else:
+        waitress_serve(app, host='127.0.0.1', port=5000, threads=SERVING_THREADS)
 
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    serve()
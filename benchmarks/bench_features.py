@@ -0,0 +1,128 @@
+# benchmarks/bench_features.py
+"""Wall time and peak memory of the feature build: notebook merge chain vs pipeline.build_features.
+
+    python benchmarks/bench_features.py --rows 4000 1000000 10000000
+
+10M rows is opt-in: the raw frame alone is ~8 GB, and the merge chain
+needs about as much again on top of it.
+"""
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from pipeline import build_features  # noqa: E402
+
+SEED_DATASET = os.path.join(ROOT, 'src', 'backend', 'new_raw_dataset.csv')
+
+
+def notebook_features(data):
+    """The notebook's processing cell, one groupby + merge per derived column (baseline)"""
+    data = data.copy()
+    data["purchase_date"] = pd.to_datetime(data["purchase_date"], format="%d-%m-%Y", errors='coerce')
+    data['month'] = data['purchase_date'].dt.month_name()
+    data['day_of_week'] = data['purchase_date'].dt.day_name()
+    data['season'] = data['purchase_date'].dt.month % 12 // 3 + 1
+    data['is_weekend'] = data['day_of_week'].isin(['Saturday', 'Sunday']).astype(int)
+    data['total_revenue'] = data['price'] * data['quantity']
+
+    category_sales = data.groupby('category')['total_revenue'].sum().reset_index()
+    category_sales.rename(columns={'total_revenue': 'category_sales'}, inplace=True)
+    data = data.merge(category_sales, on='category', how='left')
+    customer_lifetime_value = data.groupby('customer_id')['total_revenue'].sum().reset_index()
+    customer_lifetime_value.rename(columns={'total_revenue': 'customer_lifetime_value'}, inplace=True)
+    data = data.merge(customer_lifetime_value, on='customer_id', how='left')
+    purchase_frequency = data.groupby('customer_id')['purchase_id'].count().reset_index()
+    purchase_frequency.rename(columns={'purchase_id': 'purchase_frequency'}, inplace=True)
+    data = data.merge(purchase_frequency, on='customer_id', how='left')
+    popularity_score = data.groupby('item_purchased').agg(
+        total_purchases=('quantity', 'sum'),
+        total_revenue=('total_revenue', 'sum'),
+        average_review_rating=('review_rating', 'mean')
+    ).reset_index()
+    popularity_score['popularity_score'] = (
+        popularity_score['total_purchases'] * 0.5 +
+        popularity_score['total_revenue'] * 0.3 +
+        popularity_score['average_review_rating'] * 0.2
+    )
+    data = data.merge(popularity_score[['item_purchased', 'popularity_score']], on='item_purchased', how='left')
+    threshold = data['popularity_score'].quantile(0.8)
+    data['trend_flag'] = (data['popularity_score'] >= threshold).astype(int)
+    with_promo = data[data['promo_code_used'] == 1].groupby('item_purchased')['total_revenue'].sum().reset_index()
+    without_promo = data[data['promo_code_used'] == 0].groupby('item_purchased')['total_revenue'].sum().reset_index()
+    discount_effectiveness = with_promo.merge(without_promo, on='item_purchased', suffixes=('_with', '_without'))
+    discount_effectiveness['discount_effectiveness'] = (discount_effectiveness['total_revenue_with']
+                                                        - discount_effectiveness['total_revenue_without'])
+    data = data.merge(discount_effectiveness[['item_purchased', 'discount_effectiveness']], on='item_purchased', how='left')
+    average_spending = data.groupby('customer_id')['total_revenue'].mean().reset_index()
+    average_spending.rename(columns={'total_revenue': 'average_spending'}, inplace=True)
+    data = data.merge(average_spending, on='customer_id', how='left')
+    average_rating_per_category = data.groupby('category')['review_rating'].mean().reset_index()
+    average_rating_per_category.rename(columns={'review_rating': 'average_rating_per_category'}, inplace=True)
+    data = data.merge(average_rating_per_category, on='category', how='left')
+    promo_code_spending = data[data['promo_code_used'] == 1].groupby('customer_id')['total_revenue'].mean().reset_index()
+    promo_code_spending.rename(columns={'total_revenue': 'promo_code_spending'}, inplace=True)
+    data = data.merge(promo_code_spending, on='customer_id', how='left')
+    age_category_preference = data.groupby(['age', 'category']).size().reset_index(name='count')
+    age_category_preference = age_category_preference.loc[age_category_preference.groupby('age')['count'].idxmax()]
+    age_category_preference.rename(columns={'category': 'most_purchased_category_by_age'}, inplace=True)
+    data = data.merge(age_category_preference[['age', 'most_purchased_category_by_age']], on='age', how='left')
+    gender_category_preference = data.groupby(['gender', 'category']).size().reset_index(name='count')
+    gender_category_preference = gender_category_preference.loc[
+        gender_category_preference.groupby('gender')['count'].idxmax()]
+    gender_category_preference.rename(columns={'category': 'most_purchased_category_by_gender'}, inplace=True)
+    data = data.merge(gender_category_preference[['gender', 'most_purchased_category_by_gender']], on='gender', how='left')
+    preferred_shipping_type = data.groupby('category')['shipping_type'].agg(lambda x: x.mode()[0]).reset_index()
+    preferred_shipping_type.rename(columns={'shipping_type': 'preferred_shipping_type'}, inplace=True)
+    return data.merge(preferred_shipping_type, on='category', how='left')
+
+
+def make_raw(n_rows, seed=0):
+    """n_rows raw transactions resampled from the shipped dataset, ~4 purchases per customer"""
+    base = pd.read_csv(SEED_DATASET)
+    if n_rows == len(base):
+        return base
+    rng = np.random.default_rng(seed)
+    raw = base.iloc[rng.integers(0, len(base), n_rows)].reset_index(drop=True)
+    raw['customer_id'] = pd.Series(rng.integers(0, max(n_rows // 4, 1), n_rows)).map('C{:09d}'.format)
+    raw['purchase_id'] = pd.RangeIndex(n_rows).map('P{:09d}'.format)
+    return raw
+
+
+def measure(build, raw):
+    gc.collect()
+    start = time.perf_counter()
+    build(raw)
+    seconds = time.perf_counter() - start
+    gc.collect()
+    tracemalloc.start()
+    build(raw)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[4000, 1_000_000])
+    args = parser.parse_args()
+
+    print(f"{'rows':>12} {'impl':>16} {'seconds':>10} {'peak MiB':>10}")
+    for n_rows in args.rows:
+        raw = make_raw(n_rows)
+        for name, build in (('notebook merges', notebook_features), ('build_features', build_features)):
+            seconds, peak = measure(build, raw)
+            print(f"{n_rows:>12,} {name:>16} {seconds:>10.3f} {peak / 2**20:>10.1f}", flush=True)
+        del raw
+
+
+if __name__ == '__main__':
+    main()
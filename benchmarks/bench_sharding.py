@@ -0,0 +1,77 @@
+# benchmarks/bench_sharding.py
+"""Scaling of sharded execution with worker processes: analyzer aggregates and the feature build.
+
+    python benchmarks/bench_sharding.py --rows 2000000 --workers 1 2 4 8
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_features import make_raw  # noqa: E402
+from parallel import ShardPool  # noqa: E402
+from pipeline import build_features, write_dataset  # noqa: E402
+from streaming import ChunkSource, Comoments, GroupedAggregate, run  # noqa: E402
+
+# The heavy, non-cube questions as partial aggregates: shipping by product, lifetime value,
+# customer x category pairs (repurchase / multi-category) and a correlation
+QUERIES = {
+    'shipping_by_product': lambda: [GroupedAggregate(['item_purchased', 'shipping_type'], how='size')],
+    'lifetime_value': lambda: [GroupedAggregate('customer_id', 'total_revenue')],
+    'customer_categories': lambda: [GroupedAggregate(['customer_id', 'category'], how='size')],
+    'rating_correlation': lambda: [Comoments('review_rating', 'purchase_frequency')],
+}
+
+
+def timed(function, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=2_000_000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, os.cpu_count()])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    workers = sorted(set(args.workers))
+
+    raw = make_raw(args.rows)
+    directory = os.path.join(tempfile.mkdtemp(prefix='bench-shards-'), 'dataset.cols')
+    try:
+        print(f"{'rows':>12} {'task':>20} {'workers':>8} {'seconds':>10} {'speedup':>8}")
+        baseline = timed(lambda: build_features(raw), 1)
+        print(f"{args.rows:>12,} {'build_features':>20} {'serial':>8} {baseline:>10.3f} {1.0:>8.2f}", flush=True)
+        for n in workers:
+            seconds = timed(lambda: build_features(raw, workers=n), 1)
+            print(f"{args.rows:>12,} {'build_features':>20} {n:>8} {seconds:>10.3f} {baseline / seconds:>8.2f}",
+                  flush=True)
+        write_dataset(build_features(raw), directory)
+        del raw
+
+        source = ChunkSource(directory)
+        for name, partials in QUERIES.items():
+            baseline = timed(lambda: [p.result() for p in run(source, {}, partials())], args.repeat)
+            print(f"{args.rows:>12,} {name:>20} {'serial':>8} {baseline:>10.3f} {1.0:>8.2f}", flush=True)
+            for n in workers:
+                pool = ShardPool(directory, workers=n)
+                pool.run({}, partials())  # start the workers and map the dataset before timing
+                seconds = timed(lambda: [p.result() for p in pool.run({}, partials())], args.repeat)
+                pool.close()
+                print(f"{args.rows:>12,} {name:>20} {n:>8} {seconds:>10.3f} {baseline / seconds:>8.2f}", flush=True)
+    finally:
+        shutil.rmtree(os.path.dirname(directory), ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
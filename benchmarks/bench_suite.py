@@ -0,0 +1,203 @@
+# benchmarks/bench_suite.py
+"""Latency, throughput and peak RSS of the feature build and every analyzer question, per dataset size.
+
+    python benchmarks/bench_suite.py --rows 10000 100000 1000000 --output results.json
+    python benchmarks/bench_suite.py --rows 10000 100000 --update-baseline
+
+Each size runs in a fresh process on synthetic data (benchmarks/synth.py):
+the notebook merge chain and pipeline.build_features are timed, the result
+is written as the memory-mapped dataset and loaded the way the API loads it,
+and every BusinessInsightsAnalyzer question is timed under filters of
+decreasing selectivity. Results go to a JSON file and are compared with the
+stored baseline; any task slower than baseline * (1 + tolerance) (and by more
+than the noise floor) is reported and makes the run exit with status 1.
+"""
+import argparse
+import inspect
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# Filter sets from every row down to a few percent of them
+SELECTIVITIES = {
+    'all': {},
+    'region': {'region': 'North'},
+    'region+category': {'region': 'North', 'category': 'Books'},
+    'region+category+gender': {'region': 'North', 'category': 'Books', 'gender': 'Male'},
+}
+
+# The notebook's merge chain holds several copies of the table; above this it is skipped
+NOTEBOOK_MAX_ROWS = 2_000_000
+
+
+def peak_rss_mib():
+    """Peak resident set size of this process so far"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10  # bytes on macOS, KiB elsewhere
+
+
+def timed(function, repeat):
+    """Median and best wall time of repeat calls"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), min(times)
+
+
+def record(n_rows, task, seconds, best, selectivity=None, selected_rows=None, **extra):
+    selected_rows = n_rows if selected_rows is None else selected_rows
+    return dict({
+        'rows': n_rows,
+        'task': task,
+        'selectivity': selectivity,
+        'selected_rows': selected_rows,
+        'seconds': seconds,
+        'best_seconds': best,
+        'rows_per_second': selected_rows / seconds if seconds else None,
+        'peak_rss_mib': peak_rss_mib(),
+    }, **extra)
+
+
+def run_size(n_rows, repeat, seed):
+    """Every measurement for one dataset size; runs in its own process so peak RSS is per size"""
+    import synth
+    from bench_features import notebook_features
+    from pipeline import build_features, write_dataset
+
+    results = []
+    raw = synth.generate(n_rows, seed)
+    if n_rows <= NOTEBOOK_MAX_ROWS:
+        seconds, best = timed(lambda: notebook_features(raw), 1)
+        results.append(record(n_rows, 'features.notebook', seconds, best))
+    features = None
+
+    def build():
+        nonlocal features
+        features = build_features(raw)
+    seconds, best = timed(build, 1)
+    results.append(record(n_rows, 'features.build_features', seconds, best))
+    del raw
+
+    directory = os.path.join(tempfile.mkdtemp(prefix='bench-suite-'), 'dataset.cols')
+    try:
+        seconds, best = timed(lambda: write_dataset(features, directory), 1)
+        results.append(record(n_rows, 'dataset.write', seconds, best))
+        del features
+
+        os.environ['SHOP_DATA_PATH'] = directory
+        start = time.perf_counter()
+        import app
+        app.create_app()  # loads the dataset as the server does at startup
+        app.warmer.cancel()
+        app.warmer.wait()
+        seconds = time.perf_counter() - start
+        results.append(record(n_rows, 'dataset.load', seconds, seconds))
+
+        analyzer = app.snapshot.analyzer
+        methods = [name for name, _ in inspect.getmembers(type(analyzer), inspect.isfunction)
+                   if name.startswith('get_')]
+        for selectivity, filters in SELECTIVITIES.items():
+            selected = analyzer.store.select(filters)
+            selected_rows = n_rows if selected is None else len(selected)
+            for name in methods:
+                method = getattr(analyzer, name)
+                try:
+                    seconds, best = timed(lambda: method(filters=dict(filters)), repeat)
+                except Exception as e:
+                    results.append(dict(record(n_rows, f'analyzer.{name}', None, None, selectivity, selected_rows),
+                                        error=f"{type(e).__name__}: {e}"))
+                    continue
+                results.append(record(n_rows, f'analyzer.{name}', seconds, best, selectivity, selected_rows))
+    finally:
+        shutil.rmtree(os.path.dirname(directory), ignore_errors=True)
+    return results
+
+
+def compare(results, baseline, tolerance, floor):
+    """(result, baseline result) pairs that got slower than the tolerance allows"""
+    def key(entry):
+        return entry['rows'], entry['task'], entry['selectivity']
+
+    previous = {key(entry): entry for entry in baseline.get('results', [])}
+    regressions = []
+    for entry in results:
+        before = previous.get(key(entry))
+        if before is None or entry['seconds'] is None or before['seconds'] is None:
+            continue
+        if entry['seconds'] > before['seconds'] * (1 + tolerance) and entry['seconds'] - before['seconds'] > floor:
+            regressions.append((entry, before))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--repeat', type=int, default=5, help="timed calls per analyzer question")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--tolerance', type=float, default=0.5, help="allowed slowdown before flagging, 0.5 = 50%%")
+    parser.add_argument('--floor', type=float, default=0.002, help="ignore slowdowns smaller than this (seconds)")
+    parser.add_argument('--update-baseline', action='store_true', help="store these results as the new baseline")
+    args = parser.parse_args()
+
+    results = []
+    context = multiprocessing.get_context('spawn')
+    for n_rows in args.rows:
+        with context.Pool(1) as pool:
+            size_results = pool.apply(run_size, (n_rows, args.repeat, args.seed))
+        results.extend(size_results)
+        for entry in size_results:
+            if entry['task'].startswith('analyzer.') and entry['selectivity'] != 'all':
+                continue
+            seconds = f"{entry['seconds']:.4f}" if entry['seconds'] is not None else 'error'
+            print(f"{n_rows:>12,} {entry['task']:>48} {seconds:>10} {entry['peak_rss_mib']:>9.0f} MiB", flush=True)
+
+    report = {
+        'meta': {
+            'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'repeat': args.repeat,
+            'seed': args.seed,
+        },
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=1)
+    print(f"{len(results)} results written to {args.output}")
+
+    status = 0
+    if os.path.exists(args.baseline) and not args.update_baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance, args.floor)
+        for entry, before in regressions:
+            print(f"REGRESSION {entry['rows']:,} rows {entry['task']} [{entry['selectivity'] or '-'}]: "
+                  f"{before['seconds']:.4f}s -> {entry['seconds']:.4f}s")
+        print(f"{len(regressions)} regression(s) against {args.baseline}")
+        status = 1 if regressions else 0
+    if args.update_baseline:
+        shutil.copyfile(args.output, args.baseline)
+        print(f"baseline updated: {args.baseline}")
+    sys.exit(status)
+
+
+if __name__ == '__main__':
+    main()
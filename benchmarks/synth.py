@@ -0,0 +1,145 @@
+# benchmarks/synth.py
+"""Synthetic raw transactions in the schema of new_raw_dataset.csv, with realistic skew.
+
+    python benchmarks/synth.py --rows 10000000 --output synthetic_10m.csv
+
+Customers and items follow power laws (a few heavy buyers and best-selling
+items), every item belongs to one category and has its own price level,
+customers keep the same demographics across purchases, and purchase dates
+peak around the year-end holidays and on weekends. Output is generated and
+written chunk by chunk, so 100M rows never have to fit in memory.
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+RAW_COLUMNS = ['customer_id', 'age', 'gender', 'region', 'product_id', 'category', 'item_purchased', 'price',
+               'quantity', 'product_size', 'product_color', 'purchase_id', 'purchase_date', 'payment_method',
+               'promo_code_used', 'shipping_type', 'review_rating', 'is_subscribed', 'previous_purchases']
+
+CATEGORIES = {'Apparel': 0.28, 'Electronics': 0.22, 'Home Decor': 0.2, 'Books': 0.17, 'Toys': 0.13}
+REGIONS = {'East': 0.32, 'North': 0.27, 'West': 0.23, 'South': 0.18}
+GENDERS = {'Female': 0.49, 'Male': 0.47, 'Other': 0.04}
+SIZES = {'Medium': 0.45, 'Large': 0.3, 'Small': 0.25}
+COLORS = {'Black': 0.3, 'White': 0.25, 'Blue': 0.2, 'Red': 0.13, 'Green': 0.12}
+PAYMENT_METHODS = {'Credit Card': 0.4, 'Debit Card': 0.25, 'PayPal': 0.22, 'Cash': 0.13}
+SHIPPING_TYPES = {'Standard': 0.7, 'Expedited': 0.3}
+RATINGS = {5: 0.35, 4: 0.33, 3: 0.17, 2: 0.08, 1: 0.07}
+# Relative sales per calendar month, January first
+MONTH_WEIGHTS = np.array([0.8, 0.7, 0.85, 0.9, 0.95, 0.9, 0.9, 1.0, 0.95, 1.05, 1.5, 1.9])
+
+CUSTOMER_SKEW = 0.5  # exponent of the customer purchase-count power law
+ITEM_SKEW = 0.9      # exponent of the item popularity power law
+ROWS_PER_CUSTOMER = 4
+N_ITEMS = 2000
+START_DATE = '2023-01-01'
+END_DATE = '2024-12-31'
+CHUNKSIZE = 1_000_000
+
+
+def _draw(rng, choices, size):
+    labels = list(choices)
+    return np.asarray(labels, dtype=object)[rng.choice(len(labels), size=size, p=list(choices.values()))]
+
+
+def _power_law_cdf(n, exponent):
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    cdf = np.cumsum(weights)
+    return cdf / cdf[-1]
+
+
+class Generator:
+    """Draws raw transaction chunks from fixed customer, item and calendar tables"""
+
+    def __init__(self, n_rows, seed=0, n_customers=None, n_items=N_ITEMS):
+        self.rng = np.random.default_rng(seed)
+        rng = self.rng
+        self.n_customers = n_customers or max(n_rows // ROWS_PER_CUSTOMER, 1)
+        self.n_items = n_items
+        self._customer_cdf = _power_law_cdf(self.n_customers, CUSTOMER_SKEW)
+        self._item_cdf = _power_law_cdf(n_items, ITEM_SKEW)
+        # Customer ranks are shuffled so heavy buyers are spread over regions and ages
+        self._customer_order = rng.permutation(self.n_customers)
+        self.customer_age = rng.integers(18, 70, self.n_customers).astype(np.int16)
+        self.customer_gender = _draw(rng, GENDERS, self.n_customers)
+        self.customer_region = _draw(rng, REGIONS, self.n_customers)
+        self.customer_subscribed = rng.random(self.n_customers) < 0.35
+        self.item_category = _draw(rng, CATEGORIES, n_items)
+        self.item_price = np.round(np.clip(rng.lognormal(np.log(80), 0.8, n_items), 10, 500), 2)
+        self.item_name = np.array([f'item-{i:05d}' for i in range(n_items)], dtype=object)
+        self.item_product = np.array([f'PRD{i:07d}' for i in range(n_items)], dtype=object)
+        days = pd.date_range(START_DATE, END_DATE, freq='D')
+        weights = MONTH_WEIGHTS[days.month - 1] * np.where(days.dayofweek >= 5, 1.3, 1.0)
+        self._day_cdf = np.cumsum(weights) / weights.sum()
+        self._day_labels = np.asarray(days.strftime('%d-%m-%Y'), dtype=object)
+        self._next_purchase = 0
+
+    def chunk(self, size):
+        rng = self.rng
+        customers = self._customer_order[np.searchsorted(self._customer_cdf, rng.random(size))]
+        items = np.searchsorted(self._item_cdf, rng.random(size))
+        days = np.searchsorted(self._day_cdf, rng.random(size))
+        purchases = np.arange(self._next_purchase, self._next_purchase + size)
+        self._next_purchase += size
+        promo = rng.random(size) < 0.3
+        # Prices vary a little around each item's level and drop when a promo code is used
+        price = self.item_price[items] * rng.uniform(0.9, 1.1, size) * np.where(promo, 0.85, 1.0)
+        return pd.DataFrame({
+            'customer_id': pd.Series(customers).map('C{:09d}'.format),
+            'age': self.customer_age[customers],
+            'gender': self.customer_gender[customers],
+            'region': self.customer_region[customers],
+            'product_id': self.item_product[items],
+            'category': self.item_category[items],
+            'item_purchased': self.item_name[items],
+            'price': np.round(np.clip(price, 10, 500), 2),
+            'quantity': np.minimum(rng.geometric(0.35, size), 9),
+            'product_size': _draw(rng, SIZES, size),
+            'product_color': _draw(rng, COLORS, size),
+            'purchase_id': pd.Series(purchases).map('T{:011d}'.format),
+            'purchase_date': self._day_labels[days],
+            'payment_method': _draw(rng, PAYMENT_METHODS, size),
+            'promo_code_used': promo,
+            'shipping_type': _draw(rng, SHIPPING_TYPES, size),
+            'review_rating': _draw(rng, RATINGS, size).astype(np.int64),
+            'is_subscribed': self.customer_subscribed[customers],
+            'previous_purchases': rng.integers(1, 21, size),
+        }, columns=RAW_COLUMNS)
+
+
+def chunks(n_rows, seed=0, chunksize=CHUNKSIZE, **options):
+    """n_rows synthetic raw transactions as frames of at most chunksize rows"""
+    generator = Generator(n_rows, seed, **options)
+    for start in range(0, n_rows, chunksize):
+        yield generator.chunk(min(chunksize, n_rows - start))
+
+
+def generate(n_rows, seed=0, **options):
+    """n_rows synthetic raw transactions in one frame"""
+    return pd.concat(chunks(n_rows, seed, **options), ignore_index=True)
+
+
+def write_csv(path, n_rows, seed=0, chunksize=CHUNKSIZE, **options):
+    if os.path.exists(path):
+        os.remove(path)
+    for position, chunk in enumerate(chunks(n_rows, seed, chunksize, **options)):
+        chunk.to_csv(path, mode='a', header=position == 0, index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--output', required=True, help="raw CSV to write")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--customers', type=int, help=f"distinct customers (default rows / {ROWS_PER_CUSTOMER})")
+    parser.add_argument('--items', type=int, default=N_ITEMS)
+    parser.add_argument('--chunksize', type=int, default=CHUNKSIZE)
+    args = parser.parse_args()
+    write_csv(args.output, args.rows, args.seed, args.chunksize, n_customers=args.customers, n_items=args.items)
+    print(f"{args.rows:,} synthetic transactions written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+# charts.py
+import pandas as pd
+import plotly.express as px
+
+from encoding import is_matrix
+
+# Visualization types the dashboard shows as a value or a table rather than as a chart
+VALUE_TYPES = ('metric', 'list')
+
+
+def matrix_frame(data):
+    """DataFrame from the API's matrix form: row labels, column labels and a flat value array (null = missing)"""
+    values = pd.array(data["values"], dtype="Float64").to_numpy(dtype=float, na_value=float("nan"))
+    return pd.DataFrame(values.reshape(len(data["rows"]), len(data["columns"])),
+                        index=pd.Index(data["rows"], name=data.get("row_name")),
+                        columns=pd.Index(data["columns"], name=data.get("column_name")))
+
+
+def bar(data, title=None):
+    return px.bar(x=list(data.keys()), y=list(data.values()), title=title)
+
+
+def heatmap(data, title=None):
+    """Heatmap of a matrix; flat {label: value} data has a single axis and gets a bar chart instead"""
+    if not is_matrix(data):
+        return bar(data, title)
+    frame = matrix_frame(data)
+    return px.imshow(frame, x=[str(c) for c in frame.columns], y=[str(r) for r in frame.index],
+                     aspect="auto", title=title)
+
+
+def figures(data, viz_type):
+    """Plotly figures for one question's data, in display order, or None when the type has no chart"""
+    if viz_type == "bar":
+        return [bar(data)]
+    if viz_type == "line":
+        return [px.line(x=list(data.keys()), y=list(data.values()))]
+    if viz_type == "pie":
+        return [px.pie(names=list(data.keys()), values=list(data.values()))]
+    if viz_type == "scatter":
+        return [px.scatter(x=list(data.keys()), y=list(data.values()))]
+    if viz_type == "dual_bar":
+        return [bar(data['size'], "By Size"), bar(data['color'], "By Color")]
+    if viz_type == "heatmap":
+        return [heatmap(data)]
+    if viz_type == "dual_heatmap":
+        return [heatmap(data['size'], "By Size"), heatmap(data['color'], "By Color")]
+    if viz_type == "dual_line":
+        return [px.line(x=list(data['revenue'].keys()), y=list(data['revenue'].values()), title="Revenue"),
+                px.line(matrix_frame(data['category_sales']), title="By Category")]
+    return None
@@ -0,0 +1,561 @@
+# columnar.py
+import json
+import os
+import shutil
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+FORMAT_VERSION = 1
+
+# Low-cardinality columns that can be used as equality filters; each gets an inverted index
+FILTER_COLUMNS = ['region', 'category', 'gender', 'season', 'is_subscribed', 'shipping_type']
+
+# Transaction date column, stored as dd-mm-yyyy text, and the request args bounding it (inclusive;
+# yyyy-mm-dd or dd-mm-yyyy). Rows are kept in date order by a DateIndex so a range is two binary searches
+DATE_COLUMN = 'purchase_date'
+DATE_FORMAT = "%d-%m-%Y"
+RANGE_FILTERS = ('start', 'end')
+NO_DAY = np.iinfo(np.int32).min  # day number of a missing or unparseable date
+
+# Numeric columns accepting <name>_min / <name>_max request args (inclusive bounds); each is kept
+# presorted by a ValueIndex so a range is two binary searches
+VALUE_RANGES = {'age': 'age', 'price': 'price', 'rating': 'review_rating'}
+BOUND_FILTERS = {f'{prefix}_{side}': (column, side) for prefix, column in VALUE_RANGES.items() for side in ('min', 'max')}
+_EPOCH = date(1970, 1, 1)
+
+
+class FilterError(ValueError):
+    """A request filter value that cannot be applied, e.g. a malformed date or bound"""
+
+
+def _code_dtype(n_labels):
+    """Smallest signed integer type that can hold the codes (and -1 for missing)"""
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_labels < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+class ColumnarStore:
+    """In-memory, column-oriented copy of the processed dataset.
+
+    Text columns are dictionary-encoded into integer codes (labels kept sorted so
+    grouping order matches plain pandas), numeric columns are kept as typed
+    contiguous arrays. Requests never copy the table: filters resolve to row ids
+    and only the columns a query asks for are gathered.
+
+    save() writes the store as a directory of .npy files that open() memory-maps,
+    so startup does no parsing and every worker process shares the same
+    page-cached copy of the data.
+
+    Derived columns are not stored: a function computes their values at the
+    requested rows (the per-customer columns are gathered from the customer
+    profiles this way), and they are read like any other column.
+    """
+
+    def __init__(self, columns, dictionaries=None, index=None, dates=None, ranges=None):
+        self.columns = columns
+        self.dictionaries = dictionaries or {}
+        self.n_rows = len(next(iter(columns.values()))) if columns else 0
+        self._dtypes = {}
+        self.index = index or FilterIndex.build(self, [name for name in FILTER_COLUMNS if name in columns])
+        self._dates = dates
+        self._ranges = dict(ranges or {})  # numeric column -> ValueIndex, built on first use when not saved
+        self.derived = {}  # column -> function(rows) returning its values at those rows (all rows for None)
+        self.profiles = None  # CustomerProfiles the per-customer columns are derived from, when attached
+
+    @classmethod
+    def from_frame(cls, df):
+        columns, dictionaries = {}, {}
+        for name in df.columns:
+            series = df[name]
+            if pd.api.types.is_numeric_dtype(series):
+                columns[name] = np.ascontiguousarray(series.to_numpy())
+            else:
+                codes, labels = pd.factorize(series, sort=True)
+                columns[name] = np.ascontiguousarray(codes.astype(_code_dtype(len(labels))))
+                dictionaries[name] = np.asarray(labels, dtype=object)
+        return cls(columns, dictionaries)
+
+    # -------------------- ON-DISK FORMAT --------------------
+    def save(self, directory):
+        """Write codes, dictionaries and numeric columns as .npy files plus a manifest"""
+        os.makedirs(os.path.join(directory, 'columns'), exist_ok=True)
+        os.makedirs(os.path.join(directory, 'dictionaries'), exist_ok=True)
+        for name, values in self.columns.items():
+            save_array(os.path.join(directory, 'columns', f'{name}.npy'), values)
+        for name, labels in self.dictionaries.items():
+            save_array(os.path.join(directory, 'dictionaries', f'{name}.npy'), labels)
+        self.index.save(os.path.join(directory, 'index'))
+        if self.dates is not None:
+            self.dates.save(os.path.join(directory, 'dates'))
+        for name in VALUE_RANGES.values():
+            if self.value_index(name) is not None:
+                self.value_index(name).save(os.path.join(directory, 'ranges'), name)
+        if self.profiles is not None:
+            self.profiles.save(directory)
+        manifest = {
+            'version': FORMAT_VERSION,
+            'n_rows': self.n_rows,
+            'columns': [{'name': name, 'dtype': str(values.dtype), 'categorical': name in self.dictionaries}
+                        for name, values in self.columns.items()],
+            'derived': list(self.derived),
+        }
+        with open(os.path.join(directory, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f, indent=1)
+
+    @classmethod
+    def open(cls, directory):
+        """Memory-map a store written by save(); nothing is parsed or copied"""
+        with open(os.path.join(directory, 'manifest.json')) as f:
+            manifest = json.load(f)
+        if manifest['version'] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported dataset format version {manifest['version']} in {directory}")
+        columns, dictionaries = {}, {}
+        for column in manifest['columns']:
+            name = column['name']
+            columns[name] = _load(os.path.join(directory, 'columns', f'{name}.npy'))
+            if column['categorical']:
+                dictionaries[name] = _load(os.path.join(directory, 'dictionaries', f'{name}.npy'))
+        index = FilterIndex.load(os.path.join(directory, 'index'), columns, dictionaries)
+        ranges = {name: ValueIndex.load(os.path.join(directory, 'ranges'), name, columns[name])
+                  for name in VALUE_RANGES.values() if name in columns}
+        store = cls(columns, dictionaries, index, DateIndex.load(os.path.join(directory, 'dates')),
+                    {name: value_index for name, value_index in ranges.items() if value_index is not None})
+        if manifest.get('derived'):
+            from profiles import CustomerProfiles  # profiles builds on this module
+            CustomerProfiles.open(directory, store).attach(store)
+        return store
+
+    def __contains__(self, name):
+        return name in self.columns or name in self.derived
+
+    @property
+    def names(self):
+        """Every column, stored and derived"""
+        return list(self.columns) + list(self.derived)
+
+    def derive(self, functions):
+        """Add derived columns: name -> function(rows) computing the values at rows (every row for None)"""
+        self.derived.update(functions)
+
+    @property
+    def dates(self):
+        """DateIndex over DATE_COLUMN (built on first use when the store was saved without one), or None"""
+        if self._dates is None and DATE_COLUMN in self.columns:
+            self._dates = DateIndex.build(self)
+        return self._dates
+
+    def value_index(self, name):
+        """ValueIndex over a numeric range column (built on first use when not saved), or None"""
+        if name not in self._ranges:
+            if name not in self.columns or self.is_categorical(name):
+                return None
+            self._ranges[name] = ValueIndex.build(self.columns[name])
+        return self._ranges[name]
+
+    def is_categorical(self, name):
+        return name in self.dictionaries
+
+    def code_of(self, name, value):
+        """Integer code of a label, or -1 when the label never occurs"""
+        labels = self.dictionaries[name]
+        pos = np.searchsorted(labels, value)
+        if pos < len(labels) and labels[pos] == value:
+            return int(pos)
+        return -1
+
+    # -------------------- FILTERING --------------------
+    def select(self, filters):
+        """Sorted row ids matching the equality filters, the date range and the numeric ranges,
+        or None when nothing is filtered.
+
+        The smallest candidate set (a range's run of presorted rows or the shortest
+        posting list) is resolved first and the other filters are checked at its rows.
+        """
+        terms = {name: value for name, value in (filters or {}).items()
+                 if name in self.index and value is not None and value != "All"}
+        ranges = [(self.value_index(name), span) for name, span in value_bounds(filters).items()
+                  if self.value_index(name) is not None]
+        span = date_span(filters)
+        if span is not None and self.dates is not None:
+            ranges.append((self.dates, span))
+        if not ranges:
+            return self.index.lookup(terms) if terms else None
+        ranges.sort(key=lambda item: item[0].count(item[1]))
+        if terms and self.index.count(terms) <= ranges[0][0].count(ranges[0][1]):
+            rows = self.index.lookup(terms)
+        else:
+            index, span = ranges.pop(0)
+            rows = index.rows(span)
+            if terms:
+                rows = self.index.within(rows, terms)
+        for index, span in ranges:
+            rows = index.within(rows, span)
+        return rows
+
+    def view(self, filters):
+        return FilteredView(self, filters)
+
+    # -------------------- MATERIALIZATION --------------------
+    def values(self, name, rows=None):
+        """Raw array for a column (codes for categoricals), optionally gathered at rows"""
+        if name in self.derived:
+            return self.derived[name](rows)
+        column = self.columns[name]
+        return column if rows is None else column[rows]
+
+    def column_dtype(self, name):
+        if name in self.derived:
+            return self.derived[name](np.empty(0, dtype=np.int64)).dtype
+        return self.columns[name].dtype
+
+    def _dtype(self, name):
+        # Built on first use so opening a store with huge dictionaries stays cheap
+        dtype = self._dtypes.get(name)
+        if dtype is None:
+            dtype = self._dtypes[name] = pd.CategoricalDtype(self.dictionaries[name])
+        return dtype
+
+    def series(self, name, rows=None):
+        values = self.values(name, rows)
+        if name in self.dictionaries:
+            values = pd.Categorical.from_codes(values, dtype=self._dtype(name), validate=False)
+        return pd.Series(values, name=name, copy=False)
+
+    def frame(self, columns, rows=None):
+        """DataFrame over just the requested columns; unfiltered columns share the store's buffers"""
+        return pd.DataFrame({name: self.series(name, rows) for name in dict.fromkeys(columns)}, copy=False)
+
+
+class FilteredView:
+    """A filter set resolved once; columns gathered for it are kept for every later query"""
+
+    def __init__(self, store, filters):
+        self.store = store
+        self.filters = dict(filters or {})
+        self.rows = store.select(self.filters)
+        self._series = {}
+
+    def __len__(self):
+        return self.store.n_rows if self.rows is None else len(self.rows)
+
+    def series(self, name):
+        series = self._series.get(name)
+        if series is None:
+            series = self._series[name] = self.store.series(name, self.rows)
+        return series
+
+    def frame(self, columns):
+        return pd.DataFrame({name: self.series(name) for name in dict.fromkeys(columns)}, copy=False)
+
+
+def parse_days(values):
+    """Days since 1970-01-01 of DATE_FORMAT texts as int32, NO_DAY where missing or unparseable;
+    categoricals parse each distinct label once"""
+    if isinstance(values, pd.Series):
+        values = values.array
+    if isinstance(values, pd.Categorical):
+        labels = parse_days(np.asarray(values.categories, dtype=object))
+        return np.append(labels, np.int32(NO_DAY))[values.codes]  # code -1 (missing) picks NO_DAY
+    dates = pd.to_datetime(pd.Series(np.asarray(values, dtype=object)), format=DATE_FORMAT, errors='coerce')
+    days = dates.to_numpy(dtype='datetime64[D]').astype(np.int64)
+    return np.where(dates.isna().to_numpy(), NO_DAY, days).astype(np.int32)
+
+
+def parse_day(value):
+    """Day number of one request date, yyyy-mm-dd or dd-mm-yyyy"""
+    text = str(value).strip()
+    for form in ('%Y-%m-%d', DATE_FORMAT):
+        try:
+            return (datetime.strptime(text, form).date() - _EPOCH).days
+        except ValueError:
+            continue
+    raise FilterError(f"Invalid date {value!r}: expected yyyy-mm-dd or dd-mm-yyyy")
+
+
+def has_dates(filters):
+    return any((filters or {}).get(name) not in (None, '') for name in RANGE_FILTERS)
+
+
+def has_bounds(filters):
+    return any((filters or {}).get(name) not in (None, '') for name in BOUND_FILTERS)
+
+
+def has_range(filters):
+    """Whether a date range or a numeric range is set; indexes built per equality slice cannot serve either"""
+    return has_dates(filters) or has_bounds(filters)
+
+
+def value_bounds(filters):
+    """{column: (low, high)} of the numeric range filters set, open ends unbounded"""
+    bounds = {}
+    for name, (column, side) in BOUND_FILTERS.items():
+        value = (filters or {}).get(name)
+        if value in (None, ''):
+            continue
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            number = np.nan
+        if np.isnan(number):
+            raise FilterError(f"Invalid {name} {value!r}: expected a number")
+        low, high = bounds.get(column, (-np.inf, np.inf))
+        bounds[column] = (max(low, number), high) if side == 'min' else (low, min(high, number))
+    return bounds
+
+
+def date_span(filters):
+    """(first, last) day numbers of the start/end filters, open ends unbounded, or None without either"""
+    if not has_dates(filters):
+        return None
+    start, end = ((filters or {}).get(name) for name in RANGE_FILTERS)
+    first = parse_day(start) if start not in (None, '') else NO_DAY + 1
+    last = parse_day(end) if end not in (None, '') else np.iinfo(np.int32).max
+    return first, last
+
+
+def _row_id_dtype(n_rows):
+    return np.int32 if n_rows < np.iinfo(np.int32).max else np.int64
+
+
+def _load(path):
+    # Read-only memory map, exposed as a plain ndarray so pandas treats it like any other array
+    return np.asarray(np.load(path, mmap_mode='r'))
+
+
+def save_array(path, values):
+    """np.save without pickling: text labels are stored as fixed-width unicode"""
+    values = np.asarray(values)
+    np.save(path, values.astype(str) if values.dtype == object else values, allow_pickle=False)
+
+
+def publish(staging, directory):
+    """Move a fully written dataset directory into place, replacing any previous one"""
+    retired = directory + '.old'
+    shutil.rmtree(retired, ignore_errors=True)
+    if os.path.exists(directory):
+        os.rename(directory, retired)
+    os.rename(staging, directory)
+    shutil.rmtree(retired, ignore_errors=True)
+
+
+class FilterIndex:
+    """Inverted index over low-cardinality columns: one sorted row-id list per distinct value.
+
+    A filter combination starts from the shortest posting list and narrows it by
+    checking the remaining columns' keys at those rows, so a lookup costs
+    O(matching rows) rather than a scan of the table. Posting lists are slices of
+    one row-id array per column, which is what gets saved alongside the store.
+    """
+
+    def __init__(self):
+        self.keys = {}      # column -> per-row integer key (dictionary code or factorized value)
+        self.labels = {}    # column -> distinct values, indexed by key
+        self.orders = {}    # column -> row ids sorted by key
+        self.bounds = {}    # column -> start of each key's run in orders
+        self.values = {}    # column -> {request value as text: key}
+        self.postings = {}  # column -> list of sorted row-id arrays, indexed by key
+
+    @classmethod
+    def build(cls, store, columns):
+        index = cls()
+        for name in columns:
+            if store.is_categorical(name):
+                keys, labels = np.asarray(store.columns[name]), store.dictionaries[name]
+            else:
+                keys, labels = pd.factorize(store.columns[name], sort=True)
+            order = np.argsort(keys, kind='stable').astype(_row_id_dtype(store.n_rows))
+            # Missing values carry key -1 and sort first; they are never matched
+            bounds = np.searchsorted(keys[order], np.arange(len(labels) + 1))
+            index._add(name, keys, labels, order, bounds)
+        return index
+
+    def _add(self, name, keys, labels, order, bounds):
+        self.keys[name], self.labels[name], self.orders[name], self.bounds[name] = keys, labels, order, bounds
+        self.postings[name] = [order[bounds[k]:bounds[k + 1]] for k in range(len(labels))]
+        # Request args arrive as text; accept the exact label first, then a case-folded one
+        # so "true"/"True" both reach boolean columns
+        values = {str(label): key for key, label in enumerate(labels)}
+        for key, label in enumerate(labels):
+            values.setdefault(str(label).lower(), key)
+        self.values[name] = values
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        for name in self.postings:
+            save_array(os.path.join(directory, f'{name}.order.npy'), self.orders[name])
+            save_array(os.path.join(directory, f'{name}.bounds.npy'), self.bounds[name])
+            save_array(os.path.join(directory, f'{name}.labels.npy'), self.labels[name])
+            save_array(os.path.join(directory, f'{name}.keys.npy'), self.keys[name])
+
+    @classmethod
+    def load(cls, directory, columns, dictionaries):
+        index = cls()
+        for name in FILTER_COLUMNS:
+            path = os.path.join(directory, f'{name}.order.npy')
+            if not os.path.exists(path):
+                continue
+            # Categorical columns are keyed by their codes, which the store already maps
+            keys = columns[name] if name in dictionaries else _load(
+                os.path.join(directory, f'{name}.keys.npy'))
+            index._add(name, keys, _load(os.path.join(directory, f'{name}.labels.npy')), _load(path),
+                       _load(os.path.join(directory, f'{name}.bounds.npy')))
+        return index
+
+    def __contains__(self, name):
+        return name in self.postings
+
+    def key_of(self, name, value):
+        values = self.values[name]
+        return values.get(str(value), values.get(str(value).lower(), -1))
+
+    def lookup(self, terms):
+        """Sorted row ids satisfying every (column, value) equality term"""
+        keyed = [(name, self.key_of(name, value)) for name, value in terms.items()]
+        if any(key < 0 for _, key in keyed):
+            return np.empty(0, dtype=np.int64)
+        keyed.sort(key=lambda term: len(self.postings[term[0]][term[1]]))
+        name, key = keyed[0]
+        return self._narrow(self.postings[name][key], keyed[1:])
+
+    def count(self, terms):
+        """Length of the shortest posting list among the terms (an upper bound on the matches)"""
+        keys = [(name, self.key_of(name, value)) for name, value in terms.items()]
+        return min(len(self.postings[name][key]) if key >= 0 else 0 for name, key in keys)
+
+    def within(self, rows, terms):
+        """The subset of sorted row ids satisfying every equality term"""
+        keyed = [(name, self.key_of(name, value)) for name, value in terms.items()]
+        if any(key < 0 for _, key in keyed):
+            return rows[:0]
+        return self._narrow(rows, keyed)
+
+    def _narrow(self, rows, keyed):
+        for name, key in keyed:
+            rows = rows[self.keys[name][rows] == key]
+        return rows
+
+
+class DateIndex:
+    """Rows in date order over DATE_COLUMN.
+
+    days holds every row's date as a day number and order the row ids sorted
+    by it (stable, undated rows first), with sorted_days = days[order]. The
+    rows of a date range are one contiguous run of order, found with two
+    binary searches; a set already narrowed by equality filters is checked
+    against days directly.
+    """
+
+    def __init__(self, days, order, sorted_days):
+        self.days = days
+        self.order = order
+        self.sorted_days = sorted_days
+
+    @classmethod
+    def build(cls, store):
+        if store.is_categorical(DATE_COLUMN):
+            codes = store.columns[DATE_COLUMN]
+            days = np.append(parse_days(store.dictionaries[DATE_COLUMN]), np.int32(NO_DAY))[codes]
+        else:
+            days = parse_days(store.columns[DATE_COLUMN])
+        order = np.argsort(days, kind='stable').astype(_row_id_dtype(store.n_rows))
+        return cls(days, order, days[order])
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        for name in ('days', 'order', 'sorted_days'):
+            save_array(os.path.join(directory, f'{name}.npy'), getattr(self, name))
+
+    @classmethod
+    def load(cls, directory):
+        """Memory-map a saved index, or None when the store was saved without one"""
+        if not os.path.exists(os.path.join(directory, 'order.npy')):
+            return None
+        return cls(*(_load(os.path.join(directory, f'{name}.npy')) for name in ('days', 'order', 'sorted_days')))
+
+    def bounds(self, span):
+        """Positions in order of the first and past-the-last row dated within span"""
+        first, last = span
+        return (int(np.searchsorted(self.sorted_days, first, side='left')),
+                int(np.searchsorted(self.sorted_days, last, side='right')))
+
+    def rows(self, span):
+        """Sorted row ids dated within span"""
+        start, stop = self.bounds(span)
+        return np.sort(self.order[start:stop])
+
+    def count(self, span):
+        start, stop = self.bounds(span)
+        return max(stop - start, 0)
+
+    def within(self, rows, span):
+        """The subset of sorted row ids dated within span"""
+        first, last = span
+        days = self.days[rows]
+        return rows[(days >= first) & (days <= last)]
+
+
+class ValueIndex:
+    """Rows in value order over one numeric column, for range filters.
+
+    order holds the row ids sorted by value (stable, missing values last) and
+    sorted_values the values in that order. The rows of a [low, high] range
+    are one contiguous run of order found with two binary searches; a set
+    already narrowed by other filters is checked against the column directly.
+    """
+
+    def __init__(self, values, order, sorted_values):
+        self.values = values
+        self.order = order
+        self.sorted_values = sorted_values
+
+    @classmethod
+    def build(cls, values):
+        values = np.asarray(values)
+        order = np.argsort(values, kind='stable').astype(_row_id_dtype(len(values)))
+        return cls(values, order, values[order])
+
+    def save(self, directory, name):
+        os.makedirs(directory, exist_ok=True)
+        save_array(os.path.join(directory, f'{name}.order.npy'), self.order)
+        save_array(os.path.join(directory, f'{name}.sorted.npy'), self.sorted_values)
+
+    @classmethod
+    def load(cls, directory, name, values):
+        """Memory-map a saved index over values, or None when the store was saved without one"""
+        if not os.path.exists(os.path.join(directory, f'{name}.order.npy')):
+            return None
+        return cls(values, _load(os.path.join(directory, f'{name}.order.npy')),
+                   _load(os.path.join(directory, f'{name}.sorted.npy')))
+
+    def bounds(self, span):
+        """Positions in order of the first and past-the-last row valued within span"""
+        low, high = span
+        dtype = self.sorted_values.dtype
+        if dtype.kind in 'iu':
+            # Searching an integer column for a float would convert the whole column first
+            info = np.iinfo(dtype)
+            low, high = np.ceil(low), np.floor(high)
+            if low > high or low > info.max or high < info.min:
+                return 0, 0
+            low, high = dtype.type(max(low, info.min)), dtype.type(min(high, info.max))
+        return (int(np.searchsorted(self.sorted_values, low, side='left')),
+                int(np.searchsorted(self.sorted_values, high, side='right')))
+
+    def count(self, span):
+        start, stop = self.bounds(span)
+        return max(stop - start, 0)
+
+    def rows(self, span):
+        """Sorted row ids valued within span"""
+        start, stop = self.bounds(span)
+        return np.sort(self.order[start:stop])
+
+    def within(self, rows, span):
+        """The subset of sorted row ids valued within span"""
+        low, high = span
+        values = self.values[rows]
+        return rows[(values >= low) & (values <= high)]
@@ -0,0 +1,161 @@
+# cube.py
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from columnar import has_bounds, has_range, save_array
+
+# Filter columns the cube is sliced on
+CUBE_AXES = ('region', 'category')
+
+# Grouping dimensions and measures materialized at load time
+CUBE_DIMENSIONS = ['item_purchased', 'month', 'day_of_week', 'season', 'product_size', 'product_color',
+                   'promo_code_used', 'age', 'gender', 'region', 'category', 'is_subscribed', 'is_weekend',
+                   'payment_method', 'review_rating', 'shipping_type']
+CUBE_MEASURES = ['total_revenue', 'quantity', 'purchase_frequency', 'review_rating', 'promo_code_used',
+                 'popularity_score', 'average_spending']
+
+
+def cell_slices(store, filters):
+    """Index into a region x category cell axis pair (slot 0: missing value) selecting the cells
+    the equality filters cover, or None if another equality filter or a numeric range is set"""
+    if has_bounds(filters):
+        return None
+    cells = []
+    for name, value in (filters or {}).items():
+        if name in store.index and name not in CUBE_AXES and value is not None and value != "All":
+            return None
+    for name in CUBE_AXES:
+        value = (filters or {}).get(name)
+        if value is None or value == "All":
+            cells.append(slice(None))
+        else:
+            key = store.index.key_of(name, value) + 1
+            cells.append(slice(key, key + 1) if key > 0 else slice(0, 0))
+    return tuple(cells)
+
+
+class AggregateCube:
+    """Pre-aggregated region x category x dimension cube of per-measure sums and counts.
+
+    Answers groupby(dim)[measure].sum()/mean()/size() for any region/category
+    filter by rolling up cells instead of scanning rows. rollup() returns None
+    for anything the cube cannot answer exactly (other filters, unknown
+    dimensions or measures), and the caller falls back to the raw rows.
+    """
+
+    def __init__(self, store, measures, dimensions):
+        self.store = store
+        self.measures = measures
+        self.dimensions = dimensions
+
+    @classmethod
+    def build(cls, store, dimensions=CUBE_DIMENSIONS, measures=CUBE_MEASURES):
+        measures = [name for name in measures if name in store]
+        # Axis slot 0 holds rows whose region/category is missing, so "All" still covers them
+        axis_size = [len(store.index.postings[name]) + 1 for name in CUBE_AXES]
+        cell = np.zeros(store.n_rows, dtype=np.int64)
+        for name, size in zip(CUBE_AXES, axis_size):
+            cell = cell * size + (store.index.keys[name].astype(np.int64) + 1)
+        entries = {name: cls._build_entry(store, name, measures, cell, axis_size)
+                   for name in dimensions if name in store}
+        return cls(store, measures, entries)
+
+    @staticmethod
+    def _build_entry(store, name, measures, cell, axis_size):
+        if store.is_categorical(name):
+            keys, labels = np.asarray(store.columns[name]), store.dictionaries[name]
+        else:
+            keys, labels = pd.factorize(store.columns[name], sort=True)
+        shape = tuple(axis_size) + (len(labels),)
+        size = int(np.prod(shape))
+        valid = keys >= 0  # pandas drops missing group keys
+        flat = cell[valid] * len(labels) + keys[valid]
+        entry = {
+            'labels': pd.Index(labels, name=name),
+            'rows': np.bincount(flat, minlength=size).reshape(shape),
+            'sums': {},
+            'counts': {},
+        }
+        for measure in measures:
+            values = np.asarray(store.values(measure))[valid].astype(np.float64)
+            present = ~np.isnan(values)
+            entry['sums'][measure] = np.bincount(flat[present], weights=values[present], minlength=size).reshape(shape)
+            entry['counts'][measure] = (entry['rows'] if present.all()
+                                        else np.bincount(flat[present], minlength=size).reshape(shape))
+        return entry
+
+    # -------------------- ON-DISK FORMAT --------------------
+    def save(self, directory):
+        """Store the cube next to a saved ColumnarStore so it is not rebuilt at startup"""
+        directory = os.path.join(directory, 'cube')
+        os.makedirs(directory, exist_ok=True)
+        manifest = {'measures': self.measures, 'dimensions': {}}
+        for name, entry in self.dimensions.items():
+            save_array(os.path.join(directory, f'{name}.labels.npy'), entry['labels'])
+            save_array(os.path.join(directory, f'{name}.rows.npy'), entry['rows'])
+            shared = []
+            for measure in self.measures:
+                save_array(os.path.join(directory, f'{name}.{measure}.sum.npy'), entry['sums'][measure])
+                if entry['counts'][measure] is entry['rows']:
+                    shared.append(measure)
+                else:
+                    save_array(os.path.join(directory, f'{name}.{measure}.count.npy'), entry['counts'][measure])
+            manifest['dimensions'][name] = {'counts_are_rows': shared}
+        with open(os.path.join(directory, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f, indent=1)
+
+    @classmethod
+    def open(cls, directory, store):
+        """Memory-map a saved cube, or build one when the dataset was saved without it"""
+        directory = os.path.join(directory, 'cube')
+        if not os.path.exists(os.path.join(directory, 'manifest.json')):
+            return cls.build(store)
+        with open(os.path.join(directory, 'manifest.json')) as f:
+            manifest = json.load(f)
+
+        def load(filename):
+            return np.asarray(np.load(os.path.join(directory, filename), mmap_mode='r'))
+
+        entries = {}
+        for name, spec in manifest['dimensions'].items():
+            rows = load(f'{name}.rows.npy')
+            entries[name] = {
+                'labels': pd.Index(np.load(os.path.join(directory, f'{name}.labels.npy')), name=name),
+                'rows': rows,
+                'sums': {m: load(f'{name}.{m}.sum.npy') for m in manifest['measures']},
+                'counts': {m: rows if m in spec['counts_are_rows'] else load(f'{name}.{m}.count.npy')
+                           for m in manifest['measures']},
+            }
+        return cls(store, manifest['measures'], entries)
+
+    def _cells(self, filters):
+        """Index selecting the cells covered by the filters, or None if a filter is not a cube axis"""
+        return None if has_range(filters) else cell_slices(self.store, filters)
+
+    def rollup(self, filters, by, measure=None, how='sum'):
+        """groupby(by)[measure].<how>() over the filtered rows, or None when not servable"""
+        entry = self.dimensions.get(by)
+        if entry is None or (how != 'size' and measure not in entry['sums']):
+            return None
+        cells = self._cells(filters)
+        if cells is None:
+            return None
+        rows = entry['rows'][cells].sum(axis=(0, 1))
+        if how == 'size':
+            values = rows
+        elif how == 'sum':
+            values = entry['sums'][measure][cells].sum(axis=(0, 1))
+            dtype = self.store.column_dtype(measure)
+            if pd.api.types.is_integer_dtype(dtype):
+                values = values.astype(np.int64)
+        elif how == 'mean':
+            counts = entry['counts'][measure][cells].sum(axis=(0, 1))
+            with np.errstate(invalid='ignore', divide='ignore'):
+                values = entry['sums'][measure][cells].sum(axis=(0, 1)) / counts
+        else:
+            return None
+        observed = rows > 0
+        return pd.Series(values[observed], index=entry['labels'][observed], name=measure)
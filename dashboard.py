@@ -1,9 +1,81 @@
+import threading
+import time
+from datetime import date
+from concurrent.futures import ThreadPoolExecutor
+
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
 import pandas as pd
-import plotly.express as px
+
+from charts import figures, matrix_frame
+from encoding import is_matrix
 
 API_URL = "http://localhost:5000/api"  # Flask backend URL
+REQUEST_TIMEOUT = (3.05, 30)  # seconds to connect, seconds to wait for the response
+CACHE_TTL = 300  # seconds a fetched response is reused across reruns
+MAX_CONCURRENT_REQUESTS = 8
+
+# -------------------- DATA LAYER --------------------
+class ApiClient:
+    """Backend access shared by every rerun and session of the dashboard.
+
+    One keep-alive session pools connections to the backend; responses are
+    kept for CACHE_TTL seconds keyed on (path, params), so reruns, tab
+    switches and repeated filter choices are answered locally. Requests run
+    on a small thread pool: prefetch() starts them without waiting, and a
+    request already in flight is joined rather than sent twice. Failures are
+    never cached.
+    """
+
+    def __init__(self, base_url, ttl=CACHE_TTL, workers=MAX_CONCURRENT_REQUESTS):
+        self.base_url = base_url
+        self.ttl = ttl
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="api")
+        self._lock = threading.Lock()
+        self._responses = {}  # (path, params) -> (expiry time, future of the decoded body)
+
+    def _request(self, path, params):
+        try:
+            response = self.session.get(f"{self.base_url}{path}", params=dict(params), timeout=REQUEST_TIMEOUT)
+        except requests.RequestException:
+            return None
+        return response.json() if response.status_code == 200 else None
+
+    def _submit(self, path, params=None):
+        key = (path, tuple(sorted((params or {}).items())))
+        now = time.monotonic()
+        with self._lock:
+            entry = self._responses.get(key)
+            if entry is not None and entry[0] > now:
+                return entry[1]
+            future = self._executor.submit(self._request, *key)
+            self._responses[key] = (now + self.ttl, future)
+        future.add_done_callback(lambda done: self._forget_failure(key, done))
+        return future
+
+    def _forget_failure(self, key, future):
+        if future.result() is not None:
+            return
+        with self._lock:
+            if self._responses.get(key, (None, None))[1] is future:
+                del self._responses[key]
+
+    def get(self, path, params=None):
+        """Decoded JSON body of a GET, or None when the backend is unreachable or returns an error"""
+        return self._submit(path, params).result()
+
+    def prefetch(self, path, params=None):
+        self._submit(path, params)
+
+
+@st.cache_resource
+def api_client():
+    return ApiClient(API_URL)
 
 # -------------------- HELPER FUNCTIONS --------------------
 def get_filter_text(filters):
@@ -13,46 +85,53 @@ def get_filter_text(filters):
         context.append(f"Category: {filters['category']}")
     if filters.get('region'):
         context.append(f"Region: {filters['region']}")
+    if filters.get('start'):
+        context.append(f"From: {filters['start']}")
+    if filters.get('end'):
+        context.append(f"To: {filters['end']}")
+    for name in ('age', 'price', 'rating'):
+        low, high = filters.get(f'{name}_min'), filters.get(f'{name}_max')
+        if low is not None and high is not None:
+            context.append(f"{name.capitalize()}: {low}-{high}")
+        elif low is not None:
+            context.append(f"{name.capitalize()} >= {low}")
+        elif high is not None:
+            context.append(f"{name.capitalize()} <= {high}")
     return f" ({', '.join(context)})" if context else ""
 
+def fetch_filter_options():
+    """Values offered for each filter, from the backend's filter index"""
+    return api_client().get("/filters") or {}
+
 def fetch_questions(category):
     """Fetch questions for a category from the backend"""
-    try:
-        response = requests.get(f"{API_URL}/questions/{category}")
-        return response.json() if response.status_code == 200 else []
-    except:
-        return []
+    return api_client().get(f"/questions/{category}") or []
+
+def insight_params(filters):
+    return {k: v for k, v in (filters or {}).items() if v is not None and v != "All"}
+
+def prefetch_insights(category, questions, filters=None):
+    """Start fetching every question of a tab at once, so picking any of them is instant"""
+    for question in questions:
+        api_client().prefetch(f"/insights/{category}/{question['id']}", insight_params(filters))
 
 def fetch_insights(category, question_id, filters=None):
     """Fetch insights for a specific question"""
-    try:
-        params = {k:v for k,v in (filters or {}).items() if v != "All"}
-        response = requests.get(
-            f"{API_URL}/insights/{category}/{question_id}",
-            params=params
-        )
-        return response.json() if response.status_code == 200 else {"error": "API Failed"}
-    except:
-        return {"error": "API Failed"}
+    insights = api_client().get(f"/insights/{category}/{question_id}", insight_params(filters))
+    return insights if insights is not None else {"error": "API Failed"}
 
 def render_visualization(data, viz_type):
-    """Render Plotly chart based on visualization type"""
-    if viz_type == "bar":
-        fig = px.bar(x=list(data.keys()), y=list(data.values()))
-    elif viz_type == "line":
-        fig = px.line(x=list(data.keys()), y=list(data.values()))
-    elif viz_type == "pie":
-        fig = px.pie(names=list(data.keys()), values=list(data.values()))
-    elif viz_type == "metric":
-        fig = None
+    """Render a question's data as its visualization type calls for"""
+    if viz_type == "metric":
         st.metric("Result", data)
-    elif viz_type == "dual_bar":
-        fig1 = px.bar(x=list(data['size'].keys()), y=list(data['size'].values()), title="By Size")
-        fig2 = px.bar(x=list(data['color'].keys()), y=list(data['color'].values()), title="By Color")
-        st.plotly_chart(fig1)
-        st.plotly_chart(fig2)
-        return
-    st.plotly_chart(fig)
+    elif viz_type == "list":
+        st.dataframe(pd.DataFrame({"Item": data}), hide_index=True)
+    else:
+        charts = figures(data, viz_type)
+        if charts is None:
+            st.write(data)  # no chart for this visualization type: show the data as returned
+        for fig in charts or []:
+            st.plotly_chart(fig)
 
 # -------------------- DASHBOARD LAYOUT --------------------
 st.set_page_config(layout="wide")
@@ -60,19 +139,45 @@ st.title("TrendLens Analytics Dashboard")
 
 # Sidebar Filters
 st.sidebar.header("Filters")
-selected_region = st.sidebar.selectbox("Region", ["All"] + list(pd.read_csv("C:/Users/shaya/Downloads/shop/processed_dataset.csv")['region'].unique()))
-selected_category = st.sidebar.selectbox("Category", ["All"] + list(pd.read_csv("C:/Users/shaya/Downloads/shop/processed_dataset.csv")['category'].unique()))
+filter_options = fetch_filter_options()
+selected_region = st.sidebar.selectbox("Region", ["All"] + filter_options.get('region', []))
+selected_category = st.sidebar.selectbox("Category", ["All"] + filter_options.get('category', []))
+filters = {
+    "region": selected_region,
+    "category": selected_category
+}
+date_range = filter_options.get('date_range')
+if date_range:
+    first, last = date.fromisoformat(date_range['start']), date.fromisoformat(date_range['end'])
+    selected_dates = st.sidebar.date_input("Purchase dates", (first, last), min_value=first, max_value=last)
+    if len(selected_dates) == 2 and tuple(selected_dates) != (first, last):
+        filters["start"], filters["end"] = (day.isoformat() for day in selected_dates)
+value_ranges = filter_options.get('value_ranges', {})
+for name, label in (('age', "Age"), ('price', "Price")):
+    bounds = value_ranges.get(name)
+    if bounds and bounds['min'] < bounds['max']:
+        low, high = st.sidebar.slider(label, bounds['min'], bounds['max'], (bounds['min'], bounds['max']))
+        if low > bounds['min']:
+            filters[f"{name}_min"] = low
+        if high < bounds['max']:
+            filters[f"{name}_max"] = high
+rating = value_ranges.get('rating')
+if rating and rating['min'] < rating['max']:
+    selected_rating = st.sidebar.slider("Minimum rating", rating['min'], rating['max'], rating['min'])
+    if selected_rating > rating['min']:
+        filters["rating_min"] = selected_rating
 
 # Initialize tabs
 tabs = st.tabs(["Sales Trends", "Customer Demographics", "Customer Behavior", 
                "Operational Insights", "Advanced Insights", "Comparative Insights"])
 
-# -------------------- SALES TRENDS TAB --------------------
-with tabs[0]:
-    st.subheader("Sales & Product Trends Analysis")
+# -------------------- TABS --------------------
+def render_tab(category, title, key):
+    st.subheader(title)
     
     # Fetch questions from backend
-    questions = fetch_questions("sales_trends")
+    questions = fetch_questions(category)
+    prefetch_insights(category, questions, filters)
     
     if not questions:
         st.warning("No questions found for this category.")
@@ -82,22 +187,12 @@ with tabs[0]:
             "Select a Question", 
             questions, 
             format_func=lambda x: x['text'],
-            key="sales_question"
+            key=f"{key}_question"
         )
         
-        if st.button("Analyze", key="sales_analyze"):
-            # Prepare filters
-            filters = {
-                "region": selected_region,
-                "category": selected_category
-            }
-            # if selected_region != "All":
-                # filters["region"] = selected_region
-            # if selected_category != "All":
-                # filters["category"] = selected_category
-            
-            # Fetch insights
-            insights = fetch_insights("sales_trends", selected_question['id'], filters)
+        if st.button("Analyze", key=f"{key}_analyze"):
+            # Fetch insights (usually already prefetched)
+            insights = fetch_insights(category, selected_question['id'], filters)
             
             if "error" in insights:
                 st.error(insights["error"])
@@ -109,8 +204,20 @@ with tabs[0]:
                 
                 # Show raw data
                 with st.expander("View Raw Data"):
-                    if isinstance(insights["data"], dict):
+                    if is_matrix(insights["data"]):
+                        st.write(matrix_frame(insights["data"]))
+                    elif isinstance(insights["data"], dict):
                         st.write(pd.DataFrame(insights["data"].items(), columns=["Key", "Value"]))
                     else:
                         st.write(insights["data"])
 
+TABS = [("sales_trends", "Sales & Product Trends Analysis", "sales"),
+        ("customer_demographics", "Customer Demographics Analysis", "demographics"),
+        ("customer_behavior", "Customer Behavior Analysis", "behavior"),
+        ("operational_insights", "Operational Insights Analysis", "operational"),
+        ("advanced_insights", "Advanced Insights Analysis", "advanced"),
+        ("comparative_insights", "Comparative Insights Analysis", "comparative")]
+
+for tab, (category, title, key) in zip(tabs, TABS):
+    with tab:
+        render_tab(category, title, key)
@@ -0,0 +1,49 @@
+# encoding.py
+import json
+import math
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # the standard library encoder is used instead
+    orjson = None
+
+ORJSON_OPTIONS = (orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS) if orjson is not None else 0
+
+
+def matrix(frame):
+    """Wire form of a 2-D result (an unstacked groupby): row labels, column labels and one
+    row-major value array in which missing cells are NaN, sent as null"""
+    return {
+        "rows": frame.index.tolist(),
+        "columns": frame.columns.tolist(),
+        "values": np.ascontiguousarray(frame.to_numpy(dtype=np.float64)).ravel(),
+        "row_name": frame.index.name,
+        "column_name": frame.columns.name,
+    }
+
+
+def is_matrix(data):
+    """Whether data is in the matrix wire form (row labels, column labels, flat values)"""
+    return isinstance(data, dict) and "rows" in data and "columns" in data and "values" in data
+
+
+def _plain(value):
+    # Standard-library fallback: numpy values to Python ones, NaN and infinities to null
+    if isinstance(value, dict):
+        return {key.item() if isinstance(key, np.generic) else key: _plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [_plain(item) for item in (value.tolist() if isinstance(value, np.ndarray) else value)]
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+def dumps(payload):
+    """Response body bytes; keys keep the analyzer's order and NaN is always sent as null"""
+    if orjson is not None:
+        return orjson.dumps(payload, option=ORJSON_OPTIONS)
+    return json.dumps(_plain(payload), separators=(',', ':')).encode()
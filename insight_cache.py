@@ -0,0 +1,122 @@
+# insight_cache.py
+import threading
+from collections import Counter, OrderedDict
+
+MISSING = object()
+
+
+class InsightCache:
+    """Bounded LRU cache for insight results keyed on (category, question id, filters).
+
+    Keys include the normalized filter set, so two requests for the same
+    question with different filters never share an entry. invalidate() is
+    called whenever the dataset behind the analyzer is reloaded; replace() drops
+    just the entries a reload made stale. demand counts lookups per key and
+    survives invalidation, so warm-up can start with the most requested entries.
+
+    generation changes with every replace(): a result computed from the previous
+    dataset and stored with set(..., generation) after the swap is discarded.
+    """
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.generation = 0
+        self.demand = Counter()
+
+    @staticmethod
+    def normalize_filters(filters):
+        """Drop unset/"All" filters and order the rest so equal filter sets give equal keys"""
+        items = []
+        for name, value in (filters or {}).items():
+            if value is None:
+                continue
+            value = str(value).strip()
+            if value and value != "All":
+                items.append((name, value))
+        return tuple(sorted(items))
+
+    @classmethod
+    def key(cls, category, question_id, filters=None):
+        return (category, int(question_id), cls.normalize_filters(filters))
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key, MISSING)
+            self.demand[key] += 1
+            if len(self.demand) > 4 * self.maxsize:
+                self.demand = Counter(dict(self.demand.most_common(2 * self.maxsize)))
+            if value is MISSING:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            return value
+
+    def set(self, key, value, generation=None):
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def merge(self, entries):
+        """Atomically add entries built off to the side, least important first; live entries win"""
+        with self._lock:
+            merged = OrderedDict(entries)
+            merged.update(self._entries)
+            self._entries = merged
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def replace(self, predicate=None, entries=()):
+        """Atomically drop every entry (or those whose key satisfies predicate) and add entries
+        computed from the new data, least important first; starts a new generation and
+        returns the number of entries dropped"""
+        with self._lock:
+            self.generation += 1
+            fresh = OrderedDict(entries)
+            kept = [(key, value) for key, value in self._entries.items()
+                    if key not in fresh and predicate is not None and not predicate(key)]
+            dropped = len(self._entries) - len(kept)
+            self._entries = fresh
+            self._entries.update(kept)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            return dropped
+
+    def invalidate(self, predicate=None):
+        """Drop every entry, or only those whose key satisfies predicate; returns the count dropped"""
+        with self._lock:
+            if predicate is None:
+                dropped = len(self._entries)
+                self._entries.clear()
+                return dropped
+            stale = [key for key in self._entries if predicate(key)]
+            for key in stale:
+                del self._entries[key]
+            return len(stale)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
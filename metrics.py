@@ -0,0 +1,207 @@
+# metrics.py
+import math
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from functools import wraps
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Analyzer methods wrapped by instrumented()
+INSTRUMENTED_PREFIXES = ('get_', 'approx_')
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + '}'
+
+
+def _number(value):
+    return '+Inf' if value == math.inf else repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic total per label combination"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._values = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] += amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, labels, value) for labels, value in sorted(self._values.items())]
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label combination, with the sum and count of observations"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [per-bucket counts (+Inf last), sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for labels, (counts, total) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (math.inf,), counts):
+                    cumulative += count
+                    samples.append((f'{self.name}_bucket', labels + (_number(bound),), cumulative))
+                samples.append((f'{self.name}_sum', labels, total))
+                samples.append((f'{self.name}_count', labels, cumulative))
+        return samples
+
+
+class Gauge:
+    """Value read from a callback at scrape time; the callback returns {labels tuple: value}"""
+
+    kind = 'gauge'
+
+    def __init__(self, name, help, labels, read):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.read = read
+
+    def samples(self):
+        return [(self.name, labels, value) for labels, value in sorted(self.read().items())]
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self.register(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def gauge(self, name, help, labels, read):
+        return self.register(Gauge(name, help, labels, read))
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, value in metric.samples():
+                names = metric.labels + ('le',) if name.endswith('_bucket') else metric.labels
+                lines.append(f'{name}{_labels(names, labels)} {_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+# -------------------- PER-CALL TRACES --------------------
+_local = threading.local()
+
+
+class Trace:
+    """Time split and rows scanned for one computation on the current thread.
+
+    Code on the hot path reports into whichever trace is active with phase()
+    and scanned(); both are no-ops when nothing is being traced.
+    """
+
+    def __init__(self):
+        self.phases = defaultdict(float)
+        self.rows_scanned = 0
+        self._outer = None
+
+    def __enter__(self):
+        self._outer = getattr(_local, 'trace', None)
+        _local.trace = self
+        return self
+
+    def __exit__(self, *exc):
+        _local.trace = self._outer
+        return False
+
+    def breakdown(self):
+        """Seconds per phase: filter, aggregate (compute time not spent filtering) and serialize"""
+        compute = self.phases.get('compute', 0.0)
+        filtering = min(self.phases.get('filter', 0.0), compute)
+        return {'filter': filtering, 'aggregate': compute - filtering, 'serialize': self.phases.get('serialize', 0.0)}
+
+    def server_timing(self, total):
+        """Server-Timing header value for the breakdown, in milliseconds"""
+        parts = [f'{name};dur={seconds * 1000:.3f}' for name, seconds in self.breakdown().items()]
+        parts.append(f'total;dur={total * 1000:.3f}')
+        parts.append(f'rows;desc="{self.rows_scanned}"')
+        return ', '.join(parts)
+
+
+class phase:
+    """Context manager adding the time spent inside it to the active trace's named phase"""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.trace = getattr(_local, 'trace', None)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.trace is not None:
+            self.trace.phases[self.name] += time.perf_counter() - self.start
+        return False
+
+
+def scanned(rows):
+    trace = getattr(_local, 'trace', None)
+    if trace is not None:
+        trace.rows_scanned += rows
+
+
+def instrumented(histogram):
+    """Class decorator timing every question method defined on the class into histogram{method=...}"""
+    def decorate(cls):
+        for name, function in list(vars(cls).items()):
+            if not name.startswith(INSTRUMENTED_PREFIXES) or not callable(function):
+                continue
+            if getattr(function, '__instrumented__', False):
+                continue  # inherited by assignment from an already instrumented class
+            setattr(cls, name, _timed(function, histogram, name))
+        return cls
+    return decorate
+
+
+def _timed(function, histogram, name):
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            histogram.observe(time.perf_counter() - start, name)
+    wrapper.__instrumented__ = True
+    return wrapper
@@ -0,0 +1,163 @@
+# models.py
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from insight_cache import MISSING, InsightCache
+
+try:
+    import joblib
+except ImportError:  # no model can be loaded; the prediction endpoint reports them unavailable
+    joblib = None
+
+# Models trained by shopping_trend.ipynb: the features each takes, in training order
+MODEL_TASKS = {
+    'revenue_prediction': ['month', 'day_of_week', 'season', 'category_sales', 'discount_effectiveness'],
+    'trend_classification': ['month', 'popularity_score', 'category_sales', 'season'],
+    'discount_effectiveness': ['discount_effectiveness', 'quantity', 'price', 'promo_code_spending'],
+}
+
+# Columns preprocess_data label-encodes before training
+ENCODED_COLUMNS = ['gender', 'region', 'category', 'product_size', 'product_color', 'payment_method', 'shipping_type',
+                   'season', 'most_purchased_category_by_age', 'most_purchased_category_by_gender',
+                   'preferred_shipping_type', 'month', 'day_of_week']
+
+MODEL_FILENAME = '{task}_model.pkl'  # joblib dump of (model, scaler)
+ENCODINGS_FILENAME = 'encodings.json'
+
+
+class LabelEncodings:
+    """The integer codes preprocess_data's LabelEncoder gave each encoded column.
+
+    LabelEncoder codes a value by its position among the column's distinct
+    values as text, sorted, so the codes can be rebuilt from the dataset the
+    models were trained on when no saved encodings sit next to the models.
+    """
+
+    def __init__(self, classes):
+        self.classes = classes  # column -> sorted distinct text values
+
+    @classmethod
+    def build(cls, store, columns=ENCODED_COLUMNS):
+        """Encodings fitted on a ColumnarStore, or on the chunks of a streaming ChunkSource"""
+        columns = [name for name in columns if name in store]
+        values = {name: set() for name in columns}
+        if hasattr(store, 'chunks'):
+            for chunk in store.chunks(columns):
+                for name in columns:
+                    values[name].update(chunk[name].astype(str).unique())
+        else:
+            for name in columns:
+                if name in store.dictionaries:
+                    values[name].update(str(label) for label in store.dictionaries[name])
+                    if (np.asarray(store.columns[name]) < 0).any():
+                        values[name].add('nan')  # astype(str) of a missing value
+                else:
+                    values[name].update(pd.Series(np.unique(store.values(name))).astype(str))
+        return cls({name: sorted(labels) for name, labels in values.items()})
+
+    @classmethod
+    def open(cls, directory):
+        """Saved encodings, or None when the models were saved without them"""
+        path = os.path.join(directory, ENCODINGS_FILENAME)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def save(self, directory):
+        with open(os.path.join(directory, ENCODINGS_FILENAME), 'w') as f:
+            json.dump(self.classes, f, indent=1)
+
+    def __contains__(self, name):
+        return name in self.classes
+
+    def encode(self, name, values):
+        """Codes of a column's values; raises ValueError for a value the encoder never saw"""
+        values = pd.Series(values, dtype=object)
+        text = values.where(values.notna(), 'nan').astype(str)  # as astype(str) wrote missing values
+        codes = pd.Categorical(text, categories=self.classes[name]).codes
+        if (codes < 0).any():
+            unknown = sorted(set(text[codes < 0]))[:5]
+            raise ValueError(f"Unknown {name} value(s): {', '.join(unknown)}")
+        return codes
+
+
+class TaskModel:
+    """One trained (model, scaler) pair answering batches of feature rows with one predict call.
+
+    Rows are encoded and scaled exactly as in training. Predictions are cached
+    per feature vector, and repeated vectors within a batch are predicted once.
+    """
+
+    def __init__(self, name, model, scaler, features, encodings, cache_size=65536):
+        self.name = name
+        self.model = model
+        self.scaler = scaler
+        self.features = list(features)
+        self.encodings = encodings
+        self.kind = 'classifier' if hasattr(model, 'classes_') else 'regressor'
+        self.cache = InsightCache(maxsize=cache_size)
+
+    def vectors(self, rows):
+        """Feature matrix (one row per input row) in training order; raises ValueError for bad input"""
+        missing = sorted({name for row in rows for name in self.features if name not in row})
+        if missing:
+            raise ValueError(f"Missing feature(s): {', '.join(missing)}")
+        columns = []
+        for name in self.features:
+            values = [row[name] for row in rows]
+            if name in self.encodings:
+                columns.append(self.encodings.encode(name, values).astype(np.float64))
+            else:
+                numbers = pd.to_numeric(pd.Series(values, dtype=object), errors='coerce')
+                columns.append(numbers.fillna(0).to_numpy(dtype=np.float64))  # preprocess_data fills with 0
+        return np.column_stack(columns) if columns else np.empty((len(rows), 0))
+
+    def predict_vectors(self, vectors):
+        """Predictions for a feature matrix and how many came from the cache"""
+        results, hits = self.predict_each(vectors)
+        return results, sum(hits)
+
+    def predict_each(self, vectors):
+        """Predictions for a feature matrix, and whether each came from the cache"""
+        vectors = np.asarray(vectors, dtype=np.float64).reshape(-1, len(self.features))
+        keys = [tuple(vector) for vector in vectors.tolist()]
+        results = [self.cache.get(key) for key in keys]
+        hits = [result is not MISSING for result in results]
+        pending = {}  # distinct uncached vector -> positions asking for it
+        for position, (key, hit) in enumerate(zip(keys, hits)):
+            if not hit:
+                pending.setdefault(key, []).append(position)
+        if pending:
+            frame = pd.DataFrame(list(pending), columns=self.features)
+            scaled = self.scaler.transform(frame)
+            for (key, positions), prediction in zip(pending.items(), self.model.predict(scaled).tolist()):
+                self.cache.set(key, prediction)
+                for position in positions:
+                    results[position] = prediction
+        return results, hits
+
+    def describe(self):
+        return {"features": self.features, "kind": self.kind, "cache": self.cache.stats()}
+
+
+def load_models(directory, encodings, tasks=MODEL_TASKS):
+    """{task: TaskModel} for every task whose artifact exists, and {task: problem} for the rest"""
+    models, problems = {}, {}
+    for task, features in tasks.items():
+        path = os.path.join(directory, MODEL_FILENAME.format(task=task))
+        if joblib is None:
+            problems[task] = "joblib is not installed"
+        elif not os.path.exists(path):
+            problems[task] = f"no model file {path}"
+        else:
+            try:
+                model, scaler = joblib.load(path)
+            except Exception as e:
+                problems[task] = f"cannot load {path}: {e}"
+                continue
+            models[task] = TaskModel(task, model, scaler, features, encodings)
+    return models, problems
@@ -0,0 +1,149 @@
+# parallel.py
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from columnar import ColumnarStore
+
+# Column whose hash assigns rows to shards: every row of a customer lands in the same shard,
+# so per-customer aggregates are shard-local and merging them is a plain union
+SHARD_KEY = 'customer_id'
+
+# Rows gathered at a time within a shard
+CHUNKSIZE = 1_000_000
+
+
+def shard_of(keys, n_shards):
+    """Shard number of each row from its integer key (dictionary code), via a multiplicative hash"""
+    mixed = (np.asarray(keys).astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15)) >> np.uint64(32)
+    return (mixed % np.uint64(n_shards)).astype(np.int32)
+
+
+def _hash_keys(values):
+    return pd.util.hash_pandas_object(pd.Series(values), index=False).to_numpy()
+
+
+# -------------------- WORKER SIDE --------------------
+_store = None
+_shards = {}  # (n_shards, shard) -> sorted row ids of that shard
+_frame = None  # in-memory frame inherited by forked map_shards() workers
+_frame_shards = None
+
+
+def _open_store(directory):
+    global _store
+    _store = ColumnarStore.open(directory)
+    _shards.clear()
+
+
+def _started():
+    return None
+
+
+def _shard_rows(n_shards, shard):
+    rows = _shards.get((n_shards, shard))
+    if rows is None:
+        keys = _store.columns[SHARD_KEY] if SHARD_KEY in _store else np.arange(_store.n_rows)
+        rows = _shards[n_shards, shard] = np.flatnonzero(shard_of(keys, n_shards) == shard)
+    return rows
+
+
+def _run_shard(filters, partials, n_shards, shard, chunksize):
+    """Feed one shard's filtered rows to the partials, a chunk at a time"""
+    rows = _shard_rows(n_shards, shard)
+    selected = _store.select(filters)
+    if selected is not None:
+        rows = np.intersect1d(rows, selected, assume_unique=True)
+    columns = [name for partial in partials for name in partial.columns]
+    for start in range(0, len(rows), chunksize):
+        chunk_rows = rows[start:start + chunksize]
+        chunk = _store.frame(columns, chunk_rows)
+        chunk.index = pd.Index(chunk_rows)  # row ids, for order-sensitive partials
+        for partial in partials:
+            partial.update(chunk)
+    return partials
+
+
+def _map_inherited_shard(function, shard):
+    return function(_frame[_frame_shards == shard])
+
+
+def pool_context():
+    """Start method for long-lived worker pools: never fork, as the parent serves requests from threads"""
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+def _grouped_by_shard_key(partial):
+    # Groups led by the shard key never span shards, so their partials are disjoint
+    by = getattr(partial, 'by', None)
+    return (by if isinstance(by, str) else (list(by) or [None])[0] if by is not None else None) == SHARD_KEY
+
+
+class ShardPool:
+    """Process pool answering partial aggregates over a memory-mapped dataset, one shard per task.
+
+    Every worker maps the same .npy files, so the data lives once in the page
+    cache and nothing but filters and partial states crosses process
+    boundaries. Each query is split into one task per shard and the returned
+    partials are merged in the parent.
+
+    Workers are started from a fresh interpreter (forkserver or spawn, see
+    pool_context) and all of them at construction, so none is ever forked
+    from a process running request threads and the first query does not
+    pay for process startup.
+    """
+
+    def __init__(self, directory, workers=None, shards=None, chunksize=CHUNKSIZE):
+        self.directory = directory
+        self.workers = workers or os.cpu_count() or 1
+        self.shards = shards or self.workers
+        self.chunksize = chunksize
+        self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=pool_context(),
+                                             initializer=_open_store, initargs=(directory,))
+        # One task per worker while none is idle makes the executor start them all now
+        for future in [self._executor.submit(_started) for _ in range(self.workers)]:
+            future.result()
+
+    def run(self, filters, partials):
+        futures = [self._executor.submit(_run_shard, filters, partials, self.shards, shard, self.chunksize)
+                   for shard in range(self.shards)]
+        disjoint = [_grouped_by_shard_key(partial) for partial in partials]
+        merged = None
+        for future in futures:
+            result = future.result()
+            if merged is None:
+                merged = result
+                continue
+            merged = [mine.merge(theirs, True) if shard_local else mine.merge(theirs)
+                      for mine, theirs, shard_local in zip(merged, result, disjoint)]
+        return merged
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def map_shards(frame, key, function, workers=None):
+    """function(shard of frame) for each customer-hash shard of an in-memory frame, in a process pool.
+
+    With the fork start method the workers inherit the frame copy-on-write and
+    only the small results are pickled back; elsewhere each shard is sent to
+    its worker.
+    """
+    global _frame, _frame_shards
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        return [function(frame)]
+    shards = shard_of(_hash_keys(frame[key]), workers)
+    if 'fork' in multiprocessing.get_all_start_methods():
+        _frame, _frame_shards = frame, shards
+        try:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork')) as pool:
+                return list(pool.map(_map_inherited_shard, [function] * workers, range(workers)))
+        finally:
+            _frame = _frame_shards = None
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(function, [frame[shards == shard] for shard in range(workers)]))
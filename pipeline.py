@@ -0,0 +1,475 @@
+# pipeline.py
+import argparse
+import os
+import pickle
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from columnar import ColumnarStore, publish
+from cube import AggregateCube
+from parallel import map_shards
+from profiles import profiled_store
+from sketches import SKETCH_COLUMNS, SketchIndex
+from snapshot import CellDigests
+from stats import StatsIndex
+from timeline import Timeline
+
+RAW_COLUMNS = ['customer_id', 'age', 'gender', 'region', 'product_id', 'category', 'item_purchased', 'price',
+               'quantity', 'product_size', 'product_color', 'purchase_id', 'purchase_date', 'payment_method',
+               'promo_code_used', 'shipping_type', 'review_rating', 'is_subscribed', 'previous_purchases']
+DERIVED_COLUMNS = ['month', 'day_of_week', 'season', 'is_weekend', 'total_revenue', 'category_sales',
+                   'customer_lifetime_value', 'purchase_frequency', 'popularity_score', 'trend_flag',
+                   'discount_effectiveness', 'average_spending', 'average_rating_per_category',
+                   'promo_code_spending', 'most_purchased_category_by_age', 'most_purchased_category_by_gender',
+                   'preferred_shipping_type']
+# Columns left behind by earlier runs of the notebook's merge chain
+STALE_COLUMNS = ['category_sales_x', 'category_sales_y']
+DATE_FORMAT = "%d-%m-%Y"
+TREND_QUANTILE = 0.8
+# Keys the per-key derived columns are looked up by; a row's derived values change only when one of its keys does
+FEATURE_KEYS = ['customer_id', 'item_purchased', 'category', 'age', 'gender']
+# Derived columns looked up by those keys (the rest depend on the row alone)
+KEYED_COLUMNS = [name for name in DERIVED_COLUMNS
+                 if name not in ('month', 'day_of_week', 'season', 'is_weekend', 'total_revenue')]
+
+
+def add_row_features(raw):
+    """Features that depend only on the row itself: calendar fields and revenue"""
+    # Derived columns are always rebuilt, so feeding an already-processed frame back in
+    # cannot produce suffixed duplicates the way repeated merges did
+    stale = raw.columns.intersection(DERIVED_COLUMNS + STALE_COLUMNS)
+    data = raw.drop(columns=stale) if len(stale) else raw.copy(deep=False)
+    dates = pd.to_datetime(data['purchase_date'], format=DATE_FORMAT, errors='coerce')
+    data['month'] = dates.dt.month_name()
+    data['day_of_week'] = dates.dt.day_name()
+    data['season'] = dates.dt.month % 12 // 3 + 1  # 1: Winter, 2: Spring, 3: Summer, 4: Fall
+    data['is_weekend'] = data['day_of_week'].isin(['Saturday', 'Sunday']).astype(int)
+    data['total_revenue'] = data['price'] * data['quantity']
+    return data
+
+
+def _aggregation_frame(data):
+    """Just the columns the per-key aggregates read, with revenue split into promo / non-promo parts"""
+    promo = data['promo_code_used'] == 1
+    plain = data['promo_code_used'] == 0
+    columns = {name: data[name] for name in ['customer_id', 'item_purchased', 'category', 'shipping_type', 'age',
+                                             'gender', 'purchase_id', 'quantity', 'review_rating', 'total_revenue']}
+    columns.update(
+        is_promo=promo.astype(int),
+        is_plain=plain.astype(int),
+        promo_revenue=data['total_revenue'].where(promo),
+        plain_revenue=data['total_revenue'].where(plain),
+    )
+    return pd.DataFrame(columns, copy=False)
+
+
+def _partial_aggregates(data):
+    """Every per-key aggregate of a set of rows; results for disjoint row sets add up"""
+    return {
+        'customers': data.groupby('customer_id').agg(
+            revenue=('total_revenue', 'sum'), revenue_rows=('total_revenue', 'count'),
+            purchases=('purchase_id', 'count'), promo_revenue=('promo_revenue', 'sum'),
+            promo_revenue_rows=('promo_revenue', 'count'), promo_rows=('is_promo', 'sum')),
+        'items': data.groupby('item_purchased').agg(
+            rows=('item_purchased', 'size'), quantity=('quantity', 'sum'), revenue=('total_revenue', 'sum'),
+            rating_sum=('review_rating', 'sum'), rating_rows=('review_rating', 'count'),
+            promo_rows=('is_promo', 'sum'), promo_revenue=('promo_revenue', 'sum'),
+            plain_rows=('is_plain', 'sum'), plain_revenue=('plain_revenue', 'sum')),
+        'categories': data.groupby('category').agg(
+            revenue=('total_revenue', 'sum'), rating_sum=('review_rating', 'sum'),
+            rating_rows=('review_rating', 'count')),
+        'category_shipping': data.groupby(['category', 'shipping_type']).size().to_frame('rows'),
+        'age_category': data.groupby(['age', 'category']).size().to_frame('rows'),
+        'gender_category': data.groupby(['gender', 'category']).size().to_frame('rows'),
+    }
+
+
+def _shard_aggregates(raw):
+    # Aggregates only need revenue among the row features, so workers skip the date parsing
+    data = raw.assign(total_revenue=raw['price'] * raw['quantity'])
+    return _partial_aggregates(_aggregation_frame(data))
+
+
+def _combine_aggregates(parts):
+    if len(parts) == 1:
+        return parts[0]
+    combined = {}
+    for name in parts[0]:
+        frames = pd.concat([part[name] for part in parts])
+        combined[name] = frames.groupby(level=list(range(frames.index.nlevels))).sum()
+    return combined
+
+
+class RunningTotals:
+    """Per-key running aggregates kept in growable arrays, addressed through a key -> slot map"""
+
+    def __init__(self, fields):
+        self.slots = {}
+        self.keys = []
+        self.columns = {name: np.zeros(0, dtype=dtype) for name, dtype in fields.items()}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _reserve(self, n):
+        capacity = len(next(iter(self.columns.values())))
+        if n <= capacity:
+            return
+        capacity = max(n, 2 * capacity, 16)
+        for name, values in self.columns.items():
+            grown = np.zeros(capacity, dtype=values.dtype) if values.dtype != object else np.full(capacity, None)
+            grown[:len(values)] = values
+            self.columns[name] = grown
+
+    def add(self, partial):
+        """Add per-key partial sums (a frame indexed by key); returns the slots touched"""
+        if not self.keys:
+            return self._load(partial)
+        slots = np.empty(len(partial), dtype=np.int64)
+        for i, key in enumerate(partial.index):
+            slot = self.slots.get(key)
+            if slot is None:
+                slot = self.slots[key] = len(self.keys)
+                self.keys.append(key)
+            slots[i] = slot
+        self._reserve(len(self.keys))
+        for name in partial.columns:
+            self.columns[name][slots] += partial[name].to_numpy(dtype=self.columns[name].dtype)
+        return slots
+
+    def _load(self, partial):
+        # Bulk path for a full rebuild: the grouped result becomes the table as-is
+        self.keys = list(partial.index)
+        self.slots = dict(zip(self.keys, range(len(self.keys))))
+        self._reserve(len(self.keys))
+        for name in partial.columns:
+            self.columns[name][:len(self.keys)] = partial[name].to_numpy(dtype=self.columns[name].dtype)
+        return np.arange(len(self.keys))
+
+    def get(self, name, slots=None):
+        values = self.columns[name][:len(self.keys)]
+        return values if slots is None else values[slots]
+
+    def set(self, name, slots, values):
+        self.columns[name][slots] = values
+
+    def lookup(self, keys):
+        """Slot for each key in a row-level series (-1 where the key is unknown or missing)"""
+        return pd.Index(self.keys, tupleize_cols=False).get_indexer(keys)
+
+    def broadcast(self, name, slots):
+        """Gather a per-key column onto rows, NaN/None where the row has no key"""
+        values = self.get(name)[slots]
+        missing = slots < 0
+        if missing.any():
+            values = values.astype(object if values.dtype == object else np.float64)
+            values[missing] = None if values.dtype == object else np.nan
+        return values
+
+    def frame(self):
+        return pd.DataFrame({name: self.get(name) for name in self.columns}, index=pd.Index(self.keys))
+
+
+def build_features(raw, workers=None):
+    """Full rebuild of the processed dataset from raw transactions.
+
+    One grouped pass per key (customer, item, category, age, gender) produces every
+    aggregate for that key; features are broadcast back to rows with vectorized
+    index lookups instead of a chain of merges. workers > 1 computes the
+    aggregates on customer-hash shards in parallel.
+    """
+    return FeaturePipeline.from_raw(raw, workers).frame()
+
+
+def write_dataset(data, directory, sketches=None):
+    """Write the processed frame as the memory-mappable dataset the API opens at startup"""
+    staging = directory + '.tmp'
+    shutil.rmtree(staging, ignore_errors=True)
+    # Customer profiles are saved once per customer; the per-row customer columns are derived from them
+    store = profiled_store(data)
+    store.save(staging)
+    AggregateCube.build(store).save(staging)
+    StatsIndex.build(store).save(staging)
+    timeline = Timeline.build(store)
+    if timeline is not None:
+        timeline.save(staging)
+    CellDigests.build(store).save(staging)
+    (sketches or SketchIndex.build(data[SKETCH_COLUMNS])).save(staging)
+    publish(staging, directory)
+
+
+def weighted_quantile(values, weights, q):
+    """Row-weighted quantile with pandas' linear interpolation, from per-key values and row counts"""
+    present = ~np.isnan(values) & (weights > 0)
+    values, weights = values[present], weights[present]
+    if not len(values):
+        return np.nan
+    order = np.argsort(values, kind='stable')
+    values, cumulative = values[order], np.cumsum(weights[order])
+    position = (cumulative[-1] - 1) * q
+    below = values[np.searchsorted(cumulative, np.floor(position), side='right')]
+    above = values[np.searchsorted(cumulative, np.ceil(position), side='right')]
+    return np.quantile([below, above], position - np.floor(position))
+
+
+class FeaturePipeline:
+    """Feature engineering for processed_dataset.csv, maintained incrementally.
+
+    Every derived column is a function of a few per-key aggregates (per customer,
+    item, category, age and gender). append() folds a batch of raw transactions
+    into those running aggregates and re-derives the features of the keys it
+    touched only, so updating the aggregates costs time proportional to the delta.
+
+    The pipeline keeps the raw rows of the batches appended since it was loaded,
+    never the history: the saved state holds just the aggregates, and the rows
+    already processed live in the dataset written from them. frame(base) appends
+    the new rows to that dataset and rewrites derived values only on the rows
+    whose keys were touched. Reading the previous dataset back and writing it out
+    again remain O(history).
+    """
+
+    def __init__(self):
+        self.batches = []  # raw rows (with row features) appended since the pipeline was created or loaded
+        self.touched = {key: set() for key in FEATURE_KEYS}  # keys whose derived values changed since then
+        self.n_rows = 0    # rows folded into the aggregates, history included
+        self.customers = RunningTotals({
+            'revenue': np.float64, 'revenue_rows': np.float64, 'purchases': np.int64,
+            'promo_revenue': np.float64, 'promo_revenue_rows': np.float64, 'promo_rows': np.int64,
+            'average_spending': np.float64, 'promo_code_spending': np.float64,
+        })
+        self.items = RunningTotals({
+            'rows': np.int64, 'quantity': np.float64, 'revenue': np.float64,
+            'rating_sum': np.float64, 'rating_rows': np.float64,
+            'promo_rows': np.int64, 'promo_revenue': np.float64, 'plain_rows': np.int64, 'plain_revenue': np.float64,
+            'popularity_score': np.float64, 'discount_effectiveness': np.float64, 'trend_flag': np.int64,
+        })
+        self.categories = RunningTotals({
+            'revenue': np.float64, 'rating_sum': np.float64, 'rating_rows': np.float64,
+            'average_rating': np.float64, 'preferred_shipping_type': object,
+        })
+        self.category_shipping = RunningTotals({'rows': np.int64})
+        self.age_category = RunningTotals({'rows': np.int64})
+        self.gender_category = RunningTotals({'rows': np.int64})
+        self.ages = RunningTotals({'top_category': object})
+        self.genders = RunningTotals({'top_category': object})
+        self.trend_threshold = np.nan
+        self.sketches = SketchIndex()
+
+    @classmethod
+    def from_raw(cls, raw, workers=None):
+        pipeline = cls()
+        pipeline.append(raw, workers)
+        return pipeline
+
+    # -------------------- INGESTION --------------------
+    def append(self, raw, workers=None):
+        """Fold a batch of raw transactions in; returns the keys whose features changed.
+
+        With workers > 1 the per-key aggregates are computed per customer-hash shard
+        in a process pool and summed; float totals may then differ in the last bits.
+        """
+        if workers and workers > 1:
+            aggregates = _combine_aggregates(map_shards(raw, 'customer_id', _shard_aggregates, workers))
+        batch = add_row_features(raw)
+        self.batches.append(batch)
+        self.n_rows += len(batch)
+        self.sketches.add(batch[SKETCH_COLUMNS])
+        if not workers or workers <= 1:
+            aggregates = _partial_aggregates(_aggregation_frame(batch))
+
+        customers = self.customers.add(aggregates['customers'])
+        items = self.items.add(aggregates['items'])
+        categories = self.categories.add(aggregates['categories'])
+        self.category_shipping.add(aggregates['category_shipping'])
+        self.age_category.add(aggregates['age_category'])
+        self.gender_category.add(aggregates['gender_category'])
+
+        self._derive_customers(customers)
+        flipped = self._derive_items(items)
+        self._derive_categories(categories)
+        touched_ages = self._derive_top(self.age_category, self.ages, set(batch['age'].dropna()))
+        touched_genders = self._derive_top(self.gender_category, self.genders, set(batch['gender'].dropna()))
+        touched = {
+            'customer_id': [self.customers.keys[s] for s in customers],
+            'item_purchased': [self.items.keys[s] for s in np.union1d(items, flipped)],
+            'category': [self.categories.keys[s] for s in categories],
+            'age': touched_ages,
+            'gender': touched_genders,
+        }
+        for key, values in touched.items():
+            self.touched[key].update(values)
+        return touched
+
+    # -------------------- DERIVED FEATURES --------------------
+    def _derive_customers(self, slots):
+        c = self.customers
+        with np.errstate(invalid='ignore', divide='ignore'):
+            c.set('average_spending', slots, c.get('revenue', slots) / c.get('revenue_rows', slots))
+            promo_spending = c.get('promo_revenue', slots) / c.get('promo_revenue_rows', slots)
+        # Customers who never used a promo code have no promo spending at all
+        c.set('promo_code_spending', slots, np.where(c.get('promo_rows', slots) > 0, promo_spending, np.nan))
+
+    def _derive_items(self, slots):
+        """Derive the touched items' features; returns the slots of untouched items whose trend flag flipped"""
+        i = self.items
+        with np.errstate(invalid='ignore', divide='ignore'):
+            average_rating = i.get('rating_sum', slots) / i.get('rating_rows', slots)
+        i.set('popularity_score', slots,
+              i.get('quantity', slots) * 0.5 + i.get('revenue', slots) * 0.3 + average_rating * 0.2)
+        # Only items sold both with and without a promo code get an effectiveness figure
+        both = (i.get('promo_rows', slots) > 0) & (i.get('plain_rows', slots) > 0)
+        i.set('discount_effectiveness', slots,
+              np.where(both, i.get('promo_revenue', slots) - i.get('plain_revenue', slots), np.nan))
+        # The trend threshold is a row-weighted quantile over all items; recomputing it costs
+        # O(items log items), independent of how many transactions are stored
+        popularity = i.get('popularity_score')
+        self.trend_threshold = weighted_quantile(popularity, i.get('rows'), TREND_QUANTILE)
+        previous = i.get('trend_flag').copy()
+        with np.errstate(invalid='ignore'):
+            i.columns['trend_flag'][:len(i)] = popularity >= self.trend_threshold
+        return np.flatnonzero(previous != i.get('trend_flag'))
+
+    def _derive_categories(self, slots):
+        c = self.categories
+        with np.errstate(invalid='ignore', divide='ignore'):
+            c.set('average_rating', slots, c.get('rating_sum', slots) / c.get('rating_rows', slots))
+        touched = {c.keys[s] for s in slots}
+        modes = self._top_per_group(self.category_shipping, touched)
+        for key, slot in zip((c.keys[s] for s in slots), slots):
+            c.columns['preferred_shipping_type'][slot] = modes.get(key)
+
+    @staticmethod
+    def _top_per_group(pairs, groups):
+        """Most frequent second key per first key (ties go to the smallest), for the given groups"""
+        counts = pairs.frame()
+        if counts.empty:
+            return {}
+        counts.index = pd.MultiIndex.from_tuples(counts.index)
+        counts = counts[counts.index.get_level_values(0).isin(list(groups))]
+        counts = counts.reset_index().sort_values(['level_0', 'rows', 'level_1'], ascending=[True, False, True])
+        return counts.drop_duplicates('level_0').set_index('level_0')['level_1'].to_dict()
+
+    def _derive_top(self, pairs, target, groups):
+        top = self._top_per_group(pairs, groups)
+        slots = target.add(pd.DataFrame(index=pd.Index(list(top), dtype=object)))
+        target.set('top_category', slots, list(top.values()))
+        return list(top)
+
+    # -------------------- MATERIALIZATION --------------------
+    def frame(self, base=None):
+        """The processed dataset: raw rows plus every derived column.
+
+        base is the processed dataset the saved state was last materialized into; its
+        rows are kept, and only those holding a touched key get their derived values
+        rewritten. Without base the appended batches must be the whole history.
+        """
+        if not self.batches and base is None:
+            raise ValueError("no rows: append raw transactions or pass the processed dataset as base")
+        if self.batches:
+            data = pd.concat(self.batches, ignore_index=True) if len(self.batches) > 1 else self.batches[0].copy(deep=False)
+            data = self._derive_rows(data)
+        if base is None:
+            return data
+        if len(base) != self.history:
+            raise ValueError(f"processed dataset has {len(base)} rows, the pipeline state expects {self.history}")
+        base = base.copy(deep=False)
+        touched = np.zeros(len(base), dtype=bool)
+        for key, values in self.touched.items():
+            if values:
+                touched |= base[key].isin(list(values)).to_numpy()
+        if touched.any():
+            rows = np.flatnonzero(touched)
+            refreshed = self._derive_rows(base.iloc[rows].reset_index(drop=True))
+            for name in KEYED_COLUMNS:
+                old, new = base[name].to_numpy(), refreshed[name].to_numpy()
+                numeric = old.dtype.kind in 'biuf' and new.dtype.kind in 'biuf'
+                column = old.astype(np.result_type(old, new) if numeric else object)  # a copy
+                column[rows] = new
+                base[name] = column
+        if not self.batches:
+            return base
+        # Columns come out in the order a full build gives them, whatever order base was read back in
+        return pd.concat([base, data], ignore_index=True)[data.columns]
+
+    def _derive_rows(self, data):
+        """data with every per-key derived column looked up from the aggregates"""
+        customer = self.customers.lookup(data['customer_id'])
+        item = self.items.lookup(data['item_purchased'])
+        category = self.categories.lookup(data['category'])
+        data['category_sales'] = self.categories.broadcast('revenue', category)
+        data['customer_lifetime_value'] = self.customers.broadcast('revenue', customer)
+        data['purchase_frequency'] = self.customers.broadcast('purchases', customer)
+        data['popularity_score'] = self.items.broadcast('popularity_score', item)
+        data['trend_flag'] = np.where(item >= 0, self.items.get('trend_flag')[item], 0)
+        data['discount_effectiveness'] = self.items.broadcast('discount_effectiveness', item)
+        data['average_spending'] = self.customers.broadcast('average_spending', customer)
+        data['average_rating_per_category'] = self.categories.broadcast('average_rating', category)
+        data['promo_code_spending'] = self.customers.broadcast('promo_code_spending', customer)
+        data['most_purchased_category_by_age'] = self.ages.broadcast('top_category', self.ages.lookup(data['age']))
+        data['most_purchased_category_by_gender'] = self.genders.broadcast(
+            'top_category', self.genders.lookup(data['gender']))
+        data['preferred_shipping_type'] = self.categories.broadcast('preferred_shipping_type', category)
+        return data
+
+    # -------------------- PERSISTENCE --------------------
+    def __getstate__(self):
+        # The state is the aggregates only; the rows are in the processed dataset written from them
+        state = dict(self.__dict__)
+        state['batches'] = []
+        state['touched'] = {key: set() for key in FEATURE_KEYS}
+        return state
+
+    @property
+    def history(self):
+        """Rows folded in before this pipeline was loaded, which only the processed dataset holds"""
+        return self.n_rows - sum(len(batch) for batch in self.batches)
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(path):
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or incrementally update the processed shopping dataset")
+    parser.add_argument('raw', nargs='+', help="raw transaction CSV files, in the order they should be appended")
+    parser.add_argument('--state', help="pipeline state file; appended to when it exists, written back afterwards")
+    parser.add_argument('--output', default='processed_dataset.cols', help="where to write the columnar dataset")
+    parser.add_argument('--csv', help="also export the processed dataset as CSV")
+    parser.add_argument('--workers', type=int, default=1, help="processes computing the per-key aggregates")
+    args = parser.parse_args()
+
+    if args.state and os.path.exists(args.state):
+        pipeline = FeaturePipeline.load(args.state)
+    else:
+        pipeline = FeaturePipeline()
+    base = None
+    if pipeline.history:
+        # The rows processed by earlier runs are read back from the dataset they were written to
+        if not os.path.isdir(args.output):
+            parser.error(f"{args.state} covers {pipeline.history} rows already processed into {args.output}, "
+                         f"which does not exist; rebuild without --state")
+        store = ColumnarStore.open(args.output)
+        base = store.frame(store.names).copy()  # not memory-mapped: write_dataset replaces the directory
+        del store
+    for path in args.raw:
+        pipeline.append(pd.read_csv(path), args.workers)
+    data = pipeline.frame(base)
+    write_dataset(data, args.output, pipeline.sketches)
+    print(f"Processed dataset saved to {args.output}")
+    # Saved last, so the state never runs ahead of the dataset it describes
+    if args.state:
+        pipeline.save(args.state)
+    if args.csv:
+        data.to_csv(args.csv, index=False)
+        print(f"CSV export saved to {args.csv}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,261 @@
+# profiles.py
+import json
+import os
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from columnar import ColumnarStore, _code_dtype, has_range, save_array
+
+# Customer column the profiles are keyed by (its dictionary code in the store)
+PROFILE_KEY = 'customer_id'
+# Filter column profiles keep per-value counts for; every other filter column must be a customer attribute
+PROFILE_AXIS = 'category'
+# Columns read to build the profiles
+PROFILE_SOURCES = [PROFILE_KEY, PROFILE_AXIS, 'total_revenue', 'purchase_id']
+# Per-customer features the notebook broadcast onto every transaction row; stores derive them from the profiles
+PROFILE_COLUMNS = ['customer_lifetime_value', 'purchase_frequency', 'average_spending']
+
+_FIELDS = ('rows', 'purchases', 'revenue', 'revenue_rows', 'category_rows', 'category_bits')
+
+
+def _counts(values):
+    """Counts in the smallest integer type that holds them"""
+    return values.astype(_code_dtype(int(values.max()) + 1 if len(values) else 0))
+
+
+def _present(store, name):
+    values = np.asarray(store.values(name))
+    return values >= 0 if store.is_categorical(name) else ~pd.isna(values)
+
+
+def profiled_store(frame):
+    """ColumnarStore of a processed frame with the per-customer columns dropped and derived from profiles"""
+    if not all(name in frame.columns for name in PROFILE_SOURCES):
+        return ColumnarStore.from_frame(frame)
+    store = ColumnarStore.from_frame(frame.drop(columns=PROFILE_COLUMNS, errors='ignore'))
+    CustomerProfiles.build(store).attach(store)
+    return store
+
+
+class CustomerProfiles:
+    """One row per customer, addressed by the store's integer customer code.
+
+    A profile holds the customer's transaction and purchase counts, lifetime
+    revenue, transactions per category, a bitset of the categories bought
+    and the key of every filter column that is constant per customer (region,
+    gender, subscription, ...). The customer-centric questions are answered
+    from these arrays with one pass over the customers instead of regrouping
+    the transactions; any filter that is neither a customer attribute nor a
+    category returns None and the caller uses the rows. The per-row customer
+    columns are gathered from the profiles on demand, so the transaction
+    store does not keep a copy of them.
+    """
+
+    def __init__(self, store, fields, attributes, complete):
+        self.store = store
+        self.fields = fields          # _FIELDS -> per-customer arrays ((customers, categories) for category_rows)
+        self.attributes = attributes  # filter column -> per-customer key (-1: missing or no rows)
+        self.complete = complete      # every transaction has a customer, so derived counts stay integers
+
+    @classmethod
+    def build(cls, store):
+        customer = np.asarray(store.values(PROFILE_KEY)).astype(np.int64)
+        n = len(store.dictionaries[PROFILE_KEY])
+        known = customer >= 0
+        c = customer[known]
+        revenue = np.asarray(store.values('total_revenue'), dtype=np.float64)[known]
+        paid = ~np.isnan(revenue)
+        category = np.asarray(store.index.keys[PROFILE_AXIS]).astype(np.int64)[known]
+        width = len(store.index.labels[PROFILE_AXIS])
+        bought = category >= 0
+        flat = c[bought] * width + category[bought]
+        fields = {
+            'rows': _counts(np.bincount(c, minlength=n)),
+            'purchases': _counts(np.bincount(c[_present(store, 'purchase_id')[known]], minlength=n)),
+            'revenue': np.bincount(c[paid], weights=revenue[paid], minlength=n),
+            'revenue_rows': _counts(np.bincount(c[paid], minlength=n)),
+            'category_rows': _counts(np.bincount(flat, minlength=n * width)).reshape(n, width),
+        }
+        # 64 categories per word; bit k of word k // 64 is set when the customer bought category k
+        bits = np.zeros((n, (width + 63) // 64), dtype=np.uint64)
+        for k in range(width):
+            bits[fields['category_rows'][:, k] > 0, k // 64] |= np.uint64(1) << np.uint64(k % 64)
+        fields['category_bits'] = bits
+
+        attributes = {}
+        active = fields['rows'] > 0
+        for name in store.index.keys:
+            if name == PROFILE_AXIS:
+                continue
+            keys = np.asarray(store.index.keys[name]).astype(np.int64)[known]
+            low = np.full(n, np.iinfo(np.int64).max)
+            high = np.full(n, np.iinfo(np.int64).min)
+            np.minimum.at(low, c, keys)
+            np.maximum.at(high, c, keys)
+            if np.array_equal(low[active], high[active]):
+                attributes[name] = np.where(active, low, -1).astype(_code_dtype(len(store.index.labels[name])))
+        return cls(store, fields, attributes, bool(known.all()))
+
+    # -------------------- ON-DISK FORMAT --------------------
+    def save(self, directory):
+        """Store the profiles next to a saved ColumnarStore (which then derives the customer columns from them)"""
+        directory = os.path.join(directory, 'profiles')
+        os.makedirs(directory, exist_ok=True)
+        for name, values in self.fields.items():
+            save_array(os.path.join(directory, f'{name}.npy'), values)
+        for name, values in self.attributes.items():
+            save_array(os.path.join(directory, f'{name}.attribute.npy'), values)
+        with open(os.path.join(directory, 'manifest.json'), 'w') as f:
+            json.dump({'attributes': list(self.attributes), 'complete': self.complete}, f, indent=1)
+
+    @classmethod
+    def open(cls, directory, store):
+        """Memory-map saved profiles, or build them when the dataset was saved without them"""
+        directory = os.path.join(directory, 'profiles')
+        if not os.path.exists(os.path.join(directory, 'manifest.json')):
+            return cls.build(store)
+        with open(os.path.join(directory, 'manifest.json')) as f:
+            manifest = json.load(f)
+
+        def load(filename):
+            return np.asarray(np.load(os.path.join(directory, filename), mmap_mode='r'))
+
+        return cls(store, {name: load(f'{name}.npy') for name in _FIELDS},
+                   {name: load(f'{name}.attribute.npy') for name in manifest['attributes']}, manifest['complete'])
+
+    # -------------------- DERIVED COLUMNS --------------------
+    def attach(self, store):
+        """Serve the per-customer columns the store does not hold from these profiles"""
+        store.profiles = self
+        store.derive({name: partial(self.column, name) for name in PROFILE_COLUMNS if name not in store.columns})
+
+    def _per_customer(self, name):
+        if name == 'customer_lifetime_value':
+            return np.asarray(self.fields['revenue'])
+        if name == 'purchase_frequency':
+            return np.asarray(self.fields['purchases']).astype(np.int64)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self.fields['revenue'] / self.fields['revenue_rows']
+
+    def column(self, name, rows=None):
+        """A per-customer feature gathered onto transaction rows, as the feature pipeline broadcast it"""
+        values = self._per_customer(name)
+        customer = np.asarray(self.store.values(PROFILE_KEY, rows))
+        if self.complete:
+            return values[customer]
+        gathered = values.astype(np.float64)[customer]
+        gathered[customer < 0] = np.nan
+        return gathered
+
+    # -------------------- QUESTIONS --------------------
+    def _selection(self, filters):
+        """(customer mask or None for every customer, category key or None), or None when a filter is not
+        a customer attribute or a category"""
+        if has_range(filters):
+            return None
+        mask, category = None, None
+        for name, value in (filters or {}).items():
+            if name not in self.store.index or value is None or value == "All":
+                continue
+            key = self.store.index.key_of(name, value)
+            if name == PROFILE_AXIS:
+                category = key
+            elif name in self.attributes:
+                matches = self.attributes[name] == key if key >= 0 else np.zeros(len(self.fields['rows']), bool)
+                mask = matches if mask is None else mask & matches
+            else:
+                return None
+        return mask, category
+
+    def _customers(self, selection):
+        """Customer codes with a selected transaction, and their selected row counts"""
+        mask, category = selection
+        if category is None:
+            rows = self.fields['rows']
+        elif category < 0:
+            rows = np.zeros(len(self.fields['rows']), dtype=np.int64)
+        else:
+            rows = self.fields['category_rows'][:, category]
+        kept = rows > 0 if mask is None else (rows > 0) & mask
+        codes = np.flatnonzero(kept)
+        return codes, np.asarray(rows)[codes]
+
+    def covers(self, filters):
+        """Whether the customer questions can be answered from the profiles under filters"""
+        return self._selection(filters) is not None
+
+    def lifetime_value(self, filters, n=10):
+        """groupby(customer)['total_revenue'].sum().nlargest(n) over the filtered rows, or None
+        (a category filter narrows the rows enough that they are summed instead)"""
+        selection = self._selection(filters)
+        if selection is None or selection[1] is not None:
+            return None
+        codes, _ = self._customers(selection)
+        values = np.asarray(self.fields['revenue'])[codes]
+        if pd.api.types.is_integer_dtype(self.store.column_dtype('total_revenue')):
+            values = values.astype(np.int64)
+        if len(values) > n:
+            # Only customers at or above the n-th largest value can place; ties keep customer order
+            candidates = np.flatnonzero(values >= np.partition(values, len(values) - n)[len(values) - n])
+            codes, values = codes[candidates], values[candidates]
+        labels = pd.Index(self.store.dictionaries[PROFILE_KEY][codes], name=PROFILE_KEY)
+        return pd.Series(values, index=labels).nlargest(n)
+
+    def repurchase_rate(self, filters):
+        """Mean transactions per (customer, category) pair in each category over the filtered rows, or None"""
+        selection = self._selection(filters)
+        if selection is None:
+            return None
+        mask, category = selection
+        counts = self.fields['category_rows'] if mask is None else self.fields['category_rows'][mask]
+        labels = self.store.index.labels[PROFILE_AXIS]
+        if category is not None:
+            counts = counts[:, [category]] if category >= 0 else counts[:, :0]
+            labels = labels[[category]] if category >= 0 else labels[:0]
+        pairs = (counts > 0).sum(axis=0)
+        observed = pairs > 0
+        rates = counts.sum(axis=0, dtype=np.int64)[observed] / pairs[observed]
+        return pd.Series(rates, index=pd.Index(np.asarray(labels)[observed], name=PROFILE_AXIS))
+
+    def multi_category(self, filters):
+        """Customers buying from more than one category among the filtered rows, or None"""
+        selection = self._selection(filters)
+        if selection is None:
+            return None
+        mask, category = selection
+        if category is not None:
+            return 0  # a category filter leaves each customer one category at most
+        bits = self.fields['category_bits'] if mask is None else self.fields['category_bits'][mask]
+        categories = np.unpackbits(np.ascontiguousarray(bits).view(np.uint8), axis=1).sum(axis=1)
+        return int((categories > 1).sum())
+
+    def rollup(self, filters, by, measure=None, how='sum'):
+        """groupby(by)[measure].<how>() over the filtered rows for a customer attribute by and a
+        per-customer measure, or None"""
+        if by not in self.attributes or how not in ('sum', 'mean', 'size') or (how != 'size' and measure not in PROFILE_COLUMNS):
+            return None
+        selection = self._selection(filters)
+        if selection is None:
+            return None
+        codes, rows = self._customers(selection)
+        keys = np.asarray(self.attributes[by])[codes]
+        labels = self.store.index.labels[by]
+        grouped = keys >= 0  # pandas drops missing group keys
+        observed = np.bincount(keys[grouped], minlength=len(labels)) > 0
+        index = pd.Index(labels, name=by)[observed]
+        if how == 'size':
+            return pd.Series(np.bincount(keys[grouped], weights=rows[grouped], minlength=len(labels))[observed]
+                             .astype(np.int64), index=index)
+        values = self._per_customer(measure)[codes]
+        counted = grouped & ~np.isnan(values.astype(np.float64))
+        totals = np.bincount(keys[counted], weights=rows[counted] * values[counted], minlength=len(labels))
+        if how == 'sum':
+            if np.issubdtype(values.dtype, np.integer):
+                totals = totals.astype(np.int64)
+            return pd.Series(totals[observed], index=index, name=measure)
+        weights = np.bincount(keys[counted], weights=rows[counted], minlength=len(labels))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = totals / weights
+        return pd.Series(means[observed], index=index, name=measure)
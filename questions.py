@@ -0,0 +1,228 @@
+# questions.py
+
+# Visualization types the dashboard knows how to draw
+VIZ_TYPES = ('bar', 'line', 'pie', 'metric', 'heatmap', 'scatter', 'list', 'dual_bar', 'dual_heatmap', 'dual_line')
+
+
+class QuestionUnavailable(LookupError):
+    """A registered question the loaded dataset cannot answer (see Question.problem)"""
+
+
+class Question:
+    """One insight question: the analyzer method answering it, how it is drawn, and what it needs.
+
+    params maps request args the method takes to their defaults. columns lists
+    the dataset columns the method reads; "{name}" entries are filled from the
+    params (e.g. a grouping column chosen by a request arg). cube marks questions
+    answered entirely by AggregateCube rollups for region/category filters.
+    approx names an analyzer method answering from sketches when a request
+    asks for approx=true.
+    """
+
+    def __init__(self, category, id, text, func, viz, columns, params=None, cube=False, cacheable=True, approx=None):
+        self.category = category
+        self.id = id
+        self.text = text
+        self.func = func
+        self.viz = viz
+        self.columns = tuple(columns)
+        self.params = params or {}
+        self.cube = cube
+        self.cacheable = cacheable
+        self.approx = approx
+        self.problem = None  # set by QuestionRegistry.validate() when the dataset cannot answer it
+
+    @property
+    def available(self):
+        return self.problem is None
+
+    def arguments(self, args):
+        """Method keyword arguments taken from the request args, falling back to the defaults"""
+        return {name: (args or {}).get(name, default) for name, default in self.params.items()}
+
+    def columns_for(self, arguments):
+        return [column.format(**arguments) for column in self.columns]
+
+    def to_dict(self):
+        return {"id": self.id, "text": self.text, "func": self.func, "viz": self.viz}
+
+
+class QuestionRegistry:
+    """(category, id) -> Question, plus the per-category summary line used in responses"""
+
+    def __init__(self):
+        self.summaries = {}
+        self._questions = {}
+        self._by_category = {}
+
+    def category(self, name, summary):
+        self.summaries[name] = summary
+        self._by_category.setdefault(name, [])
+
+    def add(self, category, id, text, func, viz, columns, **options):
+        if category not in self.summaries:
+            raise KeyError(f"Unknown question category {category!r}")
+        if (category, id) in self._questions:
+            raise ValueError(f"Question {category}/{id} is registered twice")
+        question = Question(category, id, text, func, viz, columns, **options)
+        self._questions[category, id] = question
+        self._by_category[category].append(question)
+        return question
+
+    def get(self, category, id):
+        return self._questions.get((category, id))
+
+    def __iter__(self):
+        return iter(self._questions.values())
+
+    def __len__(self):
+        return len(self._questions)
+
+    def categories(self):
+        return list(self._by_category)
+
+    def listing(self, category):
+        """The /api/questions/<category> payload, or None for an unknown category"""
+        questions = self._by_category.get(category)
+        return None if questions is None else [question.to_dict() for question in questions]
+
+    def validate(self, analyzer):
+        """Check every question against the loaded dataset; returns {(category, id): problem}.
+
+        Questions whose method or columns are missing are marked unavailable
+        instead of failing on every request. A cube question whose dimensions
+        or measures are not materialized only loses the fast path, so that is
+        reported without disabling it.
+        """
+        problems = {}
+        for question in self:
+            question.problem = None
+            if not callable(getattr(analyzer, question.func, None)):
+                question.problem = f"analyzer has no method {question.func}"
+            elif question.approx and not callable(getattr(analyzer, question.approx, None)):
+                question.problem = f"analyzer has no method {question.approx}"
+            elif question.viz not in VIZ_TYPES:
+                question.problem = f"unknown visualization {question.viz!r}"
+            else:
+                columns = question.columns_for(question.arguments(None))
+                missing = [name for name in columns if name not in analyzer.store]
+                if missing:
+                    question.problem = f"dataset has no column(s) {', '.join(missing)}"
+                elif question.cube and analyzer.cube is not None:
+                    uncovered = [name for name in columns
+                                 if name not in analyzer.cube.dimensions and name not in analyzer.cube.measures]
+                    if uncovered:
+                        problems[question.category, question.id] = (
+                            f"not in the aggregate cube ({', '.join(uncovered)}); served from raw rows")
+            if question.problem:
+                problems[question.category, question.id] = question.problem
+        return problems
+
+
+REGISTRY = QuestionRegistry()
+
+# -------------------- SALES & PRODUCT TRENDS --------------------
+REGISTRY.category('sales_trends', "Sales & Product Trends Analysis")
+REGISTRY.add('sales_trends', 1, "Top 10 products by revenue", "get_top_products_by_revenue", "bar",
+             ['item_purchased', 'total_revenue'], cube=True, approx="approx_top_products_by_revenue")
+REGISTRY.add('sales_trends', 2, "Product generating the most revenue", "get_highest_revenue_product", "metric",
+             ['item_purchased', 'total_revenue'], cube=True)
+REGISTRY.add('sales_trends', 3, "Sales variation by month", "get_sales_by_time_period", "line",
+             ['purchase_date', 'total_revenue'], params={'period': 'month'})
+REGISTRY.add('sales_trends', 4, "Sales by weekday", "get_sales_by_weekday", "bar",
+             ['day_of_week', 'total_revenue'], cube=True)
+REGISTRY.add('sales_trends', 5, "Top products by popularity", "get_products_by_popularity", "bar",
+             ['item_purchased', 'popularity_score'], cube=True)
+REGISTRY.add('sales_trends', 6, "Revenue by season", "get_revenue_by_season", "pie",
+             ['season', 'total_revenue'], cube=True)
+REGISTRY.add('sales_trends', 7, "Sales distribution by size/color", "get_sales_distribution_size_color", "dual_bar",
+             ['product_size', 'product_color', 'quantity'], cube=True)
+REGISTRY.add('sales_trends', 8, "Discount effectiveness", "get_discount_effectiveness", "bar",
+             ['promo_code_used', 'total_revenue'], cube=True)
+
+# -------------------- CUSTOMER DEMOGRAPHICS --------------------
+REGISTRY.category('customer_demographics', "Customer Demographics Analysis")
+REGISTRY.add('customer_demographics', 1, "Revenue by age group", "get_revenue_by_age_group", "bar",
+             ['age', 'total_revenue'], cube=True)
+REGISTRY.add('customer_demographics', 2, "Purchase distribution by gender", "get_purchases_by_gender", "pie",
+             ['gender', 'quantity'], cube=True)
+REGISTRY.add('customer_demographics', 3, "Top regions by sales", "get_top_regions_by_sales", "bar",
+             ['region', 'total_revenue'], cube=True)
+REGISTRY.add('customer_demographics', 4, "Age group category preferences", "get_age_category_preferences", "heatmap",
+             ['age', 'most_purchased_category_by_age', 'quantity'])
+REGISTRY.add('customer_demographics', 5, "Gender category preferences", "get_gender_category_preferences", "heatmap",
+             ['gender', 'most_purchased_category_by_gender', 'quantity'])
+REGISTRY.add('customer_demographics', 6, "Average order value by region", "get_avg_order_value_by_region", "bar",
+             ['region', 'total_revenue'], cube=True)
+REGISTRY.add('customer_demographics', 7, "Subscribed vs. non-subscribed spending", "get_subscribed_vs_non_subscribed",
+             "bar", ['is_subscribed', 'total_revenue'], cube=True)
+
+# -------------------- CUSTOMER BEHAVIOR --------------------
+REGISTRY.category('customer_behavior', "Customer Behavior Analysis")
+REGISTRY.add('customer_behavior', 1, "Average purchase frequency", "get_avg_purchase_frequency", "metric",
+             ['purchase_frequency'])
+REGISTRY.add('customer_behavior', 2, "Category repurchase rate", "get_category_repurchase_rate", "bar",
+             ['customer_id', 'category'], approx="approx_category_repurchase_rate")
+REGISTRY.add('customer_behavior', 3, "Top customers by lifetime value", "get_customer_lifetime_value", "bar",
+             ['customer_id', 'total_revenue'], approx="approx_customer_lifetime_value")
+REGISTRY.add('customer_behavior', 4, "Discount response analysis", "get_discount_response_analysis", "bar",
+             ['promo_code_used', 'quantity'], cube=True)
+REGISTRY.add('customer_behavior', 5, "Spending with/without promo codes", "get_promo_vs_non_promo_spending", "bar",
+             ['promo_code_used', 'total_revenue'], cube=True)
+REGISTRY.add('customer_behavior', 6, "Rating vs. purchase frequency correlation", "get_rating_purchase_correlation",
+             "metric", ['review_rating', 'purchase_frequency'])
+REGISTRY.add('customer_behavior', 7, "Weekday vs. weekend behavior", "get_weekday_vs_weekend_behavior", "bar",
+             ['is_weekend', 'total_revenue'], cube=True)
+REGISTRY.add('customer_behavior', 8, "Shipping preferences by gender", "get_shipping_preference_by_demo", "heatmap",
+             ['{demo}', 'shipping_type'], params={'demo': 'gender'})
+
+# -------------------- OPERATIONAL INSIGHTS --------------------
+REGISTRY.category('operational_insights', "Operational Insights Analysis")
+REGISTRY.add('operational_insights', 1, "Stocking recommendations", "get_stocking_recommendations", "list",
+             ['trend_flag', 'popularity_score', 'item_purchased'])
+REGISTRY.add('operational_insights', 2, "Seasonal demand spikes", "get_seasonal_demand_spikes", "line",
+             ['season', 'quantity'], cube=True)
+REGISTRY.add('operational_insights', 3, "Shipping preferences for high-value products",
+             "get_shipping_preferences_high_value", "pie", ['price', 'shipping_type'])
+REGISTRY.add('operational_insights', 4, "Shipping impact by size/color", "get_shipping_impact_size_color",
+             "dual_heatmap", ['product_size', 'product_color', 'shipping_type'])
+REGISTRY.add('operational_insights', 5, "Underperforming categories", "get_underperforming_categories", "bar",
+             ['category', 'total_revenue'], cube=True)
+REGISTRY.add('operational_insights', 6, "Popular payment methods", "get_payment_method_frequency", "pie",
+             ['payment_method'], cube=True)
+REGISTRY.add('operational_insights', 7, "Revenue per payment method", "get_revenue_per_payment_method", "bar",
+             ['payment_method', 'total_revenue'], cube=True)
+REGISTRY.add('operational_insights', 8, "Multi-category customers", "get_multi_category_customers", "metric",
+             ['customer_id', 'category'], approx="approx_multi_category_customers")
+
+# -------------------- ADVANCED INSIGHTS --------------------
+REGISTRY.category('advanced_insights', "Advanced Insights Analysis")
+REGISTRY.add('advanced_insights', 1, "Product size vs. purchase frequency", "get_size_purchase_freq_correlation", "bar",
+             ['product_size', 'purchase_frequency'], cube=True)
+REGISTRY.add('advanced_insights', 2, "Revenue by review rating", "get_revenue_by_rating", "scatter",
+             ['review_rating', 'total_revenue'], cube=True)
+REGISTRY.add('advanced_insights', 3, "Discounts vs. ratings correlation", "get_discount_rating_correlation", "metric",
+             ['discount_effectiveness', 'review_rating'])
+REGISTRY.add('advanced_insights', 4, "Promo code usage trends", "get_promo_usage_trends", "line",
+             ['purchase_date', 'promo_code_used'], params={'period': 'month'})
+REGISTRY.add('advanced_insights', 5, "Young customers' trendy preferences", "get_young_customer_trends", "bar",
+             ['age', 'item_purchased', 'popularity_score'])
+REGISTRY.add('advanced_insights', 6, "Promo usage by region", "get_promo_usage_by_region", "bar",
+             ['region', 'promo_code_used'], cube=True)
+REGISTRY.add('advanced_insights', 7, "Shipping preferences by product", "get_shipping_preferences_by_product",
+             "heatmap", ['item_purchased', 'shipping_type'])
+REGISTRY.add('advanced_insights', 8, "Seasonal revenue & category impact", "get_seasonal_impact", "dual_line",
+             ['season', 'category', 'total_revenue'])
+
+# -------------------- COMPARATIVE INSIGHTS --------------------
+REGISTRY.category('comparative_insights', "Comparative Insights Analysis")
+REGISTRY.add('comparative_insights', 1, "Purchase frequency by region", "get_purchase_freq_by_region", "bar",
+             ['region', 'purchase_frequency'], cube=True)
+REGISTRY.add('comparative_insights', 2, "Category popularity: Subscribed vs. Non-Subscribed",
+             "get_category_popularity_subscribed", "heatmap", ['is_subscribed', 'category', 'quantity'])
+REGISTRY.add('comparative_insights', 3, "Review ratings by gender", "get_gender_rating_differences", "bar",
+             ['gender', 'review_rating'], cube=True)
+REGISTRY.add('comparative_insights', 4, "Average spending: Subscribed vs. Non-Subscribed",
+             "get_avg_spending_subscribed_vs_non", "bar", ['is_subscribed', 'average_spending'], cube=True)
+REGISTRY.add('comparative_insights', 5, "Urban vs. Rural category preferences", "get_urban_rural_category_preferences",
+             "heatmap", ['region_type', 'category', 'quantity'])
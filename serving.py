@@ -0,0 +1,116 @@
+# serving.py
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class Overloaded(RuntimeError):
+    """The work queue is full; the caller should answer 503 and the client retry later"""
+
+
+class InsightPool:
+    """Bounded worker pool for analyzer work, shared by every request thread.
+
+    call(key, ...) runs function(*args) on one of `workers` threads and waits
+    for it. Requests with the same key arriving while that computation is in
+    flight join it instead of starting their own (single flight), so a burst
+    of identical Analyze clicks costs one computation. At most `max_pending`
+    distinct computations are queued or running; beyond that call() raises
+    Overloaded at once rather than letting latency grow without bound.
+    """
+
+    def __init__(self, workers=4, max_pending=64):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='insight')
+        self._lock = threading.Lock()
+        self._inflight = {}  # key -> future of the running computation
+        self._counts = {'executed': 0, 'coalesced': 0, 'rejected': 0}
+
+    def call(self, key, function, *args):
+        started = False
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self._counts['coalesced'] += 1
+            elif len(self._inflight) >= self.max_pending:
+                self._counts['rejected'] += 1
+                raise Overloaded(f"{len(self._inflight)} computations already pending")
+            else:
+                future = self._inflight[key] = self._executor.submit(function, *args)
+                self._counts['executed'] += 1
+                started = True
+        if started:
+            # Registered outside the lock: a future that is already done runs the callback right here
+            future.add_done_callback(lambda done: self._finish(key, done))
+        return future.result()
+
+    def _finish(self, key, future):
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counts, workers=self.workers, max_pending=self.max_pending,
+                        pending=len(self._inflight))
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class MicroBatcher:
+    """Coalesces concurrent single-item calls into one batched call.
+
+    call(item) queues the item and waits for its result. A collector thread
+    takes the first queued item, gathers whatever else arrives within
+    max_wait seconds (at most max_batch items) and answers them all with one
+    function(items) call, which returns one result per item in order. Under
+    load many requests share one vectorized call; a lone request waits at
+    most max_wait.
+    """
+
+    def __init__(self, function, max_batch=256, max_wait=0.002, name='micro-batch'):
+        self.function = function
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._counts = {'calls': 0, 'batches': 0, 'largest_batch': 0}
+        self._thread = threading.Thread(target=self._collect, name=name, daemon=True)
+        self._thread.start()
+
+    def call(self, item):
+        future = Future()
+        self._queue.put((item, future))
+        return future.result()
+
+    def _collect(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            with self._lock:
+                self._counts['calls'] += len(batch)
+                self._counts['batches'] += 1
+                self._counts['largest_batch'] = max(self._counts['largest_batch'], len(batch))
+            try:
+                results = self.function([item for item, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._counts)
+        counts['mean_batch'] = counts['calls'] / counts['batches'] if counts['batches'] else 0.0
+        return dict(counts, max_batch=self.max_batch, max_wait=self.max_wait)
@@ -0,0 +1,234 @@
+# sketches.py
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from columnar import FILTER_COLUMNS, has_range, save_array
+from cube import CUBE_AXES
+
+# Sketches kept per cell: heavy hitters of key weighted by a measure, and distinct counts of a key
+TOP_SKETCHES = {'customer_revenue': ('customer_id', 'total_revenue'), 'item_revenue': ('item_purchased', 'total_revenue')}
+DISTINCT_SKETCHES = {'customers': 'customer_id'}
+SKETCH_COLUMNS = ['region', 'category', 'customer_id', 'item_purchased', 'total_revenue']
+TOP_CAPACITY = 1024
+HLL_PRECISION = 14
+
+
+def hash_values(values):
+    """64-bit hash of each value, stable across processes and runs"""
+    return pd.util.hash_pandas_object(pd.Series(np.asarray(values, dtype=object)), index=False).to_numpy()
+
+
+class HeavyHitters:
+    """Weighted Misra-Gries summary: at most capacity keys with lower-bound totals.
+
+    For every key, estimate <= true total <= estimate + error, where error is
+    the total weight subtracted so far and never exceeds weight / (capacity + 1).
+    Summaries of disjoint row sets merge into a summary with the same guarantee.
+    """
+
+    def __init__(self, capacity=TOP_CAPACITY, counts=None, error=0.0, weight=0.0):
+        self.capacity = capacity
+        self.counts = counts if counts is not None else pd.Series(dtype=np.float64)
+        self.error = error
+        self.weight = weight
+
+    def add(self, keys, weights):
+        weights = pd.Series(np.asarray(weights, dtype=np.float64))
+        batch = weights.groupby(np.asarray(keys, dtype=object)).sum()
+        self._fold(batch[batch > 0], 0.0, float(batch[batch > 0].sum()))
+
+    def merge(self, other):
+        self._fold(other.counts, other.error, other.weight)
+        return self
+
+    def _fold(self, counts, error, weight):
+        combined = self.counts.add(counts, fill_value=0.0) if len(self.counts) else counts.astype(np.float64)
+        self.error += error
+        self.weight += weight
+        if len(combined) > self.capacity:
+            # Subtract the (capacity + 1)-th largest total from every key and drop what falls to zero
+            cut = np.partition(combined.to_numpy(), -(self.capacity + 1))[-(self.capacity + 1)]
+            combined = combined[combined > cut] - cut
+            self.error += cut
+        self.counts = combined
+
+    def top(self, k):
+        """k largest estimates, ties broken by key like nlargest over a sorted index"""
+        return self.counts.sort_index().nlargest(k)
+
+
+class HyperLogLog:
+    """Distinct-count sketch over 64-bit hashes with 2**precision one-byte registers.
+
+    Relative standard error is 1.04 / sqrt(2**precision) (0.8% at precision 14);
+    sketches merge by taking the register-wise maximum.
+    """
+
+    def __init__(self, precision=HLL_PRECISION, registers=None):
+        self.precision = precision
+        self.registers = registers if registers is not None else np.zeros(1 << precision, dtype=np.uint8)
+
+    @property
+    def relative_error(self):
+        return 1.04 / np.sqrt(len(self.registers))
+
+    def add(self, hashes):
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        if not len(hashes):
+            return
+        width = 64 - self.precision
+        index = (hashes >> np.uint64(width)).astype(np.int64)
+        rest = hashes & np.uint64((1 << width) - 1)
+        # Position of the leftmost 1-bit in the remaining bits (width + 1 when they are all zero)
+        bit_length = np.frexp(rest.astype(np.float64))[1]
+        rank = (width + 1 - bit_length).astype(np.uint8)
+        best = pd.Series(rank).groupby(index).max()
+        slots = best.index.to_numpy()
+        self.registers[slots] = np.maximum(self.registers[slots], best.to_numpy())
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self):
+        m = len(self.registers)
+        estimate = 0.7213 / (1 + 1.079 / m) * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * np.log(m / zeros)  # linear counting for small cardinalities
+        return float(estimate)
+
+
+class SketchIndex:
+    """Per region x category cell sketches for the high-cardinality questions.
+
+    Cells are keyed by label (None where the value is missing), so add() can
+    fold in new batches at ingest without rebuilding. A region/category filter
+    selects cells whose sketches are merged; any other filter cannot be served
+    and combine() returns None so the caller answers exactly.
+    """
+
+    def __init__(self, capacity=TOP_CAPACITY, precision=HLL_PRECISION):
+        self.capacity = capacity
+        self.precision = precision
+        self.cells = {}  # (region, category) -> {'rows': int, sketch name: sketch}
+
+    @classmethod
+    def build(cls, frame, chunksize=1_000_000):
+        index = cls()
+        for start in range(0, len(frame), chunksize):
+            index.add(frame.iloc[start:start + chunksize])
+        return index
+
+    def _cell(self, key):
+        cell = self.cells.get(key)
+        if cell is None:
+            cell = self.cells[key] = {'rows': 0}
+            cell.update({name: HeavyHitters(self.capacity) for name in TOP_SKETCHES})
+            cell.update({name: HyperLogLog(self.precision) for name in DISTINCT_SKETCHES})
+        return cell
+
+    def add(self, frame):
+        """Fold a batch of processed rows into the sketches of the cells they fall in"""
+        for key, group in frame.groupby(list(CUBE_AXES), dropna=False, observed=True):
+            cell = self._cell(tuple(None if pd.isna(label) else str(label) for label in key))
+            cell['rows'] += len(group)
+            for name, (column, measure) in TOP_SKETCHES.items():
+                cell[name].add(group[column], group[measure])
+            for name, column in DISTINCT_SKETCHES.items():
+                cell[name].add(hash_values(group[column].dropna()))
+
+    def select(self, filters, **fixed):
+        """Cells matching the filters (and the fixed axis values), or None if a filter is not a cell axis"""
+        if has_range(filters):
+            return None
+        wanted = {}
+        for name, value in (filters or {}).items():
+            if value is None or value == "All":
+                continue
+            if name not in CUBE_AXES and name in FILTER_COLUMNS:
+                return None
+            if name in CUBE_AXES:
+                wanted[name] = str(value)
+        wanted.update(fixed)
+        selected = []
+        for key, cell in self.cells.items():
+            labels = dict(zip(CUBE_AXES, key))
+            if all(labels[name] is not None and (labels[name] == value or labels[name].lower() == value.lower())
+                   for name, value in wanted.items()):
+                selected.append((key, cell))
+        return selected
+
+    def combine(self, filters, name, **fixed):
+        """One sketch merged over the selected cells, or None when the filters are not servable"""
+        cells = self.select(filters, **fixed)
+        if cells is None:
+            return None
+        merged = HeavyHitters(self.capacity) if name in TOP_SKETCHES else HyperLogLog(self.precision)
+        for _, cell in cells:
+            merged.merge(cell[name])
+        return merged
+
+    def labels(self, axis, filters):
+        """Distinct non-missing labels of one axis among the cells the filters select"""
+        cells = self.select(filters)
+        position = CUBE_AXES.index(axis)
+        return sorted({key[position] for key, _ in cells or [] if key[position] is not None})
+
+    def rows(self, filters, **fixed):
+        return sum(cell['rows'] for _, cell in self.select(filters, **fixed) or [])
+
+    # -------------------- ON-DISK FORMAT --------------------
+    def save(self, directory):
+        """Store the sketches next to a saved ColumnarStore, as .npy arrays plus a manifest"""
+        directory = os.path.join(directory, 'sketches')
+        os.makedirs(directory, exist_ok=True)
+        keys = list(self.cells)
+        cells = [self.cells[key] for key in keys]
+        manifest = {'capacity': self.capacity, 'precision': self.precision,
+                    'cells': [{'key': list(key), 'rows': cell['rows']} for key, cell in zip(keys, cells)]}
+        for name in DISTINCT_SKETCHES:
+            registers = [cell[name].registers for cell in cells] or [np.zeros(1 << self.precision, np.uint8)]
+            save_array(os.path.join(directory, f'{name}.registers.npy'), np.stack(registers))
+        for name in TOP_SKETCHES:
+            summaries = [cell[name] for cell in cells]
+            save_array(os.path.join(directory, f'{name}.keys.npy'),
+                       np.concatenate([np.asarray(s.counts.index, dtype=object) for s in summaries] + [np.empty(0, object)]))
+            save_array(os.path.join(directory, f'{name}.counts.npy'),
+                       np.concatenate([s.counts.to_numpy(dtype=np.float64) for s in summaries] + [np.empty(0)]))
+            save_array(os.path.join(directory, f'{name}.offsets.npy'),
+                       np.cumsum([0] + [len(s.counts) for s in summaries]))
+            save_array(os.path.join(directory, f'{name}.error.npy'), np.array([s.error for s in summaries]))
+            save_array(os.path.join(directory, f'{name}.weight.npy'), np.array([s.weight for s in summaries]))
+        with open(os.path.join(directory, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f, indent=1)
+
+    @classmethod
+    def open(cls, directory):
+        """Load saved sketches, or None when the dataset was saved without them"""
+        directory = os.path.join(directory, 'sketches')
+        if not os.path.exists(os.path.join(directory, 'manifest.json')):
+            return None
+        with open(os.path.join(directory, 'manifest.json')) as f:
+            manifest = json.load(f)
+
+        def load(filename):
+            return np.load(os.path.join(directory, filename))
+
+        index = cls(manifest['capacity'], manifest['precision'])
+        registers = {name: load(f'{name}.registers.npy') for name in DISTINCT_SKETCHES}
+        top = {name: {part: load(f'{name}.{part}.npy') for part in ('keys', 'counts', 'offsets', 'error', 'weight')}
+               for name in TOP_SKETCHES}
+        for position, spec in enumerate(manifest['cells']):
+            cell = index.cells[tuple(spec['key'])] = {'rows': spec['rows']}
+            for name in DISTINCT_SKETCHES:
+                cell[name] = HyperLogLog(index.precision, registers[name][position].copy())
+            for name, parts in top.items():
+                start, stop = parts['offsets'][position], parts['offsets'][position + 1]
+                counts = pd.Series(parts['counts'][start:stop], index=pd.Index(parts['keys'][start:stop], dtype=object))
+                cell[name] = HeavyHitters(index.capacity, counts, float(parts['error'][position]),
+                                          float(parts['weight'][position]))
+        return index
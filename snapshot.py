@@ -0,0 +1,221 @@
+# snapshot.py
+import itertools
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from cube import CUBE_AXES
+
+# Rows hashed at a time when digesting a store
+DIGEST_CHUNK_ROWS = 1_000_000
+
+_MIX = np.uint64(0x100000001B3)  # FNV-1a 64-bit prime, to combine per-column hashes into a row hash
+_MISSING = np.uint64(0x9E3779B97F4A7C15)  # hash of a missing categorical value
+_versions = itertools.count(1)
+
+
+class CellDigests:
+    """Content digest of the rows in every region x category cell.
+
+    A cell's digest is the wrapping sum of its rows' hashes, so it does not depend
+    on row order or on the dictionary codes a particular build assigned, only on
+    the rows' values. Floats are hashed at single precision: recomputing derived
+    features over reordered rows sums in a different order, and last-bit noise
+    is not a change. Comparing the digests of two builds of the dataset tells
+    which cells changed; every insight answered for a region/category filter
+    reads only the rows of the cells the filter covers, so only cached answers
+    covering a changed cell are stale after a reload.
+    """
+
+    def __init__(self, digests, axes=CUBE_AXES):
+        self.digests = digests  # (region label, category label) -> digest; None for a missing label
+        self.axes = tuple(axes)
+
+    @classmethod
+    def build(cls, store, axes=CUBE_AXES):
+        axes = tuple(name for name in axes if name in store.index)
+        labels = [store.index.labels[name] for name in axes]
+        sizes = [len(values) + 1 for values in labels]  # slot 0: missing value
+        cell = np.zeros(store.n_rows, dtype=np.int64)
+        for name, size in zip(axes, sizes):
+            cell = cell * size + (store.index.keys[name].astype(np.int64) + 1)
+        label_hashes = {name: np.append(pd.util.hash_array(np.asarray(labels, dtype=object)), _MISSING)
+                        for name, labels in store.dictionaries.items()}
+        totals = np.zeros(int(np.prod(sizes)), dtype=np.uint64)
+        for start in range(0, store.n_rows, DIGEST_CHUNK_ROWS):
+            stop = min(start + DIGEST_CHUNK_ROWS, store.n_rows)
+            rows = np.zeros(stop - start, dtype=np.uint64)
+            for name in sorted(store.names):
+                values = np.asarray(store.values(name, slice(start, stop)))
+                if name in label_hashes:
+                    hashes = label_hashes[name][values]
+                else:
+                    hashes = pd.util.hash_array(values.astype(np.float32) if values.dtype.kind == 'f' else values)
+                rows = rows * _MIX ^ hashes
+            np.add.at(totals, cell[start:stop], pd.util.hash_array(rows))
+        digests = {}
+        for flat in np.flatnonzero(totals):
+            key = np.unravel_index(flat, sizes)
+            digests[tuple(None if slot == 0 else str(values[slot - 1])
+                          for values, slot in zip(labels, key))] = int(totals[flat])
+        return cls(digests, axes)
+
+    def save(self, directory):
+        with open(os.path.join(directory, 'digests.json'), 'w') as f:
+            json.dump({'axes': list(self.axes),
+                       'cells': [[list(key), f'{digest:016x}'] for key, digest in self.digests.items()]}, f)
+
+    @classmethod
+    def open(cls, directory):
+        """Load saved digests, or None when the dataset was saved without them"""
+        path = os.path.join(directory, 'digests.json')
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            saved = json.load(f)
+        return cls({tuple(key): int(digest, 16) for key, digest in saved['cells']}, saved['axes'])
+
+    def changed(self, other):
+        """Cells whose rows differ between the two builds (present in only one of them included)"""
+        if self.axes != other.axes:
+            return None
+        return {key for key in self.digests.keys() | other.digests.keys()
+                if self.digests.get(key) != other.digests.get(key)}
+
+    def touches(self, cells, filters):
+        """Whether an answer for filters (a normalized cache-key filter tuple) reads any of cells"""
+        filters = dict(filters)
+        wanted = [filters.get(name) for name in self.axes]
+        return any(all(value is None or value == label for value, label in zip(wanted, cell)) for cell in cells)
+
+
+class Snapshot:
+    """One loaded dataset and everything derived from it: store, indexes, cube, sketches,
+    statistics and timeline (all held by the analyzer), the shard pool and the filter choices.
+
+    Requests take the current snapshot once and use it to the end, so replacing the
+    module's snapshot reference is an atomic swap: requests already running finish
+    against the data they started with. A retired snapshot closes its shard pool
+    once the last request using it has released it.
+    """
+
+    def __init__(self, analyzer, store=None, shard_pool=None, path=None, mode=None, digests=None):
+        self.analyzer = analyzer
+        self.store = store
+        self.shard_pool = shard_pool
+        self.path = path
+        self.mode = mode
+        self.version = next(_versions)
+        self.loaded_at = time.time()
+        self.filter_choices = None
+        self._digests = digests
+        self._users = 0
+        self._retired = False
+        self._closed = False
+        self._lock = threading.Lock()
+
+    @property
+    def digests(self):
+        """Per-cell digests, computed on first use when the dataset was saved without them"""
+        if self._digests is None and self.store is not None:
+            self._digests = CellDigests.build(self.store)
+        return self._digests
+
+    def acquire(self):
+        """Register a user; False once the snapshot has been closed"""
+        with self._lock:
+            if self._closed:
+                return False
+            self._users += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self._users -= 1
+            close = self._retired and self._users == 0 and not self._closed
+            self._closed = self._closed or close
+        if close:
+            self._close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+        return False
+
+    def retire(self):
+        """Close the snapshot now if nothing uses it, otherwise when its last user releases it"""
+        with self._lock:
+            self._retired = True
+            close = self._users == 0 and not self._closed
+            self._closed = self._closed or close
+        if close:
+            self._close()
+
+    def _close(self):
+        if self.shard_pool is not None:
+            self.shard_pool.close()
+
+    def changed_cells(self, previous):
+        """Cells whose data differs from previous's, or None when that cannot be told (everything changed)"""
+        if previous is None or self.digests is None or previous.digests is None:
+            return None
+        return self.digests.changed(previous.digests)
+
+    def describe(self):
+        return {
+            "version": self.version,
+            "path": self.path,
+            "mode": self.mode,
+            "rows": self.store.n_rows if self.store is not None else None,
+            "loaded_at": _timestamp(self.loaded_at),
+        }
+
+
+class Reloader:
+    """Runs dataset reloads one at a time on a background thread and reports their progress"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self._status = {"state": "idle"}
+
+    def start(self, job, *args):
+        """Run job(*args) in the background; False when a reload is already running"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return False
+            self._status = {"state": "running", "started": _timestamp(time.time())}
+            self._thread = threading.Thread(target=self._execute, args=(job, args), name='dataset-reload',
+                                            daemon=True)
+            self._thread.start()
+            return True
+
+    def wait(self, timeout=None):
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def status(self):
+        with self._lock:
+            return dict(self._status)
+
+    def _execute(self, job, args):
+        started = time.perf_counter()
+        try:
+            result = job(*args)
+        except Exception as e:
+            status = {"state": "failed", "error": f"{type(e).__name__}: {e}"}
+        else:
+            status = dict(result or {}, state="done")
+        with self._lock:
+            self._status = dict(self._status, seconds=round(time.perf_counter() - started, 3), **status)
+
+
+def _timestamp(seconds):
+    return time.strftime('%Y-%m-%dT%H:%M:%S%z', time.localtime(seconds))
@@ -0,0 +1,210 @@
+# stats.py
+import json
+import os
+
+import numpy as np
+
+from columnar import _row_id_dtype, has_range, save_array
+
+# Column pairs whose Pearson correlation is served from per-slice moments
+CORRELATIONS = [('review_rating', 'purchase_frequency'), ('discount_effectiveness', 'review_rating')]
+
+# Columns kept sorted within each slice for quantiles and "above the quantile" row selections
+QUANTILE_COLUMNS = ['popularity_score', 'price']
+
+MOMENTS = ('n', 'mean_x', 'mean_y', 'm2_x', 'm2_y', 'c_xy')
+
+
+class StatsIndex:
+    """Per-slice sufficient statistics, so correlations and quantiles never scan the rows.
+
+    A slice is one observed combination of the filter columns' keys, so any
+    set of equality filters selects a whole number of slices. For each
+    correlated pair a slice keeps its count, means and centred second moments
+    (merged across slices exactly, as streaming.Comoments does); for each
+    quantile column its non-missing rows are stored sorted by (slice, value),
+    so the k-th smallest value of any filtered subset is a binary search over
+    the distinct values, and the rows above it are contiguous runs.
+    """
+
+    def __init__(self, store, slice_keys, moments, sorted_columns):
+        self.store = store
+        self.slice_keys = slice_keys          # slice -> key of each filter column (-1 where missing)
+        self.moments = moments                # (x, y) -> {moment name: per-slice array}
+        self.sorted_columns = sorted_columns  # column -> {'rows', 'keys', 'values', 'bounds'}
+
+    @classmethod
+    def build(cls, store, correlations=CORRELATIONS, quantile_columns=QUANTILE_COLUMNS):
+        names = list(store.index.keys)
+        slice_of = np.zeros(store.n_rows, dtype=np.int64)
+        for name in names:
+            slice_of = slice_of * (len(store.index.labels[name]) + 1) + (store.index.keys[name].astype(np.int64) + 1)
+        combos, slice_of = np.unique(slice_of, return_inverse=True)
+        slice_keys = np.empty((len(combos), len(names)), dtype=np.int64)
+        for position in range(len(names) - 1, -1, -1):
+            size = len(store.index.labels[names[position]]) + 1
+            slice_keys[:, position] = combos % size - 1
+            combos = combos // size
+        n_slices = len(slice_keys)
+        moments = {(x, y): cls._build_moments(store, slice_of, n_slices, x, y)
+                   for x, y in correlations if cls._numeric(store, x) and cls._numeric(store, y)}
+        sorted_columns = {name: cls._build_sorted(store, slice_of, n_slices, name)
+                          for name in quantile_columns if cls._numeric(store, name)}
+        return cls(store, slice_keys, moments, sorted_columns)
+
+    @staticmethod
+    def _numeric(store, name):
+        return name in store and not store.is_categorical(name)
+
+    @staticmethod
+    def _build_moments(store, slice_of, n_slices, x, y):
+        xs = np.asarray(store.values(x)).astype(np.float64)
+        ys = np.asarray(store.values(y)).astype(np.float64)
+        present = ~(np.isnan(xs) | np.isnan(ys))  # pairwise-complete rows, as DataFrame.corr() uses
+        xs, ys, slices = xs[present], ys[present], slice_of[present]
+        n = np.bincount(slices, minlength=n_slices).astype(np.float64)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean_x = np.nan_to_num(np.bincount(slices, weights=xs, minlength=n_slices) / n)
+            mean_y = np.nan_to_num(np.bincount(slices, weights=ys, minlength=n_slices) / n)
+        dx, dy = xs - mean_x[slices], ys - mean_y[slices]
+        return {
+            'n': n, 'mean_x': mean_x, 'mean_y': mean_y,
+            'm2_x': np.bincount(slices, weights=dx * dx, minlength=n_slices),
+            'm2_y': np.bincount(slices, weights=dy * dy, minlength=n_slices),
+            'c_xy': np.bincount(slices, weights=dx * dy, minlength=n_slices),
+        }
+
+    @staticmethod
+    def _build_sorted(store, slice_of, n_slices, name):
+        values = np.asarray(store.values(name)).astype(np.float64)
+        rows = np.flatnonzero(~np.isnan(values))
+        distinct, ranks = np.unique(values[rows], return_inverse=True)
+        # One sort key per row: its slice, then its value's rank among the distinct values
+        keys = slice_of[rows] * len(distinct) + ranks
+        order = np.argsort(keys, kind='stable')
+        return {
+            'rows': rows[order].astype(_row_id_dtype(store.n_rows)),
+            'keys': keys[order],
+            'values': distinct,
+            'bounds': np.searchsorted(keys[order], np.arange(n_slices + 1) * len(distinct)),
+        }
+
+    # -------------------- ON-DISK FORMAT --------------------
+    def save(self, directory):
+        """Store the statistics next to a saved ColumnarStore so they are not rebuilt at startup"""
+        directory = os.path.join(directory, 'stats')
+        os.makedirs(directory, exist_ok=True)
+        save_array(os.path.join(directory, 'slice_keys.npy'), self.slice_keys)
+        for (x, y), moments in self.moments.items():
+            for moment in MOMENTS:
+                save_array(os.path.join(directory, f'{x}.{y}.{moment}.npy'), moments[moment])
+        for name, parts in self.sorted_columns.items():
+            for part, values in parts.items():
+                save_array(os.path.join(directory, f'{name}.{part}.npy'), values)
+        manifest = {'correlations': [list(pair) for pair in self.moments], 'quantile_columns': list(self.sorted_columns)}
+        with open(os.path.join(directory, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f, indent=1)
+
+    @classmethod
+    def open(cls, directory, store):
+        """Memory-map saved statistics, or build them when the dataset was saved without them"""
+        directory = os.path.join(directory, 'stats')
+        if not os.path.exists(os.path.join(directory, 'manifest.json')):
+            return cls.build(store)
+        with open(os.path.join(directory, 'manifest.json')) as f:
+            manifest = json.load(f)
+
+        def load(filename):
+            return np.asarray(np.load(os.path.join(directory, filename), mmap_mode='r'))
+
+        moments = {(x, y): {moment: load(f'{x}.{y}.{moment}.npy') for moment in MOMENTS}
+                   for x, y in manifest['correlations']}
+        sorted_columns = {name: {part: load(f'{name}.{part}.npy') for part in ('rows', 'keys', 'values', 'bounds')}
+                          for name in manifest['quantile_columns']}
+        return cls(store, load('slice_keys.npy'), moments, sorted_columns)
+
+    # -------------------- QUERIES --------------------
+    def slices(self, filters):
+        """Slices making up the rows the equality filters select, with ColumnarStore.select's rules,
+        or None under a date range, which cuts across slices"""
+        if has_range(filters):
+            return None
+        mask = np.ones(len(self.slice_keys), dtype=bool)
+        for position, name in enumerate(self.store.index.keys):
+            value = (filters or {}).get(name)
+            if value is None or value == "All":
+                continue
+            key = self.store.index.key_of(name, value)
+            if key < 0:
+                # -1 is also the slice key of rows missing the value; an unknown value selects nothing
+                return np.empty(0, dtype=np.int64)
+            mask &= self.slice_keys[:, position] == key
+        return np.flatnonzero(mask)
+
+    def correlation(self, filters, x, y):
+        """Pearson correlation of x and y over the filtered rows, or None for an unknown pair"""
+        moments = self.moments.get((x, y))
+        if moments is None:
+            return None
+        slices = self.slices(filters)
+        if slices is None:
+            return None
+        part = {moment: values[slices] for moment, values in moments.items()}
+        n = part['n'].sum()
+        if n < 2:
+            return np.nan
+        mean_x = (part['n'] * part['mean_x']).sum() / n
+        mean_y = (part['n'] * part['mean_y']).sum() / n
+        dx, dy = part['mean_x'] - mean_x, part['mean_y'] - mean_y
+        m2_x = (part['m2_x'] + part['n'] * dx * dx).sum()
+        m2_y = (part['m2_y'] + part['n'] * dy * dy).sum()
+        c_xy = (part['c_xy'] + part['n'] * dx * dy).sum()
+        denominator = np.sqrt(m2_x * m2_y)
+        if not denominator:
+            return np.nan
+        return float(np.clip(c_xy / denominator, -1.0, 1.0))
+
+    def _smallest(self, parts, slices, k):
+        # Value of rank k (0-based) among the selected slices: the least distinct value
+        # with more than k rows at or below it
+        starts = parts['bounds'][slices]
+        base = slices.astype(np.int64) * len(parts['values'])
+        low, high = 0, len(parts['values']) - 1
+        while low < high:
+            middle = (low + high) // 2
+            if (np.searchsorted(parts['keys'], base + middle, side='right') - starts).sum() > k:
+                high = middle
+            else:
+                low = middle + 1
+        return parts['values'][low]
+
+    def quantile(self, filters, column, q):
+        """Series.quantile(q) of a column over the filtered rows, or None for an unindexed column"""
+        parts = self.sorted_columns.get(column)
+        if parts is None:
+            return None
+        slices = self.slices(filters)
+        if slices is None:
+            return None
+        n = int((parts['bounds'][slices + 1] - parts['bounds'][slices]).sum())
+        if not n:
+            return np.nan
+        position = (n - 1) * q
+        below = self._smallest(parts, slices, int(np.floor(position)))
+        above = self._smallest(parts, slices, int(np.ceil(position)))
+        return np.quantile([below, above], position - np.floor(position))
+
+    def rows_above(self, filters, column, threshold):
+        """Sorted row ids of the filtered rows whose value exceeds threshold, or None for an unindexed column"""
+        parts = self.sorted_columns.get(column)
+        if parts is None:
+            return None
+        slices = self.slices(filters)
+        if slices is None:
+            return None
+        if np.isnan(threshold) or not len(slices):
+            return np.empty(0, dtype=np.int64)
+        rank = np.searchsorted(parts['values'], threshold, side='right')
+        starts = np.searchsorted(parts['keys'], slices.astype(np.int64) * len(parts['values']) + rank)
+        stops = parts['bounds'][slices + 1]
+        return np.sort(np.concatenate([parts['rows'][start:stop] for start, stop in zip(starts, stops)]))
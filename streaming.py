@@ -0,0 +1,317 @@
+# streaming.py
+import json
+import operator
+import os
+
+import numpy as np
+import pandas as pd
+
+from columnar import DATE_COLUMN, FILTER_COLUMNS, ColumnarStore, date_span, has_dates, parse_days, value_bounds
+from metrics import phase, scanned
+from pipeline import weighted_quantile
+
+DEFAULT_CHUNKSIZE = 1_000_000
+
+# Partial states are compacted once this many per-chunk results are pending
+COMPACT_EVERY = 16
+
+# Comparisons allowed in a partial's where conditions; conditions stay plain data so partials pickle
+OPERATORS = {'==': operator.eq, '!=': operator.ne, '<': operator.lt, '<=': operator.le, '>': operator.gt,
+             '>=': operator.ge}
+
+
+class ChunkSource:
+    """The processed dataset read as fixed-size row chunks, only the requested columns at a time.
+
+    Works on the CSV (parsed chunk by chunk) and on a directory written by
+    ColumnarStore.save() (memory-mapped and sliced), so no more than one chunk
+    of the requested columns is ever materialized.
+    """
+
+    def __init__(self, path, chunksize=DEFAULT_CHUNKSIZE):
+        self.path = path
+        self.chunksize = chunksize
+        if os.path.isdir(path):
+            with open(os.path.join(path, 'manifest.json')) as f:
+                manifest = json.load(f)
+            self.names = [column['name'] for column in manifest['columns']] + manifest.get('derived', [])
+        else:
+            self.names = list(pd.read_csv(path, nrows=0).columns)
+        self._store = None
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def chunks(self, columns):
+        columns = list(dict.fromkeys(columns))
+        missing = [name for name in columns if name not in self]
+        if missing:
+            raise KeyError(', '.join(missing))
+        if not os.path.isdir(self.path):
+            yield from pd.read_csv(self.path, usecols=columns, chunksize=self.chunksize)
+            return
+        if self._store is None:
+            self._store = ColumnarStore.open(self.path)
+        for start in range(0, self._store.n_rows, self.chunksize):
+            chunk = self._store.frame(columns, slice(start, start + self.chunksize))
+            chunk.index = pd.RangeIndex(start, start + len(chunk))  # row ids, as read_csv chunks number them
+            yield chunk
+
+
+def filter_mask(chunk, filters):
+    """Rows of a chunk matching the equality filters, date range and numeric ranges, with the same rules
+    as ColumnarStore.select"""
+    mask = np.ones(len(chunk), dtype=bool)
+    span = date_span(filters)
+    if span is not None and DATE_COLUMN in chunk:
+        days = parse_days(chunk[DATE_COLUMN])
+        mask &= (days >= span[0]) & (days <= span[1])
+    for name, (low, high) in value_bounds(filters).items():
+        if name in chunk:
+            values = chunk[name].to_numpy(dtype=np.float64, na_value=np.nan)
+            mask &= (values >= low) & (values <= high)
+    for name, value in (filters or {}).items():
+        if name not in FILTER_COLUMNS or value is None or value == "All":
+            continue
+        column = chunk[name]
+        text = column.astype(str)
+        matches = text == str(value)
+        if pd.api.types.is_bool_dtype(column):
+            # Request args arrive as text; "true"/"True" both reach boolean columns
+            matches |= text.str.lower() == str(value).lower()
+        mask &= matches.to_numpy()
+    return mask
+
+
+def where_mask(chunk, conditions):
+    """Rows satisfying every (column, operator, value) condition"""
+    mask = np.ones(len(chunk), dtype=bool)
+    for column, op, value in conditions:
+        mask &= OPERATORS[op](chunk[column], value).to_numpy()
+    return mask
+
+
+class GroupedAggregate:
+    """groupby(by)[measure].<how>() as a mergeable partial: per-key sum, non-null count, min and max.
+
+    State is one row per distinct key, so memory is bounded by the number of
+    groups rather than the number of rows. where optionally narrows the rows
+    further with (column, operator, value) conditions, e.g. an age threshold.
+    """
+
+    def __init__(self, by, measure=None, how='sum', where=()):
+        self.by = by
+        self.measure = measure
+        self.how = how
+        self.where = list(where)
+        self.columns = (([by] if isinstance(by, str) else list(by)) + ([measure] if measure else [])
+                        + [column for column, _, _ in self.where])
+        self._parts = []
+
+    def update(self, chunk):
+        if self.where:
+            chunk = chunk[where_mask(chunk, self.where)]
+        grouped = chunk.groupby(self.by, observed=True)
+        if self.how == 'size':
+            part = grouped.size().to_frame('size')
+        else:
+            values = grouped[self.measure]
+            part = pd.DataFrame({'sum': values.sum(), 'count': values.count(), 'min': values.min(), 'max': values.max()})
+        self._parts.append(part)
+        if len(self._parts) >= COMPACT_EVERY:
+            self._compact()
+
+    def merge(self, other, disjoint=False):
+        """Fold in another partial; disjoint (no key in both, e.g. shards by the leading key) skips regrouping"""
+        if disjoint:
+            self._compact()
+            other._compact()
+            self._parts = [pd.concat(self._parts + other._parts).sort_index()] if other._parts else self._parts
+            return self
+        self._parts.extend(other._parts)
+        self._compact()
+        return self
+
+    def _compact(self):
+        if len(self._parts) > 1:
+            combined = pd.concat(self._parts)
+            levels = list(range(combined.index.nlevels))
+            grouped = combined.groupby(level=levels, observed=True)
+            how = {'size': 'sum', 'sum': 'sum', 'count': 'sum', 'min': 'min', 'max': 'max'}
+            self._parts = [grouped.agg({name: how[name] for name in combined.columns})]
+
+    def result(self):
+        self._compact()
+        if not self._parts:
+            # No shard saw a matching row: still indexed by the group keys, as an empty groupby is
+            names = [self.by] if isinstance(self.by, str) else list(self.by)
+            index = (pd.Index([], name=names[0]) if len(names) == 1
+                     else pd.MultiIndex.from_arrays([[]] * len(names), names=names))
+            return pd.Series(index=index, dtype=np.int64 if self.how == 'size' else np.float64, name=self.measure)
+        state = self._parts[0]
+        if self.how == 'size':
+            return state['size']
+        if self.how == 'mean':
+            with np.errstate(invalid='ignore', divide='ignore'):
+                result = state['sum'] / state['count']
+        else:
+            result = state[self.how]
+        return result.rename(self.measure)
+
+
+class ColumnMean:
+    """Series.mean() of one column as a mergeable (sum, count) pair"""
+
+    def __init__(self, column):
+        self.column = column
+        self.columns = [column]
+        self.total = 0.0
+        self.count = 0
+
+    def update(self, chunk):
+        values = chunk[self.column]
+        self.total += values.sum()
+        self.count += int(values.count())
+
+    def merge(self, other):
+        self.total += other.total
+        self.count += other.count
+        return self
+
+    def result(self):
+        return self.total / self.count if self.count else np.nan
+
+
+class Comoments:
+    """Pearson correlation of two columns from mergeable co-moments.
+
+    Each chunk contributes its count, means and centred second moments; chunks
+    are combined with the pairwise update of Chan et al., which stays accurate
+    where raw sums of squares would cancel.
+    """
+
+    def __init__(self, x, y):
+        self.columns = [x, y]
+        self.n = 0
+        self.mean_x = self.mean_y = 0.0
+        self.m2_x = self.m2_y = self.c_xy = 0.0
+
+    def update(self, chunk):
+        pair = chunk[self.columns].dropna()
+        if not len(pair):
+            return
+        x = pair.iloc[:, 0].to_numpy(dtype=np.float64)
+        y = pair.iloc[:, 1].to_numpy(dtype=np.float64)
+        part = Comoments(*self.columns)
+        part.n, part.mean_x, part.mean_y = len(x), x.mean(), y.mean()
+        dx, dy = x - part.mean_x, y - part.mean_y
+        part.m2_x, part.m2_y, part.c_xy = dx @ dx, dy @ dy, dx @ dy
+        self.merge(part)
+
+    def merge(self, other):
+        if not other.n:
+            return self
+        n = self.n + other.n
+        delta_x, delta_y = other.mean_x - self.mean_x, other.mean_y - self.mean_y
+        weight = self.n * other.n / n
+        self.m2_x += other.m2_x + delta_x * delta_x * weight
+        self.m2_y += other.m2_y + delta_y * delta_y * weight
+        self.c_xy += other.c_xy + delta_x * delta_y * weight
+        self.mean_x += delta_x * other.n / n
+        self.mean_y += delta_y * other.n / n
+        self.n = n
+        return self
+
+    def result(self):
+        denominator = np.sqrt(self.m2_x * self.m2_y)
+        if self.n < 2 or not denominator:
+            return np.nan
+        return float(np.clip(self.c_xy / denominator, -1.0, 1.0))
+
+
+class ValueCounts:
+    """Row count per distinct value of a column; gives Series.quantile() exactly.
+
+    Memory is bounded by the number of distinct values (prices, per-item scores),
+    not by the number of rows.
+    """
+
+    def __init__(self, column):
+        self.column = column
+        self.columns = [column]
+        self._parts = []
+
+    def update(self, chunk):
+        self._parts.append(chunk[self.column].value_counts())
+        if len(self._parts) >= COMPACT_EVERY:
+            self._compact()
+
+    def merge(self, other):
+        self._parts.extend(other._parts)
+        self._compact()
+        return self
+
+    def _compact(self):
+        if len(self._parts) > 1:
+            self._parts = [pd.concat(self._parts).groupby(level=0).sum()]
+
+    def quantile(self, q):
+        self._compact()
+        if not self._parts:
+            return np.nan
+        counts = self._parts[0]
+        return weighted_quantile(counts.index.to_numpy(dtype=np.float64), counts.to_numpy(), q)
+
+
+class FirstSeen:
+    """Distinct values of a column in order of first appearance (Series.unique()), from row ids"""
+
+    def __init__(self, column, where=()):
+        self.column = column
+        self.where = list(where)
+        self.columns = [column] + [name for name, _, _ in self.where]
+        self._parts = []
+
+    def update(self, chunk):
+        if self.where:
+            chunk = chunk[where_mask(chunk, self.where)]
+        rows = pd.Series(chunk.index, index=chunk.index)
+        self._parts.append(rows.groupby(chunk[self.column].to_numpy()).min())
+        if len(self._parts) >= COMPACT_EVERY:
+            self._compact()
+
+    def merge(self, other):
+        self._parts.extend(other._parts)
+        self._compact()
+        return self
+
+    def _compact(self):
+        if len(self._parts) > 1:
+            self._parts = [pd.concat(self._parts).groupby(level=0).min()]
+
+    def result(self):
+        self._compact()
+        return self._parts[0].sort_values(kind='stable').index.tolist() if self._parts else []
+
+
+def chunks(source, filters, columns):
+    """The source's chunks restricted to the rows matching the filters"""
+    columns = list(columns) + [name for name, value in (filters or {}).items()
+                               if name in FILTER_COLUMNS and value is not None and value != "All"]
+    if has_dates(filters) and DATE_COLUMN in source:
+        columns.append(DATE_COLUMN)
+    columns += [name for name in value_bounds(filters) if name in source]
+    for chunk in source.chunks(columns):
+        with phase('filter'):
+            mask = filter_mask(chunk, filters)
+            chunk = chunk if mask.all() else chunk[mask]
+        scanned(len(chunk))
+        yield chunk
+
+
+def run(source, filters, partials):
+    """One pass over the source feeding every filtered chunk to each partial aggregate"""
+    for chunk in chunks(source, filters, [name for partial in partials for name in partial.columns]):
+        for partial in partials:
+            partial.update(chunk)
+    return partials
@@ -0,0 +1,39 @@
+# tests/conftest.py
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The modules live flat at the repository root
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(scope='session')
+def processed():
+    """A slice of the processed dataset with some rows missing their region or category.
+    Customers are folded onto 150 ids, so per-customer groups span several rows."""
+    df = pd.read_csv(os.path.join(ROOT, 'processed_dataset.csv'), nrows=600)
+    df['customer_id'] = df['customer_id'].to_numpy()[df.index.to_numpy() * 7 % 150]
+    df.loc[df.index % 11 == 0, 'region'] = np.nan
+    df.loc[df.index % 13 == 0, 'category'] = np.nan
+    return df
+
+
+# Equality filters the dashboard can send, including ones that select no rows
+FILTERS = [None, {}, {'region': 'All', 'category': 'All'}, {'region': 'East'}, {'category': 'Toys'},
+           {'region': 'West', 'category': 'Books'}, {'region': 'Nowhere'},
+           {'region': 'Nowhere', 'category': 'All'}, {'category': 'Nothing', 'region': 'East'},
+           {'gender': 'Female', 'season': '4'}, {'is_subscribed': 'true', 'region': 'North'},
+           {'shipping_type': 'Expedited', 'category': 'Toys', 'gender': 'Male'}, {'season': '9'}]
+
+
+def baseline_filter(df, filters):
+    """Row selection of the original pandas _apply_filters, extended to every filter column.
+    Request values arrive as text, so they are compared case-insensitively."""
+    for name, value in (filters or {}).items():
+        if value != "All":
+            df = df[df[name].astype(str).str.lower() == str(value).lower()]
+    return df
@@ -0,0 +1,43 @@
+# tests/test_charts.py
+import json
+import os
+
+import pandas as pd
+import pytest
+
+pytest.importorskip('plotly')
+
+import app  # noqa: E402
+from charts import VALUE_TYPES, figures  # noqa: E402
+from pipeline import build_features  # noqa: E402
+from questions import REGISTRY  # noqa: E402
+
+RAW_DATASET = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src', 'backend',
+                           'new_raw_dataset.csv')
+
+
+@pytest.fixture(scope='module')
+def analyzer():
+    analyzer = app.BusinessInsightsAnalyzer(build_features(pd.read_csv(RAW_DATASET)))
+    REGISTRY.validate(analyzer)
+    return analyzer
+
+
+def test_every_visualization_type_renders(analyzer):
+    rendered = set()
+    for question in REGISTRY:
+        if not question.available:
+            continue
+        response = json.loads(app.render_question(analyzer, question, {}))
+        data, viz_type = response['data'], response['visualization']
+        charts = figures(data, viz_type)
+        assert viz_type in VALUE_TYPES or charts, f"{question.category}/{question.id}: no chart for {viz_type}"
+        for chart in charts or []:
+            chart.to_dict()
+        rendered.add(viz_type)
+    assert rendered == {question.viz for question in REGISTRY}
+
+
+def test_heatmap_of_flat_data_is_a_bar_chart():
+    (chart,) = figures({'East': 0.4, 'West': 0.3}, 'heatmap')
+    assert chart.data[0].type == 'bar'
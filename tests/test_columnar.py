@@ -0,0 +1,60 @@
+# tests/test_columnar.py
+import numpy as np
+import pandas as pd
+import pytest
+
+from columnar import FILTER_COLUMNS, ColumnarStore
+from conftest import FILTERS, baseline_filter
+
+
+@pytest.fixture(scope='module')
+def store(processed):
+    return ColumnarStore.from_frame(processed)
+
+
+@pytest.mark.parametrize('filters', FILTERS)
+def test_select_matches_pandas_filters(store, processed, filters):
+    rows = store.select(filters)
+    expected = baseline_filter(processed, filters).index.to_numpy()
+    if rows is None:
+        assert len(expected) == len(processed)
+    else:
+        np.testing.assert_array_equal(rows, expected)
+
+
+def test_unknown_value_does_not_match_missing_rows(store, processed):
+    assert processed['region'].isna().any()
+    assert len(store.select({'region': 'Nowhere'})) == 0
+    assert len(store.select({'category': 'Nothing'})) == 0
+
+
+def test_postings_partition_present_rows(store, processed):
+    index = store.index
+    for name in FILTER_COLUMNS:
+        postings = index.postings[name]
+        assert all(np.all(np.diff(rows) > 0) for rows in postings)
+        rows = np.sort(np.concatenate(postings))
+        np.testing.assert_array_equal(rows, np.flatnonzero(processed[name].notna().to_numpy()))
+
+
+@pytest.mark.parametrize('filters', FILTERS)
+def test_frame_groupby_matches_pandas(store, processed, filters):
+    expected = baseline_filter(processed, filters)
+    frame = store.frame(['region', 'item_purchased', 'total_revenue', 'quantity'], store.select(filters))
+    assert (frame.groupby('item_purchased', observed=True)['total_revenue'].sum().to_dict()
+            == expected.groupby('item_purchased')['total_revenue'].sum().to_dict())
+    assert (frame.groupby('region', observed=True)['quantity'].sum().to_dict()
+            == expected.groupby('region')['quantity'].sum().to_dict())
+
+
+def test_opened_store_matches_the_frame(tmp_path, store, processed):
+    directory = str(tmp_path / 'dataset')
+    store.save(directory)
+    opened = ColumnarStore.open(directory)
+    for filters in FILTERS:
+        rows = opened.select(filters)
+        expected = baseline_filter(processed, filters)
+        assert len(expected) == (len(processed) if rows is None else len(rows))
+        frame = opened.frame(list(processed.columns), rows)
+        # Categorical columns come back as labels; compare everything as text
+        pd.testing.assert_frame_equal(frame.astype(str), expected.reset_index(drop=True).astype(str))
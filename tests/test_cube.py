@@ -0,0 +1,56 @@
+# tests/test_cube.py
+import numpy as np
+import pytest
+
+from columnar import ColumnarStore
+from conftest import FILTERS, baseline_filter
+from cube import CUBE_AXES, AggregateCube
+
+
+@pytest.fixture(scope='module')
+def store(processed):
+    return ColumnarStore.from_frame(processed)
+
+
+@pytest.fixture(scope='module')
+def cube(store):
+    return AggregateCube.build(store)
+
+
+def cube_filters(filters):
+    return not any(name not in CUBE_AXES and value != "All" for name, value in (filters or {}).items())
+
+
+@pytest.mark.parametrize('filters', FILTERS)
+def test_rollup_matches_pandas_groupby(cube, processed, filters):
+    if not cube_filters(filters):
+        assert cube.rollup(filters, 'gender', 'quantity') is None
+        return
+    expected = baseline_filter(processed, filters)
+    for by in cube.dimensions:
+        grouped = expected.groupby(by)
+        actual = cube.rollup(filters, by, how='size')
+        assert actual.to_dict() == grouped.size().to_dict()
+        for measure in cube.measures:
+            for how in ('sum', 'mean'):
+                actual = cube.rollup(filters, by, measure, how)
+                wanted = getattr(grouped[measure], how)()
+                assert list(actual.index) == list(wanted.index), (by, measure, how)
+                np.testing.assert_allclose(actual.to_numpy(dtype=float), wanted.to_numpy(dtype=float),
+                                           rtol=1e-9, equal_nan=True, err_msg=f'{by} {measure} {how}')
+
+
+def test_rollup_declines_what_it_cannot_answer(cube):
+    assert cube.rollup({}, 'customer_id', 'total_revenue') is None
+    assert cube.rollup({}, 'gender', 'price') is None
+    assert cube.rollup({}, 'gender', 'quantity', how='median') is None
+
+
+def test_saved_cube_answers_the_same(tmp_path, store, cube):
+    directory = str(tmp_path / 'dataset')
+    store.save(directory)
+    cube.save(directory)
+    opened = AggregateCube.open(directory, ColumnarStore.open(directory))
+    for filters in ({}, {'region': 'East'}, {'region': 'Nowhere'}):
+        for by in ('gender', 'item_purchased'):
+            assert opened.rollup(filters, by, 'total_revenue', 'mean').equals(cube.rollup(filters, by, 'total_revenue', 'mean'))
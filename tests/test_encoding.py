@@ -0,0 +1,25 @@
+# tests/test_encoding.py
+import json
+
+import numpy as np
+import pandas as pd
+
+import encoding
+from charts import matrix_frame
+from encoding import dumps, is_matrix, matrix
+
+
+def test_matrix_round_trips_through_json():
+    frame = pd.DataFrame({'Books': [1.5, np.nan], 'Toys': [2.0, 3.25]}, index=pd.Index([18, 19], name='age'))
+    frame.columns.name = 'category'
+    wire = json.loads(dumps({'data': matrix(frame)}))['data']
+    assert is_matrix(wire) and wire['values'] == [1.5, 2.0, None, 3.25]
+    pd.testing.assert_frame_equal(matrix_frame(wire), frame)
+    assert not is_matrix({'East': 0.4})
+
+
+def test_standard_library_fallback_encodes_the_same(monkeypatch):
+    payload = {'data': {3: np.float64('nan'), 'x': [np.int32(1), float('inf')]}, 'm': np.arange(3)}
+    expected = json.loads(dumps(payload))
+    monkeypatch.setattr(encoding, 'orjson', None)
+    assert json.loads(dumps(payload)) == expected == {'data': {'3': None, 'x': [1, None]}, 'm': [0, 1, 2]}
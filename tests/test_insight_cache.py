@@ -0,0 +1,63 @@
+# tests/test_insight_cache.py
+from insight_cache import MISSING, InsightCache
+
+
+def test_equivalent_filters_share_a_key():
+    key = InsightCache.key('sales_trends', 1, {'region': 'East', 'category': 'Toys'})
+    assert InsightCache.key('sales_trends', '1', {'category': ' Toys ', 'region': 'East'}) == key
+    assert InsightCache.key('sales_trends', 1, {'region': 'East', 'category': 'Toys', 'gender': 'All'}) == key
+    assert InsightCache.key('sales_trends', 1, {'region': 'East', 'category': 'Toys', 'season': None}) == key
+    assert InsightCache.key('sales_trends', 1, None) == InsightCache.key('sales_trends', 1, {'region': 'All', 'category': ''})
+
+
+def test_different_filters_or_questions_do_not_share_a_key():
+    key = InsightCache.key('sales_trends', 1, {'region': 'East'})
+    assert InsightCache.key('sales_trends', 1, {'region': 'West'}) != key
+    assert InsightCache.key('sales_trends', 1, {'category': 'East'}) != key
+    assert InsightCache.key('sales_trends', 2, {'region': 'East'}) != key
+    assert InsightCache.key('customer_demographics', 1, {'region': 'East'}) != key
+
+
+def test_lru_eviction_and_stats():
+    cache = InsightCache(maxsize=2)
+    a, b, c = (InsightCache.key('sales_trends', n) for n in (1, 2, 3))
+    cache.set(a, 'a')
+    cache.set(b, 'b')
+    assert cache.get(a) == 'a'  # a is now the most recently used
+    cache.set(c, 'c')
+    assert cache.get(b) is MISSING
+    assert cache.get(a) == 'a' and cache.get(c) == 'c'
+    assert cache.stats() == {"size": 2, "maxsize": 2, "hits": 3, "misses": 1, "evictions": 1, "hit_rate": 0.75}
+
+
+def test_invalidate_by_predicate():
+    cache = InsightCache()
+    east = InsightCache.key('sales_trends', 1, {'region': 'East'})
+    west = InsightCache.key('sales_trends', 1, {'region': 'West'})
+    cache.set(east, 1)
+    cache.set(west, 2)
+    assert cache.invalidate(lambda key: ('region', 'East') in key[2]) == 1
+    assert cache.get(east) is MISSING and cache.get(west) == 2
+    assert cache.invalidate() == 1 and len(cache) == 0
+
+
+def test_replace_drops_stale_entries_and_adds_fresh_ones():
+    cache = InsightCache()
+    east = InsightCache.key('sales_trends', 1, {'region': 'East'})
+    west = InsightCache.key('sales_trends', 1, {'region': 'West'})
+    cache.set(east, 'old east')
+    cache.set(west, 'old west')
+    assert cache.replace(lambda key: ('region', 'East') in key[2], [(east, 'new east')]) == 1
+    assert cache.get(east) == 'new east' and cache.get(west) == 'old west'
+    assert cache.replace(None, []) == 2 and len(cache) == 0
+
+
+def test_results_from_a_previous_generation_are_discarded():
+    cache = InsightCache()
+    key = InsightCache.key('sales_trends', 1)
+    generation = cache.generation
+    cache.replace()
+    cache.set(key, 'computed before the swap', generation)
+    assert cache.get(key) is MISSING
+    cache.set(key, 'computed after the swap', cache.generation)
+    assert cache.get(key) == 'computed after the swap'
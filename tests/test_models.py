@@ -0,0 +1,83 @@
+# tests/test_models.py
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import LinearRegression
+from sklearn.preprocessing import LabelEncoder, StandardScaler
+
+import app
+from columnar import ColumnarStore
+from models import ENCODED_COLUMNS, MODEL_FILENAME, MODEL_TASKS, LabelEncodings, TaskModel
+
+FEATURES = ['month', 'season', 'gender', 'price', 'quantity']
+
+
+def preprocess(df):
+    """Encode and fill the features as preprocess_data did before training"""
+    df = df.copy()
+    for name in ENCODED_COLUMNS:
+        if name in df:
+            df[name] = LabelEncoder().fit_transform(df[name].astype(str))
+    return df.fillna(0)
+
+
+@pytest.fixture(scope='module')
+def trained(processed):
+    encoded = preprocess(processed)
+    scaler = StandardScaler().fit(encoded[FEATURES])
+    model = LinearRegression().fit(scaler.transform(encoded[FEATURES]), encoded['total_revenue'])
+    return model, scaler, encoded
+
+
+def test_encodings_match_label_encoder(processed):
+    encodings = LabelEncodings.build(ColumnarStore.from_frame(processed))
+    for name in ENCODED_COLUMNS:
+        if name in processed:
+            expected = LabelEncoder().fit_transform(processed[name].astype(str))
+            np.testing.assert_array_equal(encodings.encode(name, processed[name].tolist()), expected)
+    with pytest.raises(ValueError, match='Unknown gender'):
+        encodings.encode('gender', ['Robot'])
+
+
+def test_batched_cached_predictions_match_the_model(processed, trained):
+    model, scaler, encoded = trained
+    task = TaskModel('revenue', model, scaler, FEATURES, LabelEncodings.build(ColumnarStore.from_frame(processed)))
+    rows = processed[FEATURES].head(50).to_dict('records')
+    rows = rows + rows[:10]  # repeated rows are predicted once and then served from the cache
+    expected = model.predict(scaler.transform(pd.concat([encoded[FEATURES].head(50), encoded[FEATURES].head(10)])))
+    predictions, cached = task.predict_vectors(task.vectors(rows))
+    np.testing.assert_allclose(predictions, expected)
+    assert cached == 0 and len(task.cache) == 50
+    predictions, cached = task.predict_vectors(task.vectors(rows[:5]))
+    np.testing.assert_allclose(predictions, expected[:5])
+    assert cached == 5
+    with pytest.raises(ValueError, match='Missing feature'):
+        task.vectors([{'month': 'March'}])
+
+
+def test_predict_endpoint(processed, tmp_path):
+    features = MODEL_TASKS['discount_effectiveness']
+    encoded = preprocess(processed)
+    scaler = StandardScaler().fit(encoded[features])
+    model = LinearRegression().fit(scaler.transform(encoded[features]), encoded['total_revenue'])
+    joblib.dump((model, scaler), tmp_path / MODEL_FILENAME.format(task='discount_effectiveness'))
+    processed.to_csv(tmp_path / 'processed_dataset.csv', index=False)
+    app.load_dataset(str(tmp_path / 'processed_dataset.csv'), warm=False)
+    saved = app.models, app.model_problems, app.model_batchers
+    app.models, app.model_problems, app.model_batchers = app.load_prediction_models(str(tmp_path))
+    try:
+        assert list(app.models) == ['discount_effectiveness']
+        client = app.app.test_client()
+        rows = processed[features].head(20).to_dict('records')
+        expected = model.predict(scaler.transform(encoded[features].head(20)))
+        batch = client.post('/api/predict/discount_effectiveness', json={'rows': rows}).get_json()
+        np.testing.assert_allclose(batch['predictions'], expected)
+        single = client.post('/api/predict/discount_effectiveness', json={'row': rows[3]}).get_json()
+        assert single['cached'] == 1 and single['predictions'] == pytest.approx([expected[3]])
+        assert client.post('/api/predict/discount_effectiveness', json={'rows': []}).status_code == 400
+        assert client.post('/api/predict/discount_effectiveness', json={'row': {'price': 3}}).status_code == 400
+        assert client.post('/api/predict/revenue_prediction', json={'rows': rows}).status_code == 503
+        assert client.post('/api/predict/no_such_task', json={'rows': rows}).status_code == 404
+    finally:
+        app.models, app.model_problems, app.model_batchers = saved
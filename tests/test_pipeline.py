@@ -0,0 +1,59 @@
+# tests/test_pipeline.py
+import os
+import pickle
+import sys
+
+import pandas as pd
+import pytest
+
+import pipeline
+from columnar import ColumnarStore
+from conftest import ROOT
+from pipeline import FeaturePipeline
+
+
+@pytest.fixture(scope='module')
+def raw():
+    return pd.read_csv(os.path.join(ROOT, 'src', 'backend', 'new_raw_dataset.csv'))
+
+
+def reload(pipeline):
+    return pickle.loads(pickle.dumps(pipeline))
+
+
+def test_incremental_runs_match_a_full_build(raw):
+    expected = FeaturePipeline.from_raw(raw).frame()
+
+    pipeline = FeaturePipeline.from_raw(raw.iloc[:2500])
+    data = pipeline.frame()
+    for start, stop in ((2500, 3500), (3500, len(raw))):
+        pipeline = reload(pipeline)
+        assert pipeline.batches == [] and pipeline.history == len(data)
+        pipeline.append(raw.iloc[start:stop].reset_index(drop=True))
+        data = pipeline.frame(data)
+    pd.testing.assert_frame_equal(data, expected, check_dtype=False)
+
+
+def test_saved_state_leaves_out_the_rows(raw):
+    pipeline = FeaturePipeline.from_raw(raw)
+    state = pickle.dumps(pipeline)
+    assert not any(purchase.encode() in state for purchase in raw['purchase_id'].iloc[:50])
+    with pytest.raises(ValueError):
+        reload(pipeline).frame()
+    with pytest.raises(ValueError):
+        reload(pipeline).frame(pipeline.frame().iloc[:10])
+
+
+def test_command_line_appends_to_the_saved_dataset(raw, tmp_path, monkeypatch):
+    parts = [tmp_path / 'first.csv', tmp_path / 'second.csv']
+    raw.iloc[:3000].to_csv(parts[0], index=False)
+    raw.iloc[3000:].to_csv(parts[1], index=False)
+    output, state, export = tmp_path / 'dataset', tmp_path / 'state.pkl', tmp_path / 'processed.csv'
+    for part in parts:
+        monkeypatch.setattr(sys, 'argv', ['pipeline.py', str(part), '--state', str(state), '--output', str(output),
+                                          '--csv', str(export)])
+        pipeline.main()
+    expected = FeaturePipeline.from_raw(raw).frame()
+    pd.testing.assert_frame_equal(pd.read_csv(export), expected, check_dtype=False)
+    store = ColumnarStore.open(str(output))
+    assert sorted(store.names) == sorted(expected.columns)
@@ -0,0 +1,76 @@
+# tests/test_profiles.py
+import numpy as np
+import pandas as pd
+import pytest
+
+from app import BusinessInsightsAnalyzer
+from conftest import FILTERS, baseline_filter
+from profiles import PROFILE_COLUMNS, profiled_store
+
+# Customer attributes are constant per customer in the real data; season and shipping vary per purchase
+ATTRIBUTES = ['region', 'gender', 'is_subscribed']
+
+
+@pytest.fixture(scope='module')
+def customers(processed):
+    """The fixture with each customer's attributes taken from their first transaction, and the
+    per-customer columns broadcast as the feature pipeline does"""
+    df = processed.copy()
+    for name in ATTRIBUTES:
+        df[name] = df.groupby('customer_id')[name].transform('first')
+    revenue = df.groupby('customer_id')['total_revenue']
+    df['customer_lifetime_value'] = revenue.transform('sum')
+    df['average_spending'] = revenue.transform('mean')
+    df['purchase_frequency'] = df.groupby('customer_id')['purchase_id'].transform('count')
+    return df
+
+
+@pytest.fixture(scope='module')
+def store(customers):
+    return profiled_store(customers)
+
+
+def test_derived_columns_match_the_pipeline(customers, store):
+    assert store.profiles is not None
+    for name in PROFILE_COLUMNS:
+        assert name not in store.columns
+        np.testing.assert_allclose(np.asarray(store.values(name), dtype=float), customers[name].to_numpy(dtype=float))
+        rows = np.arange(0, len(customers), 7)
+        np.testing.assert_allclose(np.asarray(store.values(name, rows), dtype=float),
+                                   customers[name].to_numpy(dtype=float)[rows])
+
+
+def test_customer_attributes_are_detected(store):
+    assert set(ATTRIBUTES) <= set(store.profiles.attributes)
+    assert 'season' not in store.profiles.attributes
+
+
+@pytest.mark.parametrize('filters', FILTERS)
+def test_profile_answers_match_pandas(customers, store, filters):
+    profiles = store.profiles
+    df = baseline_filter(customers, filters)
+    covered = profiles.covers(filters)
+    assert covered == all(name in ATTRIBUTES + ['category'] or value == 'All' for name, value in (filters or {}).items())
+    if not covered:
+        assert profiles.multi_category(filters) is None
+        return
+    assert profiles.multi_category(filters) == int(df.groupby('customer_id')['category'].nunique().gt(1).sum())
+    expected = df.groupby(['customer_id', 'category']).size().groupby('category').mean()
+    pd.testing.assert_series_equal(profiles.repurchase_rate(filters), expected, check_names=False, check_index_type=False)
+    lifetime = profiles.lifetime_value(filters)
+    if lifetime is not None:
+        expected = df.groupby('customer_id')['total_revenue'].sum().nlargest(10)
+        assert lifetime.to_dict() == pytest.approx(expected.to_dict())
+    spending = profiles.rollup(filters, 'is_subscribed', 'average_spending', 'mean')
+    expected = df.groupby('is_subscribed')['average_spending'].mean()
+    assert {str(k): v for k, v in spending.items()} == pytest.approx({str(k): v for k, v in expected.items()})
+
+
+@pytest.mark.parametrize('filters', FILTERS)
+def test_analyzer_answers_match_the_row_path(customers, store, filters):
+    fast, rows = BusinessInsightsAnalyzer(store), BusinessInsightsAnalyzer(customers)
+    for method in ('get_multi_category_customers', 'get_category_repurchase_rate', 'get_customer_lifetime_value',
+                   'get_avg_spending_subscribed_vs_non'):
+        expected = getattr(rows, method)(filters=filters)
+        actual = getattr(fast, method)(filters=filters)
+        assert actual == pytest.approx(expected), method
@@ -0,0 +1,82 @@
+# tests/test_ranges.py
+import numpy as np
+import pytest
+
+from app import BusinessInsightsAnalyzer
+from columnar import BOUND_FILTERS, VALUE_RANGES, ColumnarStore, FilterError, ValueIndex, value_bounds
+from conftest import FILTERS, baseline_filter
+from cube import AggregateCube
+from stats import StatsIndex
+
+# Inclusive numeric bounds; the last three select no rows
+BOUNDS = [{'age_min': '30', 'age_max': '45'}, {'price_max': '50.5'}, {'rating_min': '4'},
+          {'age_max': '40', 'price_min': '20', 'rating_max': '3.5'}, {'age_min': '29.5', 'age_max': '30.5'},
+          {'age_min': '200'}, {'price_min': '80', 'price_max': '20'}, {'rating_max': '-1'}]
+
+
+@pytest.fixture(scope='module')
+def store(processed):
+    return ColumnarStore.from_frame(processed)
+
+
+def baseline_bounds(df, filters):
+    for prefix, column in VALUE_RANGES.items():
+        low, high = filters.get(f'{prefix}_min'), filters.get(f'{prefix}_max')
+        if low is not None:
+            df = df[df[column] >= float(low)]
+        if high is not None:
+            df = df[df[column] <= float(high)]
+    return df
+
+
+def baseline(df, filters):
+    equality = {name: value for name, value in filters.items() if name not in BOUND_FILTERS}
+    return baseline_bounds(baseline_filter(df, equality), filters)
+
+
+@pytest.mark.parametrize('column', list(VALUE_RANGES.values()))
+def test_value_index_matches_pandas(processed, column):
+    index = ValueIndex.build(processed[column].to_numpy())
+    for low, high in [(-np.inf, np.inf), (20, 40), (3.5, 3.5), (40, 20), (1000, np.inf)]:
+        expected = processed.index[(processed[column] >= low) & (processed[column] <= high)]
+        assert list(index.rows((low, high))) == list(expected)
+        assert index.count((low, high)) == len(expected)
+
+
+@pytest.mark.parametrize('bounds', BOUNDS)
+@pytest.mark.parametrize('filters', FILTERS)
+def test_select_with_value_ranges_matches_pandas(processed, store, filters, bounds):
+    filters = dict(filters or {}, **bounds)
+    assert list(store.select(filters)) == list(baseline(processed, filters).index)
+
+
+def test_ranges_combine_with_dates(processed, store):
+    filters = {'region': 'East', 'price_min': '30', 'start': '2024-06-01', 'end': '2024-09-30'}
+    dates = processed['purchase_date'].str[6:] + processed['purchase_date'].str[3:5] + processed['purchase_date'].str[:2]
+    expected = baseline(processed, {k: v for k, v in filters.items() if k not in ('start', 'end')})
+    expected = expected[(dates[expected.index] >= '20240601') & (dates[expected.index] <= '20240930')]
+    assert list(store.select(filters)) == list(expected.index)
+
+
+@pytest.mark.parametrize('bounds', BOUNDS)
+@pytest.mark.parametrize('filters', [{}, {'region': 'East'}, {'gender': 'Female', 'season': '4'}])
+def test_answers_under_ranges_match_pandas(processed, store, filters, bounds):
+    filters = dict(filters, **bounds)
+    df = baseline(processed, filters)
+    analyzer = BusinessInsightsAnalyzer(store, AggregateCube.build(store), stats=StatsIndex.build(store))
+    for target in (analyzer, analyzer.scoped(filters)):
+        assert target.get_top_products_by_revenue(filters=filters) == pytest.approx(
+            df.groupby('item_purchased')['total_revenue'].sum().nlargest(10).to_dict())
+        assert target.get_avg_spending_subscribed_vs_non(filters=filters) == pytest.approx(
+            df.groupby('is_subscribed')['average_spending'].mean().to_dict())
+        young = df[df['age'] <= 25].groupby('item_purchased')['popularity_score'].mean().nlargest(5)
+        assert target.get_young_customer_trends(filters=filters) == pytest.approx(young.to_dict())
+
+
+@pytest.mark.parametrize('value', ['abc', 'nan', '', None])
+def test_malformed_bounds_are_filter_errors(value):
+    if value in ('', None):
+        assert value_bounds({'price_max': value}) == {}
+        return
+    with pytest.raises(FilterError, match='price_max'):
+        value_bounds({'price_max': value})
@@ -0,0 +1,46 @@
+# tests/test_serving.py
+import threading
+
+import pytest
+
+from serving import InsightPool, Overloaded
+
+
+def test_identical_calls_in_flight_share_one_computation():
+    pool = InsightPool(workers=2)
+    release, calls = threading.Event(), []
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return 'answer'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(pool.call('key', compute))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    while pool.stats()['executed'] + pool.stats()['coalesced'] < 4:
+        threading.Event().wait(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert results == ['answer'] * 4 and len(calls) == 1
+    assert pool.stats()['pending'] == 0
+    pool.close()
+
+
+def test_full_queue_is_rejected_and_errors_propagate():
+    pool = InsightPool(workers=1, max_pending=1)
+    release = threading.Event()
+    blocked = threading.Thread(target=pool.call, args=('slow', release.wait, 5))
+    blocked.start()
+    while not pool.stats()['pending']:
+        threading.Event().wait(0.01)
+    with pytest.raises(Overloaded):
+        pool.call('other', len, 'x')
+    release.set()
+    blocked.join(5)
+    with pytest.raises(ZeroDivisionError):
+        pool.call('broken', lambda: 1 / 0)
+    assert pool.stats()['rejected'] == 1
+    pool.close()
@@ -0,0 +1,61 @@
+# tests/test_snapshot.py
+import pytest
+
+from columnar import ColumnarStore
+from conftest import FILTERS, baseline_filter
+from insight_cache import InsightCache
+from snapshot import CellDigests
+
+
+def edited(df):
+    """The frame with the price of a few East/Toys and West rows changed"""
+    df = df.copy()
+    rows = df.index[(df['region'] == 'East') & (df['category'] == 'Toys')][:2].union(
+        df.index[df['region'] == 'West'][:1])
+    assert len(rows) == 3
+    df.loc[rows, 'price'] += 1.0
+    return df, rows
+
+
+def cell_of(df, rows):
+    return {tuple(None if value != value else str(value) for value in pair)
+            for pair in df.loc[rows, ['region', 'category']].itertuples(index=False)}
+
+
+def test_digests_ignore_row_order(processed):
+    digests = CellDigests.build(ColumnarStore.from_frame(processed))
+    shuffled = CellDigests.build(ColumnarStore.from_frame(processed.sample(frac=1, random_state=0)))
+    assert digests.changed(shuffled) == set()
+
+
+def test_changed_cells_are_the_cells_of_the_changed_rows(processed):
+    df, rows = edited(processed)
+    changed = CellDigests.build(ColumnarStore.from_frame(processed)).changed(
+        CellDigests.build(ColumnarStore.from_frame(df)))
+    assert changed == cell_of(df, rows)
+
+
+def test_a_removed_cell_is_changed(processed):
+    kept = processed[~((processed['region'] == 'North') & (processed['category'] == 'Books'))]
+    changed = CellDigests.build(ColumnarStore.from_frame(processed)).changed(
+        CellDigests.build(ColumnarStore.from_frame(kept)))
+    assert changed == {('North', 'Books')}
+
+
+@pytest.mark.parametrize('filters', FILTERS)
+def test_touches_matches_the_rows_a_filter_selects(processed, filters):
+    df, rows = edited(processed)
+    digests = CellDigests.build(ColumnarStore.from_frame(df))
+    changed = digests.changed(CellDigests.build(ColumnarStore.from_frame(processed)))
+    cube_filters = {name: value for name, value in (filters or {}).items() if name in digests.axes}
+    selected = baseline_filter(df, cube_filters).index
+    expected = len(selected.intersection(rows)) > 0
+    assert digests.touches(changed, InsightCache.normalize_filters(cube_filters)) == expected
+
+
+def test_saved_digests_round_trip(processed, tmp_path):
+    digests = CellDigests.build(ColumnarStore.from_frame(processed))
+    digests.save(str(tmp_path))
+    opened = CellDigests.open(str(tmp_path))
+    assert opened.axes == digests.axes and opened.digests == digests.digests
+    assert CellDigests.open(str(tmp_path / 'missing')) is None
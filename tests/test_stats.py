@@ -0,0 +1,50 @@
+# tests/test_stats.py
+import numpy as np
+import pandas as pd
+import pytest
+
+from columnar import ColumnarStore
+from stats import StatsIndex
+
+
+@pytest.fixture(scope='module')
+def store():
+    rng = np.random.default_rng(7)
+    n = 400
+    region = rng.choice(['East', 'North', 'West'], n).astype(object)
+    region[rng.random(n) < 0.1] = None  # rows with no region share slice key -1
+    frame = pd.DataFrame({
+        'region': region,
+        'category': rng.choice(['Books', 'Toys'], n),
+        'gender': rng.choice(['Female', 'Male'], n),
+        'review_rating': rng.integers(1, 6, n).astype(float),
+        'purchase_frequency': rng.integers(1, 20, n),
+        'discount_effectiveness': rng.normal(0, 100, n),
+        'popularity_score': rng.gamma(2.0, 50.0, n),
+        'price': rng.uniform(10, 500, n).round(2),
+    })
+    return ColumnarStore.from_frame(frame)
+
+
+FILTERS = [{}, {'region': 'East'}, {'region': 'Nowhere'}, {'region': 'Nowhere', 'category': 'Books'},
+           {'category': 'Toys', 'gender': 'Male'}, {'gender': 'Unknown'}]
+
+
+def test_unknown_value_selects_no_slices(store):
+    stats = StatsIndex.build(store)
+    assert (store.series('region').isna()).any()
+    assert len(stats.slices({'region': 'Nowhere'})) == 0
+    assert len(store.select({'region': 'Nowhere'})) == 0
+
+
+@pytest.mark.parametrize('filters', FILTERS)
+def test_answers_match_selected_rows(store, filters):
+    stats = StatsIndex.build(store)
+    frame = store.frame(list(store.columns), store.select(filters))
+    for x, y in stats.moments:
+        expected = frame[x].corr(frame[y]) if len(frame) > 1 else np.nan
+        np.testing.assert_allclose(stats.correlation(filters, x, y), expected, rtol=1e-9, equal_nan=True)
+    for column in stats.sorted_columns:
+        for q in (0.2, 0.5, 0.9):
+            np.testing.assert_allclose(stats.quantile(filters, column, q), frame[column].quantile(q),
+                                       rtol=1e-12, equal_nan=True)
@@ -0,0 +1,37 @@
+# tests/test_streaming.py
+import numpy as np
+import pytest
+
+import streaming
+from conftest import FILTERS, baseline_filter
+from streaming import ChunkSource, ColumnMean, Comoments, GroupedAggregate, ValueCounts
+
+
+@pytest.fixture(scope='module')
+def source(processed, tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('data') / 'processed_dataset.csv')
+    processed.to_csv(path, index=False)
+    return ChunkSource(path, chunksize=97)  # several chunks, and compaction on the way
+
+
+@pytest.mark.parametrize('filters', FILTERS)
+def test_one_pass_matches_pandas(source, processed, filters):
+    expected = baseline_filter(processed, filters)
+    by_item, by_pair, size, mean, moments, counts = streaming.run(source, filters, [
+        GroupedAggregate('item_purchased', 'total_revenue'),
+        GroupedAggregate(['customer_id', 'category'], how='size'),
+        GroupedAggregate('gender', how='size'),
+        ColumnMean('purchase_frequency'),
+        Comoments('review_rating', 'price'),
+        ValueCounts('price'),
+    ])
+    assert by_item.result().round(6).to_dict() == expected.groupby('item_purchased')['total_revenue'].sum().round(6).to_dict()
+    assert size.result().to_dict() == expected.groupby('gender').size().to_dict()
+    pairs = by_pair.result()
+    assert pairs.index.names == ['customer_id', 'category']
+    assert pairs.groupby(level='category').mean().to_dict() == \
+        expected.groupby(['customer_id', 'category']).size().groupby('category').mean().to_dict()
+    np.testing.assert_allclose(mean.result(), expected['purchase_frequency'].mean(), equal_nan=True)
+    np.testing.assert_allclose(moments.result(), expected['review_rating'].corr(expected['price']),
+                               equal_nan=True)
+    np.testing.assert_allclose(counts.quantile(0.5), expected['price'].quantile(0.5), equal_nan=True)
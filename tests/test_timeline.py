@@ -0,0 +1,107 @@
+# tests/test_timeline.py
+import numpy as np
+import pandas as pd
+import pytest
+
+from app import BusinessInsightsAnalyzer
+from columnar import ColumnarStore, FilterError, parse_day
+from conftest import FILTERS, baseline_filter
+from timeline import PERIODS, Timeline
+
+# Date ranges, inclusive, in both accepted formats; the last two select no rows
+RANGES = [{}, {'start': '2024-03-01', 'end': '31-05-2024'}, {'start': '15-11-2024'}, {'end': '2024-02-10'},
+          {'start': '2030-01-01'}, {'start': '2024-06-01', 'end': '2024-05-01'}]
+
+
+@pytest.fixture(scope='module')
+def store(processed):
+    return ColumnarStore.from_frame(processed)
+
+
+def baseline_range(df, span):
+    dates = pd.to_datetime(df['purchase_date'], format='%d-%m-%Y')
+    keep = pd.Series(True, index=df.index)
+    if span.get('start'):
+        keep &= dates >= pd.Timestamp('1970-01-01') + pd.Timedelta(days=parse_day(span['start']))
+    if span.get('end'):
+        keep &= dates <= pd.Timestamp('1970-01-01') + pd.Timedelta(days=parse_day(span['end']))
+    return df[keep], dates[keep]
+
+
+def bucket(dates, period):
+    if period == 'day':
+        return dates.dt.strftime('%Y-%m-%d')
+    if period == 'week':
+        iso = dates.dt.isocalendar()
+        return iso['year'].astype(str) + '-W' + iso['week'].map('{:02d}'.format)
+    if period == 'month':
+        return dates.dt.strftime('%Y-%m')
+    return dates.dt.year.astype(str) + '-Q' + dates.dt.quarter.astype(str)
+
+
+def baseline_trend(df, filters, period, measure, how):
+    df, dates = baseline_range(baseline_filter(df, {k: v for k, v in (filters or {}).items()
+                                                    if k not in ('start', 'end')}), filters or {})
+    order = np.argsort(dates.to_numpy(), kind='stable')
+    labels = bucket(dates, period).iloc[order]
+    grouped = df.iloc[order].groupby(labels.to_numpy(), sort=False)
+    return grouped.size() if how == 'size' else getattr(grouped[measure], how)()
+
+
+def assert_same_trend(actual, expected):
+    assert list(actual.index) == list(expected.index)
+    np.testing.assert_allclose(actual.to_numpy(dtype=float), expected.to_numpy(dtype=float))
+
+
+@pytest.mark.parametrize('period', PERIODS)
+@pytest.mark.parametrize('span', RANGES)
+@pytest.mark.parametrize('filters', [{}, {'region': 'East'}, {'region': 'West', 'category': 'Books'}, {'region': 'Nowhere'}])
+def test_timeline_rollup_matches_pandas(processed, store, period, span, filters):
+    timeline = Timeline.build(store)
+    filters = dict(filters, **span)
+    for measure, how in (('total_revenue', 'sum'), ('promo_code_used', 'mean'), (None, 'size')):
+        assert_same_trend(timeline.rollup(filters, period, measure, how),
+                          baseline_trend(processed, filters, period, measure, how))
+
+
+def test_timeline_declines_filters_outside_the_cube(store):
+    assert Timeline.build(store).rollup({'gender': 'Female'}, 'month', 'total_revenue') is None
+    assert Timeline.build(store).rollup({}, 'season', 'total_revenue') is None
+
+
+@pytest.mark.parametrize('span', RANGES)
+@pytest.mark.parametrize('filters', FILTERS)
+def test_sales_trend_matches_pandas_with_or_without_timeline(processed, store, filters, span):
+    filters = dict(filters or {}, **span)
+    expected = baseline_trend(processed, filters, 'week', 'total_revenue', 'sum')
+    for timeline in (None, Timeline.build(store)):
+        analyzer = BusinessInsightsAnalyzer(store, timeline=timeline)
+        assert_same_trend(pd.Series(analyzer.get_sales_by_time_period('week', filters)), expected)
+        assert_same_trend(pd.Series(analyzer.scoped(filters).get_sales_by_time_period('week')), expected)
+
+
+@pytest.mark.parametrize('span', RANGES)
+@pytest.mark.parametrize('filters', FILTERS)
+def test_select_with_a_date_range_matches_pandas(processed, store, filters, span):
+    filters = dict(filters or {}, **span)
+    expected, _ = baseline_range(baseline_filter(processed, {k: v for k, v in filters.items()
+                                                              if k not in ('start', 'end')}), filters)
+    rows = store.select(filters)
+    rows = np.arange(store.n_rows) if rows is None else rows
+    assert list(rows) == list(expected.index)
+
+
+def test_non_calendar_period_groups_on_the_column(processed, store):
+    analyzer = BusinessInsightsAnalyzer(store, timeline=Timeline.build(store))
+    expected = processed.groupby('season')['total_revenue'].sum().to_dict()
+    assert analyzer.get_sales_by_time_period('season') == pytest.approx(expected)
+
+
+@pytest.mark.parametrize('value', ['garbage', '2024-13-01', '31/01/2024', ''])
+def test_malformed_dates_and_periods_are_filter_errors(store, value):
+    analyzer = BusinessInsightsAnalyzer(store)
+    if value:
+        with pytest.raises(FilterError, match='yyyy-mm-dd or dd-mm-yyyy'):
+            analyzer.get_sales_by_time_period('month', {'start': value})
+    with pytest.raises(FilterError, match='period'):
+        analyzer.get_sales_by_time_period(value or 'bogus')
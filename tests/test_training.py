@@ -0,0 +1,68 @@
+# tests/test_training.py
+import json
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import LabelEncoder, StandardScaler
+
+from columnar import ColumnarStore
+from models import ENCODED_COLUMNS, MODEL_FILENAME
+from training import RANDOM_STATE, TEST_SIZE, FeatureMatrix, train, training_tasks
+
+
+@pytest.fixture(scope='module')
+def dataset(processed):
+    # The pipeline writes one category_sales column where the shipped CSV has the merge's _x/_y pair
+    return processed.rename(columns={'category_sales_x': 'category_sales'}).drop(columns='category_sales_y')
+
+
+def preprocess(df):
+    """preprocess_data: label-encode the text columns as text and fill missing values with 0"""
+    df = df.copy()
+    for name in ENCODED_COLUMNS:
+        if name in df:
+            df[name] = LabelEncoder().fit_transform(df[name].astype(str))
+    return df.fillna(0)
+
+
+def test_feature_matrix_matches_preprocess_data(dataset):
+    names = list(dict.fromkeys(name for spec in training_tasks().values()
+                               for name in spec['features'] + [spec['target']]))
+    matrix = FeatureMatrix.build(ColumnarStore.from_frame(dataset), names)
+    expected = preprocess(dataset)
+    for name in names:
+        np.testing.assert_array_equal(np.asarray(matrix.columns[name]), expected[name].to_numpy(), err_msg=name)
+
+
+def test_train_matches_the_notebook_and_skips_unchanged_tasks(dataset, tmp_path):
+    path = str(tmp_path / 'processed_dataset.csv')
+    dataset.to_csv(path, index=False)
+    models = str(tmp_path / 'models')
+    first = train(path, models, ['revenue_prediction', 'discount_effectiveness'], workers=2)
+    assert {outcome['status'] for outcome in first['tasks'].values()} == {'trained'}
+
+    spec = training_tasks(['revenue_prediction'])['revenue_prediction']
+    encoded = preprocess(dataset)
+    X_train, X_test, y_train, _ = train_test_split(encoded[spec['features']], encoded[spec['target']],
+                                                   test_size=TEST_SIZE, random_state=RANDOM_STATE)
+    scaler = StandardScaler().fit(X_train)
+    expected = RandomForestRegressor(random_state=RANDOM_STATE).fit(scaler.transform(X_train), y_train)
+    model, saved_scaler = joblib.load(os.path.join(models, MODEL_FILENAME.format(task='revenue_prediction')))
+    np.testing.assert_allclose(model.predict(saved_scaler.transform(X_test)), expected.predict(scaler.transform(X_test)))
+    with open(os.path.join(models, 'encodings.json')) as f:
+        assert json.load(f)['season'] == sorted(dataset['season'].astype(str).unique())
+
+    again = train(path, models, ['revenue_prediction', 'discount_effectiveness'])
+    assert {outcome['status'] for outcome in again['tasks'].values()} == {'unchanged'}
+
+    changed = dataset.copy()
+    changed['total_revenue'] = changed['total_revenue'] * 2  # only revenue_prediction reads it
+    changed.to_csv(path, index=False)
+    third = train(path, models, ['revenue_prediction', 'discount_effectiveness'])
+    assert third['tasks']['revenue_prediction']['status'] == 'trained'
+    assert third['tasks']['discount_effectiveness']['status'] == 'unchanged'
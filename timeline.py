@@ -0,0 +1,191 @@
+# timeline.py
+import json
+import os
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from columnar import NO_DAY, date_span, parse_days, save_array
+from cube import CUBE_AXES, cell_slices
+
+# Calendar buckets a trend can be rolled up into; weeks start on Monday and are labelled by ISO week
+PERIODS = ('day', 'week', 'month', 'quarter')
+
+# Measures kept as prefix sums per region x category cell and day
+TIMELINE_MEASURES = ['total_revenue', 'promo_code_used']
+
+_EPOCH = date(1970, 1, 1)
+
+
+def _months(days):
+    # Months since 1970-01 of day numbers
+    return np.asarray(days, dtype=np.int64).astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+
+
+def _month_start(months):
+    return np.asarray(months, dtype=np.int64).astype('datetime64[M]').astype('datetime64[D]').astype(np.int64)
+
+
+def bucket_starts(days, period):
+    """First day of the calendar bucket containing each day number"""
+    days = np.asarray(days, dtype=np.int64)
+    if period == 'day':
+        return days
+    if period == 'week':
+        return days - (days + 3) % 7  # 1970-01-01 was a Thursday
+    months = _months(days)
+    return _month_start(months if period == 'month' else months - months % 3)
+
+
+def bucket_edges(first, last, period):
+    """Start of every bucket overlapping [first, last] (the first clipped to first), then last + 1"""
+    if period == 'day':
+        starts = np.arange(first, last + 1, dtype=np.int64)
+    elif period == 'week':
+        starts = np.arange(bucket_starts(first, period), last + 1, 7, dtype=np.int64)
+    else:
+        step = 1 if period == 'month' else 3
+        months = _months(bucket_starts(first, period))
+        starts = _month_start(np.arange(months, _months(last) + 1, step))
+    labels = bucket_labels(starts, period)
+    starts[0] = first
+    return np.append(starts, last + 1), labels
+
+
+def bucket_labels(starts, period):
+    """Text label of each bucket from its first day: 2024-03-05, 2024-W10, 2024-03 or 2024-Q1"""
+    days = [_EPOCH + timedelta(days=int(day)) for day in starts]
+    if period == 'day':
+        return [day.isoformat() for day in days]
+    if period == 'week':
+        return ['{}-W{:02d}'.format(*day.isocalendar()[:2]) for day in days]
+    if period == 'month':
+        return [f'{day.year}-{day.month:02d}' for day in days]
+    return [f'{day.year}-Q{(day.month - 1) // 3 + 1}' for day in days]
+
+
+def rebucket(sums, counts, period, how, name=None):
+    """Roll per-date aggregates (Series indexed by date text: the measure's sums and non-null counts,
+    or row counts for size) up into calendar buckets, in date order"""
+    days = parse_days(np.asarray(counts.index, dtype=object))
+    dated = days != NO_DAY
+    starts = bucket_starts(days[dated], period)
+    rows = pd.Series(counts.to_numpy()[dated]).groupby(starts).sum()
+    if how == 'size':
+        values = rows
+    else:
+        totals = pd.Series(sums.reindex(counts.index).to_numpy()[dated]).groupby(starts).sum()
+        values = totals if how == 'sum' else totals / rows.replace(0, np.nan)
+    values = values[rows > 0]
+    return pd.Series(values.to_numpy(), index=bucket_labels(values.index, period), name=name)
+
+
+class Timeline:
+    """Per-day prefix sums of the trend measures for every region x category cell.
+
+    rows[cell][d] (and sums / counts per measure) is the total over all days
+    before the d-th distinct day. A trend over [start, end] in calendar buckets
+    reads those arrays at each bucket boundary (binary searches over the
+    distinct days) and differences them, so it costs O(log n + buckets) per
+    cell whatever the length of history. rollup() returns None for filters
+    other than region/category and the date range; the caller then aggregates
+    the filtered rows instead.
+    """
+
+    def __init__(self, store, days, rows, sums, counts):
+        self.store = store
+        self.days = days      # distinct day numbers, ascending
+        self.rows = rows      # (region slot, category slot, day position + 1) cumulative row counts
+        self.sums = sums      # measure -> cumulative sums, same shape
+        self.counts = counts  # measure -> cumulative non-null counts, same shape
+
+    @classmethod
+    def build(cls, store, measures=TIMELINE_MEASURES):
+        """Prefix sums over the store's rows, or None when it has no date column"""
+        if store.dates is None:
+            return None
+        measures = [name for name in measures if name in store]
+        days = store.dates.days
+        dated = days != NO_DAY
+        distinct, position = np.unique(days[dated], return_inverse=True)
+        # Axis slot 0 holds rows whose region/category is missing, as in the cube
+        axis_size = [len(store.index.postings[name]) + 1 for name in CUBE_AXES]
+        cell = np.zeros(int(dated.sum()), dtype=np.int64)
+        for name, size in zip(CUBE_AXES, axis_size):
+            cell = cell * size + (np.asarray(store.index.keys[name])[dated].astype(np.int64) + 1)
+        flat = cell * len(distinct) + position
+        shape = tuple(axis_size) + (len(distinct),)
+        size = int(np.prod(shape))
+
+        def cumulative(weights=None):
+            totals = np.bincount(flat, weights=weights, minlength=size).reshape(shape)
+            return np.concatenate([np.zeros(shape[:-1] + (1,), dtype=totals.dtype), totals.cumsum(axis=-1)], axis=-1)
+
+        rows, sums, counts = cumulative(), {}, {}
+        for name in measures:
+            values = np.asarray(store.values(name), dtype=np.float64)[dated]
+            present = ~np.isnan(values)
+            sums[name] = cumulative(np.where(present, values, 0.0))
+            counts[name] = cumulative(present.astype(np.float64)).astype(np.int64)
+        return cls(store, distinct.astype(np.int32), rows, sums, counts)
+
+    def save(self, directory):
+        """Store the prefix sums next to a saved ColumnarStore so they are not rebuilt at startup"""
+        directory = os.path.join(directory, 'timeline')
+        os.makedirs(directory, exist_ok=True)
+        save_array(os.path.join(directory, 'days.npy'), self.days)
+        save_array(os.path.join(directory, 'rows.npy'), self.rows)
+        for name in self.sums:
+            save_array(os.path.join(directory, f'{name}.sum.npy'), self.sums[name])
+            save_array(os.path.join(directory, f'{name}.count.npy'), self.counts[name])
+        with open(os.path.join(directory, 'manifest.json'), 'w') as f:
+            json.dump({'measures': list(self.sums)}, f, indent=1)
+
+    @classmethod
+    def open(cls, directory, store):
+        """Memory-map saved prefix sums, or build them when the dataset was saved without them"""
+        directory = os.path.join(directory, 'timeline')
+        if not os.path.exists(os.path.join(directory, 'manifest.json')):
+            return cls.build(store)
+        with open(os.path.join(directory, 'manifest.json')) as f:
+            manifest = json.load(f)
+
+        def load(filename):
+            return np.asarray(np.load(os.path.join(directory, filename), mmap_mode='r'))
+
+        return cls(store, load('days.npy'), load('rows.npy'),
+                   {name: load(f'{name}.sum.npy') for name in manifest['measures']},
+                   {name: load(f'{name}.count.npy') for name in manifest['measures']})
+
+    def rollup(self, filters, period, measure=None, how='sum'):
+        """groupby(calendar bucket)[measure].<how>() over the filtered rows in date order, or None when not servable"""
+        if period not in PERIODS or (how != 'size' and measure not in self.sums) or how not in ('sum', 'mean', 'size'):
+            return None
+        cells = cell_slices(self.store, filters)
+        if cells is None:
+            return None
+        span = date_span(filters) or (NO_DAY + 1, np.iinfo(np.int32).max)
+        if not len(self.days):
+            return pd.Series(dtype=np.float64, name=measure)
+        first, last = max(span[0], int(self.days[0])), min(span[1], int(self.days[-1]))
+        if first > last:
+            return pd.Series(dtype=np.float64, name=measure)
+        edges, labels = bucket_edges(first, last, period)
+        positions = np.searchsorted(self.days, edges)
+
+        def totals(cumulative):
+            return np.diff(cumulative[cells][..., positions].sum(axis=(0, 1)))
+
+        rows = totals(self.rows)
+        if how == 'size':
+            values = rows
+        elif how == 'sum':
+            values = totals(self.sums[measure])
+            if pd.api.types.is_integer_dtype(self.store.column_dtype(measure)):
+                values = values.astype(np.int64)
+        else:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                values = totals(self.sums[measure]) / totals(self.counts[measure])
+        observed = rows > 0
+        return pd.Series(values[observed], index=np.asarray(labels, dtype=object)[observed], name=measure)
@@ -0,0 +1,232 @@
+# training.py
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import StandardScaler
+
+from columnar import ColumnarStore, publish, save_array
+from models import ENCODED_COLUMNS, MODEL_FILENAME, MODEL_TASKS, LabelEncodings
+
+# What shopping_trend.ipynb trains for each task (features from models.MODEL_TASKS)
+TRAINING_TASKS = {
+    'revenue_prediction': {'target': 'total_revenue', 'estimator': 'RandomForestRegressor'},
+    'trend_classification': {'target': 'trend_flag', 'estimator': 'RandomForestClassifier'},
+    'discount_effectiveness': {'target': 'discount_effectiveness', 'estimator': 'RandomForestRegressor'},
+}
+ESTIMATORS = {'RandomForestRegressor': RandomForestRegressor, 'RandomForestClassifier': RandomForestClassifier}
+TEST_SIZE = 0.2
+RANDOM_STATE = 42  # the notebook's split seed, also given to the forests so retraining is reproducible
+
+MATRIX_DIRNAME = 'feature_matrix'
+STATE_FILENAME = 'training.json'
+
+
+def _digest(values):
+    values = np.ascontiguousarray(values)
+    return hashlib.blake2b(str(values.dtype).encode() + values.tobytes(), digest_size=16).hexdigest()
+
+
+def _source_digest(path):
+    """Digest of a saved dataset's per-cell content digests, or None when it has none (rebuild the matrix)"""
+    digests = os.path.join(path, 'digests.json') if os.path.isdir(path) else None
+    if digests is None or not os.path.exists(digests):
+        return None
+    with open(digests, 'rb') as f:
+        return hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+
+
+class FeatureMatrix:
+    """The columns every training task reads, encoded and filled exactly as preprocess_data does.
+
+    Label-encoded columns hold their LabelEncoder codes, other columns keep
+    their dtype with missing floats filled with 0. Saved as one .npy file per
+    column (memory-mapped by the training workers) with the encodings and a
+    content digest per column, which is what decides whether a task's inputs
+    changed since it was last trained.
+    """
+
+    def __init__(self, columns, encodings, digests, source=None):
+        self.columns = columns      # name -> array
+        self.encodings = encodings  # LabelEncodings of the encoded columns
+        self.digests = digests      # name -> content digest
+        self.source = source        # digest of the dataset the matrix was built from, when known
+
+    @classmethod
+    def build(cls, store, names, source=None):
+        encodings = LabelEncodings.build(store, [name for name in ENCODED_COLUMNS if name in names])
+        columns = {}
+        for name in names:
+            values = np.asarray(store.values(name))
+            if name in encodings:
+                classes = encodings.classes[name]
+                if name in store.dictionaries:
+                    # Code per dictionary label, with the missing code (-1) indexing the trailing 'nan' entry
+                    labels = [str(label) for label in store.dictionaries[name]] + ['nan']
+                    lookup = np.searchsorted(classes, labels).astype(np.int64)
+                    columns[name] = lookup[np.asarray(values)]
+                else:
+                    columns[name] = encodings.encode(name, np.asarray(values)).astype(np.int64)
+            elif name in store.dictionaries:
+                labels = np.append(np.asarray(store.dictionaries[name], dtype=object), 0)
+                columns[name] = labels[np.asarray(values)]
+            elif values.dtype.kind == 'f':
+                columns[name] = np.nan_to_num(np.asarray(values), nan=0.0)
+            else:
+                columns[name] = np.asarray(values)
+        return cls(columns, encodings, {name: _digest(values) for name, values in columns.items()}, source)
+
+    def save(self, directory):
+        staging = directory + '.tmp'
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        for name, values in self.columns.items():
+            save_array(os.path.join(staging, f'{name}.npy'), values)
+        self.encodings.save(staging)
+        with open(os.path.join(staging, 'manifest.json'), 'w') as f:
+            json.dump({'rows': self.n_rows, 'source': self.source, 'digests': self.digests}, f, indent=1)
+        publish(staging, directory)
+
+    @classmethod
+    def open(cls, directory):
+        """Memory-map a saved matrix, or None when there is none"""
+        path = os.path.join(directory, 'manifest.json')
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            manifest = json.load(f)
+        columns = {name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r')
+                   for name in manifest['digests']}
+        return cls(columns, LabelEncodings.open(directory), manifest['digests'], manifest['source'])
+
+    @property
+    def n_rows(self):
+        return len(next(iter(self.columns.values()))) if self.columns else 0
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def frame(self, names):
+        return pd.DataFrame({name: np.asarray(self.columns[name]) for name in names})
+
+
+def task_hash(task, spec, matrix):
+    """Content hash of everything a task's model depends on: its inputs, target and training setup"""
+    inputs = spec['features'] + [spec['target']]
+    setup = dict(spec, task=task, inputs=[matrix.digests[name] for name in inputs], test_size=TEST_SIZE,
+                 random_state=RANDOM_STATE, sklearn=sklearn.__version__)
+    return hashlib.blake2b(json.dumps(setup, sort_keys=True).encode(), digest_size=16).hexdigest()
+
+
+def _train_task(matrix_dir, model_dir, task, spec, n_jobs):
+    """Fit one task the way the notebook does and save (model, scaler); runs in a worker process"""
+    started = time.perf_counter()
+    matrix = FeatureMatrix.open(matrix_dir)
+    X = matrix.frame(spec['features'])
+    y = np.asarray(matrix.columns[spec['target']])
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=TEST_SIZE, random_state=RANDOM_STATE)
+    scaler = StandardScaler()
+    X_train = scaler.fit_transform(X_train)
+    X_test = scaler.transform(X_test)
+    model = ESTIMATORS[spec['estimator']](random_state=RANDOM_STATE, n_jobs=n_jobs)
+    model.fit(X_train, y_train)
+    score = model.score(X_test, y_test) if len(X_test) else None
+    path = os.path.join(model_dir, MODEL_FILENAME.format(task=task))
+    joblib.dump((model, scaler), path + '.tmp')
+    os.replace(path + '.tmp', path)  # the API never loads a half-written model
+    return {'seconds': round(time.perf_counter() - started, 3), 'score': score, 'rows': matrix.n_rows}
+
+
+def training_tasks(tasks=None):
+    """{task: spec} with each task's features, target and estimator"""
+    return {task: dict(TRAINING_TASKS[task], features=MODEL_TASKS[task]) for task in (tasks or TRAINING_TASKS)}
+
+
+def load_matrix(data_path, model_dir, specs):
+    """The saved feature matrix when it was built from this very dataset, otherwise a fresh one (saved)"""
+    directory = os.path.join(model_dir, MATRIX_DIRNAME)
+    names = list(dict.fromkeys(name for spec in specs.values() for name in spec['features'] + [spec['target']]))
+    source = _source_digest(data_path)
+    matrix = FeatureMatrix.open(directory)
+    if matrix is not None and source is not None and matrix.source == source and all(name in matrix for name in names):
+        return matrix, False
+    if os.path.isdir(data_path):
+        store = ColumnarStore.open(data_path)
+    else:
+        store = ColumnarStore.from_frame(pd.read_csv(data_path))
+    missing = [name for name in names if name not in store]
+    if missing:
+        raise KeyError(f"dataset has no column(s) {', '.join(missing)}")
+    FeatureMatrix.build(store, names, source).save(directory)
+    return FeatureMatrix.open(directory), True
+
+
+def train(data_path, model_dir, tasks=None, workers=None, force=False):
+    """Train every task whose inputs changed since its model was saved, concurrently; returns {task: outcome}"""
+    os.makedirs(model_dir, exist_ok=True)
+    specs = training_tasks(tasks)
+    matrix, rebuilt = load_matrix(data_path, model_dir, specs)
+    # The API encodes prediction requests with the codes the models were trained with
+    matrix.encodings.save(model_dir)
+
+    state_path = os.path.join(model_dir, STATE_FILENAME)
+    state = {}
+    if os.path.exists(state_path):
+        with open(state_path) as f:
+            state = json.load(f)
+    hashes = {task: task_hash(task, spec, matrix) for task, spec in specs.items()}
+    outcomes = {}
+    pending = []
+    for task in specs:
+        saved = os.path.exists(os.path.join(model_dir, MODEL_FILENAME.format(task=task)))
+        if not force and saved and state.get(task, {}).get('hash') == hashes[task]:
+            outcomes[task] = dict(state[task], status='unchanged')
+        else:
+            pending.append(task)
+
+    if pending:
+        cpus = os.cpu_count() or 1
+        workers = min(workers or cpus, len(pending))
+        n_jobs = max(1, cpus // workers)  # the cores left over go to each forest's trees
+        matrix_dir = os.path.join(model_dir, MATRIX_DIRNAME)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {task: pool.submit(_train_task, matrix_dir, model_dir, task, specs[task], n_jobs)
+                       for task in pending}
+            for task, future in futures.items():
+                state[task] = dict(future.result(), hash=hashes[task],
+                                   trained_at=time.strftime('%Y-%m-%dT%H:%M:%S%z'))
+                outcomes[task] = dict(state[task], status='trained')
+        with open(state_path + '.tmp', 'w') as f:
+            json.dump(state, f, indent=1)
+        os.replace(state_path + '.tmp', state_path)
+    return {'matrix': 'rebuilt' if rebuilt else 'reused', 'tasks': outcomes}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the notebook's models, skipping those whose inputs are unchanged")
+    parser.add_argument('--data', default='processed_dataset.cols', help="processed dataset (columnar directory or CSV)")
+    parser.add_argument('--models', default='.', help="where the models, encodings and feature matrix are saved")
+    parser.add_argument('--tasks', nargs='+', choices=list(TRAINING_TASKS), help="train only these tasks")
+    parser.add_argument('--workers', type=int, help="tasks trained at once (default: one per core)")
+    parser.add_argument('--force', action='store_true', help="retrain even when the inputs are unchanged")
+    args = parser.parse_args()
+
+    result = train(args.data, args.models, args.tasks, args.workers, args.force)
+    print(f"Feature matrix {result['matrix']}")
+    for task, outcome in result['tasks'].items():
+        score = f", test score {outcome['score']:.4f}" if outcome.get('score') is not None else ''
+        print(f"{task}: {outcome['status']} ({outcome['seconds']}s{score})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+# warmup.py
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from insight_cache import InsightCache
+
+# Filter columns whose combinations make up the dashboard's answer space
+WARM_COLUMNS = ('region', 'category')
+
+
+def filter_sets(store, columns=WARM_COLUMNS):
+    """Every combination of "All" or one value per column, as request-style filter dicts"""
+    choices = []
+    for name in columns:
+        labels = [str(label) for label in store.index.labels[name]] if name in store.index else []
+        choices.append([None] + labels)
+    sets = []
+    for values in itertools.product(*choices):
+        sets.append({name: value for name, value in zip(columns, values) if value is not None})
+    return sets
+
+
+class CacheWarmer:
+    """Background job filling an InsightCache with every (question, filter set) response.
+
+    Work is grouped by filter set so each worker filters once and answers all
+    questions from the same scoped analyzer. Filter sets and questions run in
+    order of past demand. Results are collected off to the side and merged into
+    the live cache in one step when the run completes; a run cancelled by a
+    newer dataset load never touches the cache.
+    """
+
+    def __init__(self, cache, workers=4):
+        self.cache = cache
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._run = None
+
+    def plan(self, questions, sets):
+        """[(filters, [question, ...]), ...], most requested first"""
+        demand = self.cache.demand
+        jobs = []
+        for filters in sets:
+            keys = [(question, InsightCache.key(question.category, question.id, filters)) for question in questions]
+            keys.sort(key=lambda item: -demand[item[1]])
+            jobs.append((sum(demand[key] for _, key in keys), filters, [question for question, _ in keys]))
+        jobs.sort(key=lambda job: -job[0])
+        return [(filters, job_questions) for _, filters, job_questions in jobs]
+
+    def start(self, scope, render, questions, sets, install=None):
+        """Cancel any running warm-up and start a new one in a daemon thread.
+
+        scope(filters) returns the analyzer to answer a filter set with and
+        render(analyzer, question, filters) the response body to cache. When
+        given, install(entries) is called with the results instead of merging
+        them into the cache (a dataset reload swaps them in with its data).
+        """
+        run = _WarmRun(self.plan(questions, sets), install or self.cache.merge)
+        with self._lock:
+            if self._run is not None:
+                self._run.cancelled.set()
+            self._run = run
+        run.thread = threading.Thread(target=self._execute, args=(run, scope, render), name='cache-warmup', daemon=True)
+        run.thread.start()
+        return run
+
+    def cancel(self):
+        with self._lock:
+            if self._run is not None:
+                self._run.cancelled.set()
+
+    def wait(self, timeout=None):
+        run = self._run
+        if run is not None and run.thread is not None:
+            run.thread.join(timeout)
+
+    def status(self):
+        run = self._run
+        return run.status() if run is not None else {"state": "idle"}
+
+    def _execute(self, run, scope, render):
+        def warm(filters, questions):
+            target = scope(filters)
+            bodies = []
+            for question in questions:
+                if run.cancelled.is_set():
+                    break
+                started = time.perf_counter()
+                try:
+                    body = render(target, question, filters)
+                except Exception:
+                    run.record(question, time.perf_counter() - started, failed=True)
+                    continue
+                run.record(question, time.perf_counter() - started)
+                bodies.append((InsightCache.key(question.category, question.id, filters), body))
+            return bodies
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='cache-warmup') as pool:
+                futures = {pool.submit(warm, filters, questions): position
+                           for position, (filters, questions) in enumerate(run.jobs)}
+                results = [None] * len(run.jobs)
+                for future in as_completed(futures):
+                    results[futures[future]] = future.result()
+        except Exception:
+            run.finish("failed")
+            raise
+        # Least requested first so the most requested entries are the last to be evicted
+        entries = [entry for bodies in reversed(results) for entry in reversed(bodies or [])]
+        with self._lock:
+            if run.cancelled.is_set():
+                run.finish("cancelled")
+                return
+            run.install(entries)
+            run.finish("done")
+
+
+class _WarmRun:
+    def __init__(self, jobs, install):
+        self.jobs = jobs
+        self.install = install
+        self.total = sum(len(questions) for _, questions in jobs)
+        self.done = 0
+        self.failed = 0
+        self.timings = {}  # (category, id) -> [count, total seconds, max seconds]
+        self.state = "running"
+        self.started = time.perf_counter()
+        self.elapsed = None
+        self.cancelled = threading.Event()
+        self.thread = None
+        self._lock = threading.Lock()
+
+    def record(self, question, seconds, failed=False):
+        with self._lock:
+            self.done += 1
+            self.failed += failed
+            timing = self.timings.setdefault((question.category, question.id), [0, 0.0, 0.0])
+            timing[0] += 1
+            timing[1] += seconds
+            timing[2] = max(timing[2], seconds)
+
+    def finish(self, state):
+        self.state = state
+        self.elapsed = time.perf_counter() - self.started
+
+    def status(self):
+        with self._lock:
+            elapsed = self.elapsed if self.elapsed is not None else time.perf_counter() - self.started
+            slowest = sorted(self.timings.items(), key=lambda item: -item[1][1])[:5]
+            return {
+                "state": self.state,
+                "total": self.total,
+                "done": self.done,
+                "failed": self.failed,
+                "progress": self.done / self.total if self.total else 1.0,
+                "seconds": round(elapsed, 3),
+                "slowest": [{"category": category, "id": question_id, "runs": count,
+                             "total_seconds": round(total, 4), "max_seconds": round(worst, 4)}
+                            for (category, question_id), (count, total, worst) in slowest],
+            }